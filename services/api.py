@@ -1,34 +1,78 @@
-from fastapi import FastAPI, HTTPException, UploadFile, File, Path
-import os, shutil, tempfile
+from fastapi import FastAPI, HTTPException, UploadFile, File, Path, Query, Request
+from fastapi.responses import StreamingResponse, JSONResponse
+from starlette.concurrency import run_in_threadpool
+import os, shutil, tempfile, time, asyncio
 from fastapi.middleware.cors import CORSMiddleware
 from langchain_groq import ChatGroq
-from langchain_community.document_loaders import PyPDFLoader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.vectorstores import FAISS
 from utils.bot import (
-    initialize_retriver,
-    initialize_rag_chain,
-    get_model,
+    get_chat_model,
     extract_video_id,
 )
+from utils.rag_cache import RagCache, RAG_DIR
+from utils.hybrid_search import RAG_FETCH_K
+from utils.autocomplete import AutocompleteEngine
+from utils.ingest import IngestionManager
+from utils.streaming import sse_event, SSE_HEADERS
+from utils.llm import LLMClient
+from utils.classifier import LearnerClassifier
+from utils.history import ChatHistoryProvider, make_llm_summarizer
+from utils.semantic_cache import SemanticCache
+from utils.response_cache import ResponseCache, template_hash
+from utils.recommendation_pool import LEARNER_TYPES, RecommendationPool
+from utils.question_bank import VideoQuestionBank, AptitudeQuestionPool
+from utils.transcript_questions import generate_from_transcript
+from utils.structured_output import (
+    StructuredOutputError,
+    generate_list,
+    get_parse_stats,
+    question_item,
+    text_item,
+)
+from utils.assessdb import initialize_db, get_cached_transcript, save_transcript
+from utils.resources import Resources
+from utils.contextualize import QueryContextualizer
+from utils.prompts import (
+    REVISION_SYSTEM,
+    REVISION_PROMPTS,
+    REVISION_OVERVIEW_SYSTEM,
+    REVISION_OVERVIEW_PROMPT,
+    CAREER_SYSTEM,
+    CAREER_PROMPTS,
+)
 from utils.database import *
 from typing import Optional, List
+from collections import OrderedDict
+from contextlib import asynccontextmanager
 import uuid
 from dotenv import load_dotenv
-from groq import Groq
-import json
 from youtube_transcript_api import YouTubeTranscriptApi
 from youtube_transcript_api._errors import TranscriptsDisabled, NoTranscriptFound
-import joblib
-import numpy as np
+from pydantic import BaseModel
 
 load_dotenv()
 
-api = FastAPI(root_path='/services')
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Schema checks are cheap once migrated; models load in the background and
+    # /readyz reports when they are done
+    await run_in_threadpool(resources.init_databases)
+    background_tasks.add(asyncio.create_task(asyncio.to_thread(resources.warm_up)))
+    # Keeps recommendation pools for every subject under RAG/ filled
+    background_tasks.add(asyncio.create_task(recommendation_pool.run(RAG_DIR)))
+    aptitude_pool.refill()
+    yield
+    for task in background_tasks:
+        task.cancel()
+    await llm_client.aclose()
+    ingestion_manager.shutdown()
+
+
+api = FastAPI(root_path='/services', lifespan=lifespan)
 
 groq_api_key1 = os.getenv("GROQ_API_KEY3")
 groq_api_key2 = os.getenv("GROQ_API_KEY4")
-client = Groq(api_key=groq_api_key1)
+llm_client = LLMClient(groq_api_key1)
 
 api.add_middleware(
     CORSMiddleware,
@@ -41,34 +85,135 @@ api.add_middleware(
     allow_headers=["*"],
 )
 
-llm = ChatGroq(model="llama-3.3-70b-versatile", api_key=groq_api_key2)
 os.environ["HF_TOKEN"] = os.getenv("HF_TOKEN")
-model,embeddings = get_model()
+
+
+def init_databases():
+    create_application_logs()
+    initialize_db()
+
+
+# Models are created on first use or by the warm-up started in lifespan
+resources = Resources(get_chat_model, LearnerClassifier, init_databases)
+embeddings = resources.embeddings
+rag_cache = RagCache(resources.chat_model, embeddings)
+semantic_cache = SemanticCache()
+response_cache = ResponseCache()
+recommendation_pool = RecommendationPool(llm_client)
+contextualizer = QueryContextualizer(llm_client)
+
+# Part of the response cache keys, so editing a prompt or its settings invalidates old entries
+REVISION_TEMPLATE = template_hash(
+    REVISION_SYSTEM, REVISION_PROMPTS, 0.7, 800, REVISION_OVERVIEW_SYSTEM, REVISION_OVERVIEW_PROMPT, 10
+)
+CAREER_TEMPLATE = template_hash(CAREER_SYSTEM, CAREER_PROMPTS, 0.7, 1000)
+APTITUDE_BATCH_SIZE = 10
+
+
+autocomplete_engine = AutocompleteEngine(
+    load_chunks=lambda subject: (
+        doc.page_content for doc in rag_cache.iter_chunks(subject)
+    ),
+    load_queries=get_query_counts,
+)
+AUTOCOMPLETE_LLM_FALLBACK = os.getenv("AUTOCOMPLETE_LLM_FALLBACK", "1") == "1"
+AUTOCOMPLETE_MIN_LOCAL_HITS = 3
+# Prefixes already sent to the LLM, so each is only asked about once
+AUTOCOMPLETE_FALLBACK_MEMORY = 10000
+autocomplete_fallbacks: OrderedDict = OrderedDict()
+background_tasks: set = set()
+
+
+def on_subject_reindexed(subject: str):
+    rag_cache.invalidate(subject)
+    semantic_cache.invalidate(subject)
+    autocomplete_engine.invalidate(subject)
+
+
+ingestion_manager = IngestionManager(
+    resources.document_embeddings, RAG_DIR, on_complete=on_subject_reindexed
+)
+
+# Rolling summaries of older turns cost a small-model call each; off unless enabled
+summary_llm = (
+    ChatGroq(model="llama-3.1-8b-instant", api_key=groq_api_key2)
+    if os.getenv("CHAT_HISTORY_SUMMARY") == "1"
+    else None
+)
+history_provider = ChatHistoryProvider(
+    summarizer=make_llm_summarizer(summary_llm) if summary_llm else None
+)
 
 @api.get("/")
 def read_root():
     return {"Hello": "World"}
 
 
+@api.get("/healthz")
+def liveness():
+    """The process is up and serving requests."""
+    return {"status": "ok"}
+
+
+@api.get("/readyz")
+def readiness():
+    """Databases are migrated and the models are loaded."""
+    status = resources.status()
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
+
+async def lookup_cached_answer(subject, learner_type, user_query, chat_history):
+    """
+    Look the query up in the semantic answer cache.
+
+    Returns (query_vector, answer). Only history-free questions are cached, since
+    earlier turns can change what the answer should be; with history both are None.
+    """
+    if chat_history:
+        return None, None
+    query_vector = await run_in_threadpool(embeddings.embed_query, user_query)
+    return query_vector, semantic_cache.lookup(subject, learner_type, query_vector)
+
+
+async def rag_chain_input(subject, user_query, chat_history):
+    """Chain input for a chat turn; follow-ups get a standalone query for retrieval."""
+    chain_input = {"input": user_query, "chat_history": chat_history, "subject": subject}
+    if chat_history:
+        chain_input["search_query"] = await contextualizer.standalone_query(user_query, chat_history)
+    return chain_input
+
+
 @api.post("/chat")
-def personal_assistant(
+async def personal_assistant(
     session_id: Optional[str] = None,
     user_id: str = "anonymous",
     user_query: str = "",
     subject: str = "Design and Analysis of Algorithms",
     learner_type: str = "medium",
 ):
-    _, retriever = initialize_retriver(model, embeddings, subject)
-    rag_chain = initialize_rag_chain(model, retriever, subject, learner_type)
+    rag_chain = await run_in_threadpool(rag_cache.get_rag_chain, subject, learner_type)
     if not session_id:
         session_id = str(uuid.uuid4())
     try:
-        chat_history = get_chat_history(session_id)
-        response = rag_chain.invoke(
-            {"input": user_query, "chat_history": chat_history, "subject": subject}
-        )["answer"]
+        chat_history = await run_in_threadpool(history_provider.get_chat_history, session_id)
+        query_vector, response = await lookup_cached_answer(
+            subject, learner_type, user_query, chat_history
+        )
+        if response is None:
+            start = time.perf_counter()
+            chain_input = await rag_chain_input(subject, user_query, chat_history)
+            response = (await rag_chain.ainvoke(chain_input))["answer"]
+            if query_vector is not None:
+                semantic_cache.store(
+                    subject, learner_type, user_query, query_vector, response,
+                    time.perf_counter() - start,
+                )
 
-        insert_application_logs(session_id, user_id, user_query, response)
+        await run_in_threadpool(
+            insert_application_logs, session_id, user_id, user_query, response
+        )
+        history_provider.append(session_id, user_query, response)
+        autocomplete_engine.record_query(subject, user_query)
         return {"session_id": session_id, "response": response}
     except KeyError as e:
         raise HTTPException(
@@ -81,6 +226,141 @@ def personal_assistant(
         )
 
 
+@api.post("/chat_stream")
+async def personal_assistant_stream(
+    request: Request,
+    session_id: Optional[str] = None,
+    user_id: str = "anonymous",
+    user_query: str = "",
+    subject: str = "Design and Analysis of Algorithms",
+    learner_type: str = "medium",
+):
+    """
+    Streaming variant of /chat. Sends Server-Sent Events:
+    a "session" event, one "token" event per answer chunk, then "done" or "error".
+    The exchange is only logged once the full answer has been streamed.
+    """
+    rag_chain = await run_in_threadpool(rag_cache.get_rag_chain, subject, learner_type)
+    if not session_id:
+        session_id = str(uuid.uuid4())
+    chat_history = await run_in_threadpool(history_provider.get_chat_history, session_id)
+
+    query_vector, cached_response = await lookup_cached_answer(
+        subject, learner_type, user_query, chat_history
+    )
+
+    async def event_stream():
+        yield sse_event({"session_id": session_id}, event="session")
+        if cached_response is not None:
+            response = cached_response
+            yield sse_event({"token": response}, event="token")
+        else:
+            answer_parts = []
+            start = time.perf_counter()
+            try:
+                chain_input = await rag_chain_input(subject, user_query, chat_history)
+                async for chunk in rag_chain.astream(chain_input):
+                    token = chunk.get("answer")
+                    if not token:
+                        continue
+                    if await request.is_disconnected():
+                        # Client went away part-way; drop the partial answer unlogged
+                        return
+                    answer_parts.append(token)
+                    yield sse_event({"token": token}, event="token")
+            except Exception as e:
+                yield sse_event({"detail": f"An unexpected error occurred: {e}"}, event="error")
+                return
+            response = "".join(answer_parts)
+            if query_vector is not None:
+                semantic_cache.store(
+                    subject, learner_type, user_query, query_vector, response,
+                    time.perf_counter() - start,
+                )
+
+        await run_in_threadpool(
+            insert_application_logs, session_id, user_id, user_query, response
+        )
+        history_provider.append(session_id, user_query, response)
+        autocomplete_engine.record_query(subject, user_query)
+        yield sse_event({"session_id": session_id, "response": response}, event="done")
+
+    return StreamingResponse(
+        event_stream(), media_type="text/event-stream", headers=SSE_HEADERS
+    )
+
+
+@api.get("/search")
+async def search_textbooks(
+    query: str,
+    subjects: Optional[List[str]] = Query(None),
+    books: Optional[List[str]] = Query(None),
+    k: int = 8,
+):
+    """
+    Textbook passages for a query across every subject in the unified index, or
+    only the given subjects and books, with the subject, book and page of each.
+    """
+    store = await run_in_threadpool(rag_cache.unified_store)
+    if store is None:
+        raise HTTPException(
+            status_code=503,
+            detail="No unified index; build it with python -m utils.unified_store RAG",
+        )
+
+    def search():
+        retriever = store.retriever(subjects, books, k=max(1, min(k, RAG_FETCH_K)))
+        return retriever.invoke(query) if retriever is not None else []
+
+    docs = await run_in_threadpool(search)
+    return {
+        "results": [
+            {
+                "subject": doc.metadata.get("subject"),
+                "book": doc.metadata.get("book"),
+                "page": doc.metadata.get("page"),
+                "content": doc.page_content,
+            }
+            for doc in docs
+        ]
+    }
+
+
+@api.get("/rag_cache/stats")
+def get_rag_cache_stats():
+    return rag_cache.stats()
+
+
+@api.get("/chat_history/stats")
+def get_chat_history_stats():
+    return history_provider.stats()
+
+
+@api.get("/db/write_stats")
+def get_db_write_stats():
+    return get_write_stats()
+
+
+@api.get("/semantic_cache/stats")
+def get_semantic_cache_stats():
+    return semantic_cache.stats()
+
+
+@api.get("/response_cache/stats")
+def get_response_cache_stats():
+    return response_cache.stats()
+
+
+@api.get("/embedding_cache/stats")
+def get_embedding_cache_stats():
+    return resources.document_embeddings().stats()
+
+
+@api.get("/contextualize/stats")
+def get_contextualize_stats():
+    return contextualizer.stats()
+
+
 @api.get("/sessions", response_model=List[str])
 def get_sessions():
     try:
@@ -133,38 +413,21 @@ def get_session_chat_history(session_id: str):
 
 
 @api.post("/recommendations")
-def get_recommendations(
+async def get_recommendations(
     subject: str = "Design and Analysis of Algorithms", learner_type: str = "medium"
 ):
-
-    prompt = f"""Based on the subject '{subject}', and considering they are a '{learner_type}' learner, provide 3-5 concise recommendations for the search bar of the study assitant. These could be related topics, questions related to the subject.
-    Subject: {subject}
-    Learner Type: {learner_type}
-    Output the recommendations as a JSON list of strings. For example: ["Recommendation 1", "Study Resource A", "Next Step B"]
-    Recommendations:"""
-
-    try:
-        response = client.chat.completions.create(
-            model="llama-3.3-70b-versatile",
-            messages=[
-                {
-                    "role": "system",
-                    "content": "You are an assistant that provides educational recommendations formatted as a JSON list of strings.",
-                },
-                {"role": "user", "content": prompt},
-            ],
-            temperature=0.7,
-            max_tokens=300,
-        )
-        recommendations_str = response.choices[0].message.content.strip()
-        parsed_recommendations = (
-            json.loads(recommendations_str) if recommendations_str else []
+    if learner_type not in LEARNER_TYPES:
+        raise HTTPException(
+            status_code=400,
+            detail="Invalid learner type. Choose from 'fast', 'medium', or 'slow'.",
         )
-        return {"recommendations": parsed_recommendations}
-    except json.JSONDecodeError as e:
+    try:
+        recommendations = await recommendation_pool.sample(subject, learner_type)
+        return {"recommendations": recommendations}
+    except StructuredOutputError as e:
         raise HTTPException(
             status_code=500,
-            detail=f"Error parsing JSON from Groq API for recommendations: {str(e)}. Response: {recommendations_str}",
+            detail=f"Error parsing JSON from Groq API for recommendations: {str(e)}",
         )
     except Exception as e:
         raise HTTPException(
@@ -173,10 +436,23 @@ def get_recommendations(
         )
 
 
-@api.post("/autocomplete")
-def get_autocomplete_suggestions(
-    user_query_partial: str, subject: str = "Design and Analysis of Algorithms"
-):
+@api.get("/structured_output/stats")
+def get_structured_output_stats():
+    return get_parse_stats()
+
+
+@api.get("/video_questions/stats")
+def get_video_question_bank_stats():
+    return video_question_bank.stats()
+
+
+@api.get("/recommendations/stats")
+def get_recommendation_pool_stats():
+    return recommendation_pool.stats()
+
+
+async def autocomplete_llm_fallback(subject: str, user_query_partial: str):
+    """Ask the LLM for suggestions and merge them into the subject's local index."""
     prompt = f"""Complete the following user query or provide relevant autocomplete suggestions. The user is typing about the subject '{subject}'.
     Partial Query: {user_query_partial}
     Subject: {subject}
@@ -184,8 +460,9 @@ def get_autocomplete_suggestions(
     Output the suggestions as a JSON list of strings. For example: ["suggestion 1", "suggestion 2"]
     Autocomplete Suggestions:"""
 
-    try:
-        response = client.chat.completions.create(
+    async def ask(n: int) -> str:
+        return await llm_client.complete(
+            "autocomplete",
             model="llama-3.3-70b-versatile",  # Or a smaller model if latency is critical
             messages=[
                 {
@@ -196,52 +473,118 @@ def get_autocomplete_suggestions(
             ],
             temperature=0.5,
             max_tokens=100,
-            # stop=["\n"] # Stop token might interfere with JSON list generation if it spans multiple lines, consider removing or adjusting.
-        )
-        suggestions_str = response.choices[0].message.content.strip()
-        processed_suggestions = json.loads(suggestions_str) if suggestions_str else []
-        return {"suggestions": processed_suggestions}
-    except json.JSONDecodeError as e:
-        raise HTTPException(
-            status_code=500,
-            detail=f"Error parsing JSON from Groq API for autocomplete: {str(e)}. Response: {suggestions_str}",
         )
+
+    try:
+        # Best effort in the background, so no second attempt
+        suggestions = await generate_list("autocomplete", ask, text_item, 5, max_retries=0)
+        await run_in_threadpool(autocomplete_engine.add_suggestions, subject, suggestions)
     except Exception as e:
-        raise HTTPException(
-            status_code=500, detail=f"Error calling Groq API for autocomplete: {str(e)}"
-        )
+        print(f"Autocomplete fallback failed: {type(e).__name__} - {str(e)}")
+        # Let a later keystroke for the prefix ask again
+        autocomplete_fallbacks.pop(fallback_key(subject, user_query_partial), None)
 
 
-@api.post("/upload")
-async def upload_textbook(file: UploadFile = File(...)):
-    if not file.filename.lower().endswith(".pdf"):
-        raise HTTPException(status_code=400, detail="Only PDF files are supported")
+def fallback_key(subject: str, user_query_partial: str):
+    return (subject, " ".join(user_query_partial.lower().split()))
 
-    rag_dir = os.path.join(os.getcwd(), "RAG")
-    os.makedirs(rag_dir, exist_ok=True)
 
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp:
-        shutil.copyfileobj(file.file, tmp)
-        tmp_path = tmp.name
+def schedule_autocomplete_fallback(subject: str, user_query_partial: str):
+    key = fallback_key(subject, user_query_partial)
+    if key in autocomplete_fallbacks:
+        return
+    autocomplete_fallbacks[key] = None
+    while len(autocomplete_fallbacks) > AUTOCOMPLETE_FALLBACK_MEMORY:
+        autocomplete_fallbacks.popitem(last=False)
+    task = asyncio.create_task(autocomplete_llm_fallback(subject, user_query_partial))
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
 
-    loader = PyPDFLoader(tmp_path)
-    docs = loader.load()
-    splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=250)
-    chunks = splitter.split_documents(docs)
 
-    _, embeddings = get_model()
+@api.post("/autocomplete")
+async def get_autocomplete_suggestions(
+    user_query_partial: str, subject: str = "Design and Analysis of Algorithms"
+):
+    """
+    Suggestions from the subject's local prefix index. When it has few matches the
+    LLM is asked in the background, so later keystrokes for the prefix find more.
+    """
+    suggestions = autocomplete_engine.suggest(subject, user_query_partial)
+    if AUTOCOMPLETE_LLM_FALLBACK and len(suggestions) < AUTOCOMPLETE_MIN_LOCAL_HITS:
+        schedule_autocomplete_fallback(subject, user_query_partial)
+    return {"suggestions": suggestions}
 
-    vector_db = FAISS.from_documents(chunks, embeddings)
-    book_name = os.path.splitext(file.filename)[0]
-    save_path = os.path.join(rag_dir, book_name)
-    vector_db.save_local(save_path)
 
-    os.remove(tmp_path)
-    return {"message": f"FAISS index saved for {book_name} at {save_path}"}
+@api.post("/upload")
+async def upload_textbook(file: UploadFile = File(...)):
+    """
+    Queue a textbook PDF for indexing under RAG/{book name}.
+    Poll /upload/{job_id} for progress.
+    """
+    if not file.filename.lower().endswith(".pdf"):
+        raise HTTPException(status_code=400, detail="Only PDF files are supported")
+
+    os.makedirs(RAG_DIR, exist_ok=True)
+
+    def save_upload():
+        with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp:
+            shutil.copyfileobj(file.file, tmp)
+            return tmp.name
+
+    tmp_path = await run_in_threadpool(save_upload)
+    job = ingestion_manager.submit(tmp_path, file.filename)
+    return {
+        "message": f"Indexing started for {job.subject}",
+        "job_id": job.job_id,
+        "status": job.state,
+    }
+
+
+@api.get("/upload/{job_id}")
+def get_upload_status(job_id: str = Path(...)):
+    job = ingestion_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Upload job not found")
+    return job.to_dict()
+
+
+def revision_detail_request(topic: str, learner_type: str):
+    return dict(
+        model="llama-3.3-70b-versatile",
+        messages=[
+            {"role": "system", "content": REVISION_SYSTEM},
+            {"role": "user", "content": REVISION_PROMPTS[learner_type].format(topic=topic)},
+        ],
+        temperature=0.7,
+        max_tokens=800,
+    )
+
+
+async def generate_revision_overview(topic: str, learner_type: str):
+    overview_prompt = REVISION_OVERVIEW_PROMPT.format(topic=topic, learner_type=learner_type)
+    overview_response = await llm_client.create(
+        "revision",
+        model="llama-3.3-70b-versatile",
+        messages=[
+            {"role": "system", "content": REVISION_OVERVIEW_SYSTEM},
+            {"role": "user", "content": overview_prompt},
+        ],
+        temperature=0.7,
+        max_tokens=10,
+    )
+    return overview_response.choices[0].message.content.strip()
 
 
 @api.post("/revision")
-def revision_assistant(topic: str, learner_type: str = "medium"):
+async def revision_assistant(
+    request: Request, topic: str, learner_type: str = "medium", stream: bool = False
+):
+    """
+    Revision strategies for a topic plus a 4-5 word overview, generated concurrently.
+
+    With stream=true the result is sent as Server-Sent Events: an "overview" event
+    as soon as it is ready, "token" events for the strategies, then "done".
+    """
     try:
         if learner_type not in ["fast", "medium", "slow"]:
             raise HTTPException(
@@ -249,111 +592,91 @@ def revision_assistant(topic: str, learner_type: str = "medium"):
                 detail="Invalid learner type. Choose from 'fast', 'medium', or 'slow'.",
             )
 
-        if learner_type == "fast":
-            prompt = f"""You are an expert educational consultant helping a fast-learning student with {topic}.
-
-As a fast learner, this student:
-- Quickly grasps new concepts
-- Prefers high-level understanding over excessive details
-- May get bored with repetitive practice
-- Benefits from connecting ideas across domains
-
-Please provide 3 revision strategies specifically tailored for {topic}:
-1. A condensed review technique (include an estimated time commitment)
-2. An advanced application method that challenges their understanding
-3. A concept-mapping approach to connect {topic} with related knowledge
-
-For each strategy:
-- Provide a clear name and description
-- Include 1-2 specific examples directly related to {topic}
-- Suggest how to track progress
-- Explain why this technique works well for fast learners
-
-Throughout your response, use relevant emojis to make the content more engaging and highlight key points.
-
-Format your response as structured, actionable advice with clear headings and bullet points."""
-
-        elif learner_type == "medium":
-            prompt = f"""You are an expert educational consultant helping a medium-paced learner with {topic}.
-
-As a medium-paced learner, this student:
-- Learns steadily with consistent practice
-- Benefits from balanced theory and application
-- Retains information best through varied approaches
-- Appreciates clear structure and examples
-Please provide 3 revision strategies specifically tailored for {topic}:
-1. A comprehensive study plan (include time estimates for each component)
-2. A practical application technique that reinforces understanding
-3. A retrieval practice method to strengthen memory retention
-For each strategy:
-- Provide a clear name and description
-- Include 2-3 concrete examples directly related to {topic}
-- Suggest a schedule for implementation
-- Explain how this approach balances depth and efficiency
-Throughout your response, use relevant emojis to make the content more engaging and highlight key points.
-Format your response as structured, actionable advice with clear headings and bullet points."""
-
-        elif learner_type == "slow":
-            prompt = f"""You are an expert educational consultant helping a methodical, deep-learning student with {topic}.
-
-As a methodical learner, this student:
-- Benefits from breaking topics into smaller components
-- Needs sufficient time to process and integrate information
-- Builds strong foundations through repetition and practice
-- Values clear, sequential explanations
-
-Please provide 3 revision strategies specifically tailored for {topic}:
-1. A step-by-step breakdown approach (with detailed time allocation)
-2. A progressive practice method that builds confidence
-3. A visual/conceptual mapping technique to organize knowledge
-
-For each strategy:
-- Provide a clear name and detailed instructions
-- Include 3-4 specific examples directly related to {topic}
-- Suggest checkpoints to verify understanding before moving forward
-- Explain how this approach promotes deep, lasting comprehension
-Throughout your response, use relevant emojis to make the content more engaging and highlight key points.
-Format your response as structured, actionable advice with clear headings, numbered steps, and bullet points."""
-
-        response = client.chat.completions.create(
-            model="llama-3.3-70b-versatile",
-            messages=[
-                {
-                    "role": "system",
-                    "content": "You are an expert educational consultant specializing in personalized learning strategies.",
-                },
-                {"role": "user", "content": prompt},
-            ],
-            temperature=0.7,
-            max_tokens=800,
-        )
-
-        detailed_response = response.choices[0].message.content
+        params = {"topic": topic, "learner_type": learner_type}
 
-        overview_prompt = f"Create a 4-5 word overview that summarizes revision strategies for {topic} for a {learner_type} learner."
-        overview_response = client.chat.completions.create(
-            model="llama-3.3-70b-versatile",
-            messages=[
-                {
-                    "role": "system",
-                    "content": "Create extremely concise summaries in 4-5 words only.",
-                },
-                {"role": "user", "content": overview_prompt},
-            ],
-            temperature=0.7,
-            max_tokens=10,
-        )
+        if stream:
+            cached = await response_cache.peek("revision", params, REVISION_TEMPLATE)
+            return StreamingResponse(
+                stream_revision(request, topic, learner_type, params, cached),
+                media_type="text/event-stream",
+                headers=SSE_HEADERS,
+            )
 
-        overview = overview_response.choices[0].message.content.strip()
+        async def generate():
+            # The two prompts are independent, so latency is the slower call, not the sum
+            response, overview = await asyncio.gather(
+                llm_client.create("revision", **revision_detail_request(topic, learner_type)),
+                generate_revision_overview(topic, learner_type),
+            )
+            detailed_response = response.choices[0].message.content
+            return {"response": detailed_response, "overview": overview}
 
-        return {"response": detailed_response, "overview": overview}
+        return await response_cache.get_or_compute(
+            "revision", params, REVISION_TEMPLATE, generate
+        )
 
+    except HTTPException as e:
+        raise e
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error calling Groq API: {str(e)}")
 
 
+async def stream_revision(request: Request, topic, learner_type, params, cached):
+    if cached is not None:
+        yield sse_event({"overview": cached["overview"]}, event="overview")
+        yield sse_event({"token": cached["response"]}, event="token")
+        yield sse_event(cached, event="done")
+        return
+
+    # Both generations push into one queue so whichever is ready first goes out first
+    queue: asyncio.Queue = asyncio.Queue()
+
+    async def run_overview():
+        try:
+            await queue.put(("overview", await generate_revision_overview(topic, learner_type)))
+        except Exception as e:
+            await queue.put(("error", str(e)))
+
+    async def run_detail():
+        try:
+            async for token in llm_client.stream(
+                "revision", **revision_detail_request(topic, learner_type)
+            ):
+                await queue.put(("token", token))
+            await queue.put(("detail_done", None))
+        except Exception as e:
+            await queue.put(("error", str(e)))
+
+    tasks = [asyncio.create_task(run_overview()), asyncio.create_task(run_detail())]
+    overview, tokens, finished = None, [], 0
+    try:
+        while finished < 2:
+            kind, value = await queue.get()
+            if kind == "error":
+                yield sse_event({"detail": f"Error calling Groq API: {value}"}, event="error")
+                return
+            if await request.is_disconnected():
+                return
+            if kind == "overview":
+                overview = value
+                finished += 1
+                yield sse_event({"overview": overview}, event="overview")
+            elif kind == "token":
+                tokens.append(value)
+                yield sse_event({"token": value}, event="token")
+            else:
+                finished += 1
+
+        result = {"response": "".join(tokens), "overview": overview}
+        await response_cache.put("revision", params, REVISION_TEMPLATE, result)
+        yield sse_event(result, event="done")
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
 @api.post("/carreer")
-def career_path(goal: str, current_qualificaion: str, learner_type: str = "medium"):
+async def career_path(goal: str, current_qualificaion: str, learner_type: str = "medium"):
     try:
         if learner_type not in ["fast", "medium", "slow"]:
             raise HTTPException(
@@ -361,111 +684,44 @@ def career_path(goal: str, current_qualificaion: str, learner_type: str = "mediu
                 detail="Invalid learner type. Choose from 'fast', 'medium', or 'slow'.",
             )
 
-        if learner_type == "fast":
-            prompt = f"""You are a professional career counselor advising someone with current qualifications in {current_qualificaion} who wants to pursue a career in {goal}.
-
-This person is a fast learner who:
-- Acquires new skills quickly and effectively
-- Thrives in dynamic, challenging environments
-- Can handle accelerated learning paths and career progression
-- May need consistent intellectual stimulation to stay engaged
-
-Create a comprehensive career roadmap that includes:
-1. A tailored 12-24 month career transition plan leveraging their fast learning abilities
-2. 3-4 specific skill acquisition milestones with recommended resources (courses, certifications, projects)
-3. Strategic networking and professional development opportunities
-4. Recommended accelerated career advancement strategies
-
-For each component:
-- Provide specific, actionable steps
-- Include estimated timeframes that reflect an accelerated pace
-- Suggest how to leverage existing qualifications in {current_qualificaion}
-- Explain how this approach maximizes their fast learning potential
-
-Throughout your response, use relevant emojis to highlight key points, milestones, and important concepts.
-
-Format your response as a professional career development plan with clear sections, timelines, and action items."""
-
-        elif learner_type == "medium":
-            prompt = f"""You are a professional career counselor advising someone with current qualifications in {current_qualificaion} who wants to pursue a career in {goal}.
-
-This person is a balanced, steady learner who:
-- Acquires skills at a methodical, consistent pace
-- Benefits from structured learning with clear milestones
-- Values practical application alongside theoretical knowledge
-- Maintains good work-life balance during career transitions
-
-Create a comprehensive career roadmap that includes:
-1. A balanced 18-30 month career transition plan with steady progression
-2. 4-5 essential skill development areas with prioritized learning resources
-3. Strategic networking and experience-building opportunities
-4. A sustainable approach to career advancement
-
-For each component:
-- Provide specific, actionable steps with realistic timeframes
-- Balance skill acquisition with practical experience
-- Suggest how to leverage existing qualifications in {current_qualificaion}
-- Include regular progress assessment points
-Throughout your response, use relevant emojis to make the content more engaging and highlight key points.
-Format your response as a professional career development plan with clear sections, timelines, and action items."""
-
-        elif learner_type == "slow":
-            prompt = f"""You are a professional career counselor advising someone with current qualifications in {current_qualificaion} who wants to pursue a career in {goal}.
-
-This person is a methodical, thorough learner who:
-- Prefers depth over speed when acquiring new knowledge
-- Excels with comprehensive understanding of fundamentals
-- Builds strong foundations through careful, sequential learning
-- Values mastery and quality over rapid advancement
-
-Create a comprehensive career roadmap that includes:
-1. A thorough 24-36 month career transition plan emphasizing deep skill development
-2. 4-5 core competency areas with detailed learning progressions
-3. Strategic relationship building and portfolio development opportunities
-4. A long-term approach to career stability and expertise development
-
-For each component:
-- Provide detailed, sequential steps with generous timeframes
-- Emphasize thorough understanding and practical application
-- Suggest how to leverage existing qualifications in {current_qualificaion}
-- Include validation checkpoints to ensure mastery before progression
-Throughout your response, use relevant emojis to make the content more engaging and highlight key points.
-Format your response as a professional career development plan with clear sections, detailed timelines, and measured action items."""
-
-        response = client.chat.completions.create(
-            model="llama-3.3-70b-versatile",
-            messages=[
-                {
-                    "role": "system",
-                    "content": "You are an expert career counselor specializing in personalized career development plans.",
-                },
-                {"role": "user", "content": prompt},
-            ],
-            temperature=0.7,
-            max_tokens=1000,
+        prompt = CAREER_PROMPTS[learner_type].format(
+            goal=goal, current_qualificaion=current_qualificaion
         )
 
-        detailed_response = response.choices[0].message.content
+        async def generate():
+            response = await llm_client.create(
+                "carreer",
+                model="llama-3.3-70b-versatile",
+                messages=[
+                    {"role": "system", "content": CAREER_SYSTEM},
+                    {"role": "user", "content": prompt},
+                ],
+                temperature=0.7,
+                max_tokens=1000,
+            )
 
-        return {
-            "response": detailed_response,
-        }
+            detailed_response = response.choices[0].message.content
 
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error calling Groq API: {str(e)}")
+            return {
+                "response": detailed_response,
+            }
 
+        return await response_cache.get_or_compute(
+            "carreer",
+            {"goal": goal, "current_qualificaion": current_qualificaion, "learner_type": learner_type},
+            CAREER_TEMPLATE,
+            generate,
+        )
 
-@api.post("/video_questions")
-def get_questions(url: str):
-    try:
-        video_id = extract_video_id(url)
-        transcript_list = YouTubeTranscriptApi.get_transcript(video_id)
-        full_text = " ".join([entry["text"] for entry in transcript_list])
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error calling Groq API: {str(e)}")
 
-        if not full_text.strip():
-            raise HTTPException(status_code=400, detail="Transcript is empty or contains only whitespace.")
 
-        prompt = f"""Based on the following transcript, generate 5 multiple-choice questions.
+async def generate_window_questions(text: str, count: int):
+    async def ask(n: int) -> str:
+        prompt = f"""Based on the following transcript, generate {n} multiple-choice questions.
 Each question must have 4 options, and only one option should be the correct answer.
 Provide the output as a JSON list of objects. Each object should have the following keys:
 - "question": (string) The question text.
@@ -473,12 +729,13 @@ Provide the output as a JSON list of objects. Each object should have the follow
 - "correct_answer": (string) The text of the correct option.
 
 Transcript:
-{full_text[:4000]} # Limiting transcript length to avoid exceeding token limits
+{text}
 
 JSON Output:
 """
 
-        response = client.chat.completions.create(
+        return await llm_client.complete(
+            "video_questions",
             model="llama-3.3-70b-versatile",
             messages=[
                 {"role": "system", "content": "You are an AI assistant that generates multiple-choice questions from a given text, formatted as a JSON list of objects."},
@@ -488,45 +745,43 @@ JSON Output:
             max_tokens=1500,
             response_format={"type": "json_object"} 
         )
-        
-        questions_str = response.choices[0].message.content.strip()
-        
-        try:
-            if questions_str.startswith("```json"):
-                questions_str = questions_str.split("```json")[1].split("```")[0].strip()
-            elif questions_str.startswith("```"): # Fallback for just ```
-                questions_str = questions_str.split("```")[1].strip()
 
+    return await generate_list("video_questions", ask, question_item, count)
 
-            parsed_response = json.loads(questions_str)
 
-            if isinstance(parsed_response, dict) and "questions" in parsed_response and isinstance(parsed_response["questions"], list):
-                questions_data = parsed_response["questions"]
-            elif isinstance(parsed_response, list):
-                questions_data = parsed_response
-            else:
-                if isinstance(parsed_response, dict):
-                    for key, value in parsed_response.items():
-                        if isinstance(value, list) and len(value) > 0 and isinstance(value[0], dict) and "question" in value[0]:
-                            questions_data = value
-                            break
-                    else: # no break
-                        raise ValueError("JSON does not contain a list of questions in the expected format.")
-                else:
-                    raise ValueError("JSON response is not a list or a dictionary containing a list of questions.")
-
-        except json.JSONDecodeError as e:
-            # Log the problematic string for debugging
-            print(f"JSONDecodeError: {e}")
-            print(f"Problematic JSON string: {questions_str}")
-            raise HTTPException(status_code=500, detail=f"Error parsing JSON from LLM: {str(e)}. Response: {questions_str}")
-        except ValueError as e:
-            print(f"ValueError: {e}")
-            print(f"Problematic JSON structure: {questions_str}")
-            raise HTTPException(status_code=500, detail=f"LLM response format error: {str(e)}. Response: {questions_str}")
+async def generate_video_questions(full_text: str):
+    """Questions from across the whole transcript, generated window by window."""
+    return await generate_from_transcript(full_text, generate_window_questions)
+
+
+video_question_bank = VideoQuestionBank(generate_video_questions)
+
 
+async def fetch_transcript(video_id: str) -> str:
+    """Transcript text of a YouTube video, fetched once and then served from assessment.db."""
+    full_text = await run_in_threadpool(get_cached_transcript, video_id)
+    if full_text is None:
+        transcript_list = await run_in_threadpool(YouTubeTranscriptApi.get_transcript, video_id)
+        full_text = " ".join([entry["text"] for entry in transcript_list])
+        if full_text.strip():
+            await run_in_threadpool(save_transcript, video_id, full_text)
+    return full_text
+
+
+@api.post("/video_questions")
+async def get_questions(url: str):
+    try:
+        video_id = extract_video_id(url)
+        full_text = await fetch_transcript(video_id)
+
+        if not full_text.strip():
+            raise HTTPException(status_code=400, detail="Transcript is empty or contains only whitespace.")
+
+        questions_data = await video_question_bank.get_questions(video_id, full_text)
         return {"questions": questions_data}
 
+    except StructuredOutputError as e:
+        raise HTTPException(status_code=500, detail=f"LLM response format error: {str(e)}")
     except TranscriptsDisabled:
         raise HTTPException(status_code=400, detail="Transcripts are disabled for this video.")
     except NoTranscriptFound:
@@ -539,92 +794,32 @@ JSON Output:
         raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {str(e)}")
 
 @api.post("/video_questions_transcript")
-def generate_questions(transcript: str):
+async def generate_questions(transcript: str):
     try:
         if not transcript.strip():
             raise HTTPException(status_code=400, detail="Transcript is empty or contains only whitespace.")
 
-        prompt = f"""Based on the following transcript, generate 5 multiple-choice questions.
-Each question must have 4 options, and only one option should be the correct answer.
-Provide the output as a JSON list of objects. Each object should have the following keys:
-- "question": (string) The question text.
-- "options": (list of 4 strings) The multiple choice options.
-- "correct_answer": (string) The text of the correct option.
-
-Transcript:
-{transcript[:4000]} # Limiting transcript length to avoid exceeding token limits
+        questions_data = await generate_video_questions(transcript)
 
-JSON Output:
-"""
+        # Ensure we have questions
+        if not questions_data or len(questions_data) == 0:
+            raise HTTPException(status_code=500, detail="LLM response format error: LLM returned an empty list of questions.")
 
-        response = client.chat.completions.create(
-            model="llama-3.3-70b-versatile",
-            messages=[
-                {"role": "system", "content": "You are an AI assistant that generates multiple-choice questions from a given text, formatted as a JSON list of objects."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.5,
-            max_tokens=1500,
-            response_format={"type": "json_object"} 
-        )
-        
-        questions_str = response.choices[0].message.content.strip()
-        
-        try:
-            # Fix for JSON parsing issues
-            if questions_str.startswith("```json"):
-                questions_str = questions_str.split("```json")[1].split("```")[0].strip()
-            elif questions_str.startswith("```"):
-                questions_str = questions_str.split("```")[1].strip()
-
-            parsed_response = json.loads(questions_str)
-
-            # Standardize the response format
-            questions_data = []
-            if isinstance(parsed_response, dict) and "questions" in parsed_response and isinstance(parsed_response["questions"], list):
-                questions_data = parsed_response["questions"]
-            elif isinstance(parsed_response, list):
-                questions_data = parsed_response
-            else:
-                if isinstance(parsed_response, dict):
-                    for key, value in parsed_response.items():
-                        if isinstance(value, list) and len(value) > 0 and isinstance(value[0], dict) and "question" in value[0]:
-                            questions_data = value
-                            break
-                    else:
-                        raise ValueError("JSON does not contain a list of questions in the expected format.")
-                else:
-                    raise ValueError("JSON response is not a list or a dictionary containing a list of questions.")
-
-            # Ensure we have questions
-            if not questions_data or len(questions_data) == 0:
-                raise ValueError("LLM returned an empty list of questions.")
-                
-            # Limit to 5 questions if more are returned
-            if len(questions_data) > 5:
-                questions_data = questions_data[:5]
-
-            return {"questions": questions_data}
-
-        except json.JSONDecodeError as e:
-            print(f"JSONDecodeError: {e}")
-            print(f"Problematic JSON string: {questions_str}")
-            raise HTTPException(status_code=500, detail=f"Error parsing JSON from LLM: {str(e)}. Response: {questions_str}")
-        except ValueError as e:
-            print(f"ValueError: {e}")
-            print(f"Problematic JSON structure: {questions_str}")
-            raise HTTPException(status_code=500, detail=f"LLM response format error: {str(e)}. Response: {questions_str}")
+        # Limit to 5 questions if more are returned
+        return {"questions": questions_data[:5]}
 
+    except StructuredOutputError as e:
+        raise HTTPException(status_code=500, detail=f"LLM response format error: {str(e)}")
     except HTTPException as e:
         raise e
     except Exception as e:
         print(f"An unexpected error occurred: {type(e).__name__} - {str(e)}")
         raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {str(e)}")
     
-@api.get("/aptitude")
-def get_aptitude_questions():
-    try:
-        prompt = f"""Generate 5 multiple-choice aptitude questions related to mental abilty.
+
+async def generate_aptitude_questions():
+    async def ask(n: int) -> str:
+        prompt = f"""Generate {n} multiple-choice aptitude questions related to mental abilty.
 Each question must have 4 options, and only one option should be the correct answer.
 For general knowledge, include questions about mathematics, logical reasoning, verbal ability, and data interpretation.
 Provide the output as a JSON list of objects. Each object should have the following keys:
@@ -635,125 +830,75 @@ Provide the output as a JSON list of objects. Each object should have the follow
 JSON Output:
 """
 
-        response = client.chat.completions.create(
+        return await llm_client.complete(
+            "aptitude",
             model="llama-3.3-70b-versatile",
             messages=[
                 {"role": "system", "content": "You are an AI assistant that generates multiple-choice aptitude questions formatted as a JSON list of objects."},
                 {"role": "user", "content": prompt}
             ],
-            temperature=0.5,
-            max_tokens=1500,
+            # Varied batches, since near-duplicates of pooled questions are discarded
+            temperature=0.9,
+            max_tokens=3000,
             response_format={"type": "json_object"} 
         )
-        
-        questions_str = response.choices[0].message.content.strip()
-        
-        try:
-            # Clean up potential markdown code block formatting
-            if questions_str.startswith("```json"):
-                questions_str = questions_str.split("```json")[1].split("```")[0].strip()
-            elif questions_str.startswith("```"): 
-                questions_str = questions_str.split("```")[1].strip()
-
-            parsed_response = json.loads(questions_str)
-
-            # Standardize access to the list of questions
-            questions_data = []
-            if isinstance(parsed_response, dict) and "questions" in parsed_response and isinstance(parsed_response["questions"], list):
-                questions_data = parsed_response["questions"]
-            elif isinstance(parsed_response, list):
-                questions_data = parsed_response
-            else: # Try to find a list of questions if the structure is slightly different
-                if isinstance(parsed_response, dict):
-                    for key, value in parsed_response.items():
-                        if isinstance(value, list) and len(value) > 0 and isinstance(value[0], dict) and "question" in value[0]:
-                            questions_data = value
-                            break
-                    else: # no break
-                        raise ValueError("JSON does not contain a list of questions in the expected format.")
-                else:
-                    raise ValueError("JSON response is not a list or a dictionary containing a list of questions.")
-
-            if not questions_data or len(questions_data) == 0:
-                raise ValueError("LLM returned an empty list of questions.")
-                
-            if len(questions_data) > 5:
-                questions_data = questions_data[:5]
-                
-            return {"questions": questions_data}
-
-        except json.JSONDecodeError as e:
-            print(f"JSONDecodeError: {e}")
-            print(f"Problematic JSON string: {questions_str}")
-            raise HTTPException(status_code=500, detail=f"Error parsing JSON from LLM: {str(e)}. Response: {questions_str}")
-        except ValueError as e:
-            print(f"ValueError: {e}")
-            print(f"Problematic JSON structure: {questions_str}")
-            raise HTTPException(status_code=500, detail=f"LLM response format error: {str(e)}. Response: {questions_str}")
 
-    except HTTPException as e: 
+    return await generate_list("aptitude", ask, question_item, APTITUDE_BATCH_SIZE)
+
+
+aptitude_pool = AptitudeQuestionPool(generate_aptitude_questions, embeddings)
+
+
+@api.get("/aptitude")
+async def get_aptitude_questions(user_id: Optional[str] = None):
+    """
+    5 questions from the pre-generated pool. With a user_id, questions the user
+    has already been shown are avoided.
+    """
+    try:
+        questions_data = await aptitude_pool.get_questions(user_id)
+        if not questions_data:
+            raise HTTPException(status_code=503, detail="No aptitude questions are available yet.")
+        return {"questions": questions_data}
+    except HTTPException as e:
         raise e
     except Exception as e:
         print(f"An unexpected error occurred: {type(e).__name__} - {str(e)}")
         raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {str(e)}")
 
 
+@api.get("/aptitude/stats")
+def get_aptitude_pool_stats():
+    return aptitude_pool.stats()
+
+
 @api.post("/assessment")
 def assess_learner_type(video_correct: int, aptitude_correct: int):
     try:
-        prompt = f"""You are an expert student assessor. Based on the following performance metrics, classify the student as a 'slow', 'medium', or 'fast' learner.
-
-Aptitude Test Performance:
-- Correct Answers: {aptitude_correct} out of 5
-
-Video Comprehension Performance:
-- Correct Answers: {video_correct} out of 5
+        classification = resources.classifier().classify(video_correct, aptitude_correct)
+        return {"learner_type_assessment": classification}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-Consider that 'fast' learners grasp concepts quickly and perform very well (e.g., high scores like 4 aptitude and 4 video correct),
-'medium' learners show steady understanding (e.g., moderate scores),
-and 'slow' learners might need more time and support (e.g., lower scores like 0-1 correct).
 
-Provide your classification as a single word: 'slow', 'medium', or 'fast'.
+class AssessmentScores(BaseModel):
+    video_correct: int
+    aptitude_correct: int
 
-Classification:"""
 
-        response = client.chat.completions.create(
-            model="llama-3.3-70b-versatile",
-            messages=[
-                {
-                    "role": "system",
-                    "content": "You are an AI assistant that classifies learners based on performance data. Respond with a single word: 'slow', 'medium', or 'fast'.",
-                },
-                {"role": "user", "content": prompt},
-            ],
-            temperature=0.2,  # Lower temperature for more deterministic classification
-            max_tokens=10,  # Expecting a short response
+@api.post("/assessment_batch")
+def assess_learner_types(scores: List[AssessmentScores]):
+    """
+    Classify many (video_correct, aptitude_correct) pairs in one call.
+    Results are returned in the same order as the input.
+    """
+    try:
+        classifications = resources.classifier().classify_batch(
+            [s.video_correct for s in scores], [s.aptitude_correct for s in scores]
         )
-
-        classification = response.choices[0].message.content.strip().lower()
-
-        allowed_classifications = ["slow", "medium", "fast"]
-        if classification not in allowed_classifications:
-            # Fallback or attempt to find the keyword if the LLM adds minor extra text
-            for allowed_class in allowed_classifications:
-                if allowed_class in classification:
-                    classification = allowed_class
-                    break
-            else:  # no break
-                print(f"Unexpected classification from LLM: {classification}")
-                raise HTTPException(
-                    status_code=500,
-                    detail=f"Received unexpected classification from LLM: {response.choices[0].message.content.strip()}",
-                )
-
-        return {"learner_type_assessment": classification}
-
-    except HTTPException as e:
-        raise e
-    except Exception as e:
-        print(f"An unexpected error occurred in assess_learner_type: {type(e).__name__} - {str(e)}")
-        raise HTTPException(status_code=500, detail=f"An unexpected error occurred during learner assessment: {str(e)}")
-
+        return {"learner_type_assessments": classifications}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 
 @api.post("/create_session")
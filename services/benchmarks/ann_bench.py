@@ -0,0 +1,111 @@
+"""
+Recall and latency of the approximate index types against exact flat search.
+
+    python -m benchmarks.ann_bench --subject "Design and Analysis of Algorithms"
+    python -m benchmarks.ann_bench --random 300000 --types ivf_flat ivf_pq hnsw
+
+Vectors come from a subject's index (every type built by utils.ann_index keeps
+the exact vectors) or are random, for corpus sizes no single textbook reaches.
+Queries are corpus vectors with a little noise added, so their neighbours are
+like those of a student question close to one chunk. Recall@k is the fraction of the exact top-k
+found; each type is measured over a sweep of nprobe or efSearch values, with
+IVF-PQ's re-ranking k_factor as stored.
+"""
+import argparse
+import os
+import statistics
+import time
+
+import faiss
+import numpy as np
+
+from utils.ann_index import build_index, choose_index_type, index_vectors
+
+NPROBE_SWEEP = (1, 4, 8, 16, 32, 64, 128)
+EF_SEARCH_SWEEP = (16, 32, 64, 128, 256)
+
+
+def subject_vectors(rag_dir: str, subject: str) -> np.ndarray:
+    return index_vectors(faiss.read_index(os.path.join(rag_dir, subject, "index.faiss")))
+
+
+def random_vectors(count: int, dim: int, seed: int = 0) -> np.ndarray:
+    # Clustered rather than uniform, like embeddings of text on a few topics
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((max(1, count // 500), dim)).astype(np.float32)
+    vectors = centers[rng.integers(len(centers), size=count)]
+    vectors += 0.5 * rng.standard_normal((count, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def make_queries(vectors: np.ndarray, count: int, seed: int = 1) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    queries = vectors[rng.choice(len(vectors), min(count, len(vectors)), replace=False)].copy()
+    queries += 0.05 * rng.standard_normal(queries.shape).astype(np.float32)
+    return queries
+
+
+def measure(index, queries: np.ndarray, truth: np.ndarray, k: int):
+    latencies, found = [], []
+    for i in range(len(queries)):
+        start = time.perf_counter()
+        _, positions = index.search(queries[i:i + 1], k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        found.append(len(set(positions[0]) & set(truth[i])) / k)
+    latencies.sort()
+    return statistics.mean(found), statistics.mean(latencies), latencies[int(0.95 * (len(latencies) - 1))]
+
+
+def report(name: str, recall: float, mean_ms: float, p95_ms: float, k: int):
+    print(f"{name:<24} recall@{k} {recall:.3f}  latency ms: mean {mean_ms:.3f}  p95 {p95_ms:.3f}")
+
+
+def index_bytes(index) -> int:
+    return len(faiss.serialize_index(index))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--subject")
+    source.add_argument("--random", type=int, help="number of random vectors")
+    parser.add_argument("--rag-dir", default="RAG")
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--types", nargs="+", default=["ivf_flat", "ivf_pq", "hnsw"])
+    parser.add_argument("--threads", type=int, default=1, help="FAISS threads; 1 matches one request")
+    args = parser.parse_args()
+
+    faiss.omp_set_num_threads(args.threads)
+    if args.subject:
+        vectors = subject_vectors(args.rag_dir, args.subject)
+    else:
+        vectors = random_vectors(args.random, args.dim)
+    queries = make_queries(vectors, args.queries)
+    print(
+        f"{len(vectors)} vectors of dim {vectors.shape[1]}, {len(queries)} queries; "
+        f"auto would choose {choose_index_type(len(vectors), 'auto')}"
+    )
+
+    flat, _ = build_index(vectors, "flat")
+    _, truth = flat.search(queries, args.k)
+    report("flat", *measure(flat, queries, truth, args.k), args.k)
+    print(f"{'':<24} {index_bytes(flat) / 2**20:.1f} MiB")
+
+    for index_type in args.types:
+        index, params = build_index(vectors, index_type)
+        settings = {key: value for key, value in params.items() if key not in ("type", "ntotal", "dim", "metric")}
+        print(f"{index_type}: {settings}, {index_bytes(index) / 2**20:.1f} MiB")
+        space = faiss.ParameterSpace()
+        if index_type == "hnsw":
+            sweep = [("efSearch", ef) for ef in EF_SEARCH_SWEEP]
+        else:
+            sweep = [("nprobe", n) for n in NPROBE_SWEEP if n <= params["nlist"]]
+        for name, value in sweep:
+            space.set_index_parameter(index, name, value)
+            report(f"  {name}={value}", *measure(index, queries, truth, args.k), args.k)
+
+
+if __name__ == "__main__":
+    main()
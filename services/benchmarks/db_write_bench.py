@@ -0,0 +1,51 @@
+"""
+Concurrent write throughput for the chat log table.
+
+    python -m benchmarks.db_write_bench --threads 16 --writes 500
+
+Simulates /chat handlers logging from the threadpool against a scratch database.
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+import uuid
+
+from utils import database
+
+
+def run(threads: int, writes: int):
+    def worker():
+        session_id = str(uuid.uuid4())
+        for i in range(writes):
+            database.insert_application_logs(session_id, "bench", f"question {i}", "answer " * 50)
+            if i % 10 == 0:
+                database.get_chat_history(session_id)
+        database.close_db_connection()
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    start = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    elapsed = time.perf_counter() - start
+
+    total = threads * writes
+    print(f"{total} writes from {threads} threads in {elapsed:.2f}s: {total / elapsed:.0f} writes/s")
+    print(database.get_write_stats())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--writes", type=int, default=500)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database.close_db_connection()
+        database.DB_NAME = os.path.join(tmp, "bench.db")
+        database.create_application_logs()
+        run(args.threads, args.writes)
+        database.close_db_connection()
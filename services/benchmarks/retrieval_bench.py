@@ -0,0 +1,101 @@
+"""
+Precision@k and latency of dense, hybrid and re-ranked hybrid retrieval.
+
+    python -m benchmarks.retrieval_bench "Design and Analysis of Algorithms" --synthetic 200
+    python -m benchmarks.retrieval_bench "Design and Analysis of Algorithms" --queries queries.jsonl --rerank
+
+queries.jsonl has one {"query": ..., "pages": [...]} object per line, listing the
+textbook pages that answer the query. With --synthetic, queries are sentences
+taken from random chunks, and the chunk's own page is the relevant one; this
+mostly measures exact-term recall, which is what the BM25 side is for.
+"""
+import argparse
+import json
+import os
+import random
+import re
+import statistics
+import time
+
+from utils.hybrid_search import (
+    RAG_TOP_K,
+    HybridRetriever,
+    get_reranker,
+    load_bm25,
+)
+from utils.index_store import iter_chunks, load_index
+from utils.resources import LazyEmbeddings
+
+SENTENCE = re.compile(r"[^.!?\n]{40,200}[.!?]")
+
+
+def synthetic_queries(vector_db, count: int, seed: int = 0):
+    rng = random.Random(seed)
+    chunks = [doc for doc in iter_chunks(vector_db) if SENTENCE.search(doc.page_content)]
+    queries = []
+    for doc in rng.sample(chunks, min(count, len(chunks))):
+        sentence = rng.choice(SENTENCE.findall(doc.page_content))
+        # A student-length query, not the whole sentence
+        words = sentence.split()
+        start = rng.randrange(max(1, len(words) - 10))
+        queries.append({"query": " ".join(words[start:start + 10]), "pages": [doc.metadata.get("page")]})
+    return queries
+
+
+def evaluate(name, retrieve, queries, k):
+    precisions, hits, latencies = [], [], []
+    for q in queries:
+        relevant = set(q["pages"])
+        start = time.perf_counter()
+        docs = retrieve(q["query"])[:k]
+        latencies.append((time.perf_counter() - start) * 1000)
+        matches = sum(1 for doc in docs if doc.metadata.get("page") in relevant)
+        precisions.append(matches / k)
+        hits.append(1.0 if matches else 0.0)
+    latencies.sort()
+    print(
+        f"{name:<16} P@{k} {statistics.mean(precisions):.3f}  hit@{k} {statistics.mean(hits):.3f}  "
+        f"latency ms: mean {statistics.mean(latencies):.1f}  "
+        f"p95 {latencies[int(0.95 * (len(latencies) - 1))]:.1f}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("subject")
+    parser.add_argument("--rag-dir", default="RAG")
+    parser.add_argument("--queries", help="JSONL file of {query, pages}")
+    parser.add_argument("--synthetic", type=int, default=100)
+    parser.add_argument("--k", type=int, default=RAG_TOP_K)
+    parser.add_argument("--rerank", action="store_true", help="also measure the cross-encoder stage")
+    args = parser.parse_args()
+
+    path = os.path.join(args.rag_dir, args.subject)
+    embeddings = LazyEmbeddings()
+    vector_db = load_index(path, embeddings)
+    bm25 = load_bm25(path)
+    if bm25 is None:
+        raise SystemExit(f"No BM25 index in {path}; run python -m utils.index_store {args.rag_dir}")
+
+    if args.queries:
+        with open(args.queries) as f:
+            queries = [json.loads(line) for line in f if line.strip()]
+    else:
+        queries = synthetic_queries(vector_db, args.synthetic)
+    print(f"{len(queries)} queries against {vector_db.index.ntotal} chunks of {args.subject}")
+
+    # Load the models before timing anything
+    embeddings.embed_query("warm up")
+    dense = vector_db.as_retriever(search_kwargs={"k": args.k})
+    hybrid = HybridRetriever(vector_db=vector_db, bm25=bm25, k=args.k)
+    evaluate("dense", dense.invoke, queries, args.k)
+    evaluate("hybrid", hybrid.invoke, queries, args.k)
+    if args.rerank:
+        reranker = get_reranker()
+        reranker.rerank("warm up", [vector_db.docstore.search(vector_db.index_to_docstore_id[0])] * 2, 1)
+        reranked = HybridRetriever(vector_db=vector_db, bm25=bm25, k=args.k, reranker=reranker)
+        evaluate("hybrid+rerank", reranked.invoke, queries, args.k)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,24 @@
+"""
+Optional multi-worker setup, as an alternative to a single `uvicorn api:api`.
+
+    pip install gunicorn
+    gunicorn -c gunicorn.conf.py api:api
+
+With PRELOAD_EMBEDDINGS=1 the app is imported and the embedding model loaded once
+in the master process, so forked workers share its weights copy-on-write instead
+of each loading their own copy. The model only runs inference in the workers.
+"""
+import os
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = os.getenv("PRELOAD_EMBEDDINGS") == "1"
+
+
+def on_starting(server):
+    if preload_app:
+        # Already imported by preload_app; this only loads the model weights
+        from api import resources
+
+        resources.embeddings.load()
@@ -0,0 +1,40 @@
+import numpy as np
+
+from utils.embedding_cache import CachedEmbeddings
+
+
+class FakeEmbeddings:
+    model_name = "fake"
+
+    def __init__(self):
+        self.calls = 0
+
+    def embed_documents(self, texts):
+        self.calls += 1
+        return [[float(len(text)), 1.0, 2.0] for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+def test_store_opened_empty_reads_vectors_written_by_another(tmp_path):
+    # Two workers open the cache before either has written a vector
+    first = CachedEmbeddings(FakeEmbeddings(), cache_dir=str(tmp_path))
+    second = CachedEmbeddings(FakeEmbeddings(), cache_dir=str(tmp_path))
+    assert first.store.dim is None and second.store.dim is None
+
+    written = second.embed_documents(["a chunk", "another chunk"])
+    assert first.embed_documents(["a chunk", "another chunk"]) == written
+    assert first.embeddings.calls == 0
+    assert first.hits == 2 and first.misses == 0
+
+
+def test_store_sees_rows_appended_after_it_mapped_the_file(tmp_path):
+    first = CachedEmbeddings(FakeEmbeddings(), cache_dir=str(tmp_path))
+    second = CachedEmbeddings(FakeEmbeddings(), cache_dir=str(tmp_path))
+    first.embed_documents(["one"])
+    assert first.embed_documents(["one"]) == [[3.0, 1.0, 2.0]]
+
+    second.embed_documents(["three"])
+    assert np.allclose(first.embed_documents(["three"]), [[5.0, 1.0, 2.0]])
+    assert first.embeddings.calls == 1
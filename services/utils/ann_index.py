@@ -0,0 +1,190 @@
+"""
+Choice and construction of the FAISS index type for a subject.
+
+Ingestion builds an exact flat index, whose search cost grows linearly with the
+number of chunks. That is fine for one textbook, so small subjects keep it; when
+save_index writes a larger one, it is rebuilt as an approximate index:
+
+    flat        exact search, below RAG_IVF_MIN_CHUNKS chunks
+    ivf_flat    inverted lists of full vectors, up to RAG_IVF_PQ_MIN_CHUNKS chunks
+    ivf_pq      inverted lists of product-quantized codes, with the exact
+                vectors (memory-mapped) re-ranking the top k * k_factor candidates
+    hnsw        graph search; only when RAG_INDEX_TYPE=hnsw, since the graph is
+                read into each worker's heap instead of being memory-mapped
+
+The build parameters and the default search settings are stored next to the
+index in index.json, and applied when it is loaded. RAG_NPROBE, RAG_EF_SEARCH and
+RAG_REFINE_K_FACTOR override the stored nprobe (IVF), efSearch (HNSW) and k_factor
+(IVF-PQ) to trade recall for latency; benchmarks/ann_bench.py measures them
+against the flat baseline.
+"""
+import json
+import os
+import time
+from typing import Dict, Optional, Tuple
+
+import faiss
+import numpy as np
+
+PARAMS_FILE = "index.json"
+INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "hnsw")
+
+# "auto" picks by chunk count; any of INDEX_TYPES forces that type
+RAG_INDEX_TYPE = os.getenv("RAG_INDEX_TYPE", "auto")
+RAG_IVF_MIN_CHUNKS = int(os.getenv("RAG_IVF_MIN_CHUNKS", "20000"))
+RAG_IVF_PQ_MIN_CHUNKS = int(os.getenv("RAG_IVF_PQ_MIN_CHUNKS", "200000"))
+# Search-time overrides of the stored settings
+RAG_NPROBE = os.getenv("RAG_NPROBE")
+RAG_EF_SEARCH = os.getenv("RAG_EF_SEARCH")
+RAG_REFINE_K_FACTOR = os.getenv("RAG_REFINE_K_FACTOR")
+
+# k-means needs about this many training points per list to place centroids well
+MIN_POINTS_PER_LIST = 39
+TRAINING_POINTS_PER_LIST = 128
+PQ_NBITS = 8
+# Dimensions per PQ sub-quantizer: 384-dim MiniLM vectors become 48-byte codes
+PQ_DIMS_PER_CODE = 8
+# PQ distances alone find about half of the exact top 4; re-ranking 16x as many
+# candidates with the exact vectors brings recall@4 back to about 0.97
+REFINE_K_FACTOR = 16
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 80
+HNSW_EF_SEARCH = 64
+
+
+def choose_index_type(ntotal: int, requested: str = RAG_INDEX_TYPE) -> str:
+    if requested != "auto":
+        if requested not in INDEX_TYPES:
+            raise ValueError(f"Unknown index type {requested!r}, expected auto or one of {INDEX_TYPES}")
+        return requested
+    if ntotal < RAG_IVF_MIN_CHUNKS:
+        return "flat"
+    return "ivf_flat" if ntotal < RAG_IVF_PQ_MIN_CHUNKS else "ivf_pq"
+
+
+def ivf_lists(ntotal: int) -> int:
+    """About 4 * sqrt(n) lists, with enough points per list to train."""
+    return max(1, min(int(4 * np.sqrt(ntotal)), ntotal // MIN_POINTS_PER_LIST))
+
+
+def default_nprobe(nlist: int) -> int:
+    # About 3% of the lists; recall@4 is close to 1.0 there on clustered embeddings
+    return min(nlist, max(8, nlist // 32))
+
+
+def pq_subquantizers(dim: int) -> int:
+    m = max(1, dim // PQ_DIMS_PER_CODE)
+    while dim % m:
+        m -= 1
+    return m
+
+
+def training_sample(vectors: np.ndarray, size: int, seed: int = 0) -> np.ndarray:
+    if len(vectors) <= size:
+        return vectors
+    rng = np.random.default_rng(seed)
+    return vectors[np.sort(rng.choice(len(vectors), size, replace=False))]
+
+
+def build_index(vectors: np.ndarray, index_type: str) -> Tuple[faiss.Index, Dict]:
+    """
+    Build an L2 index of the given type over vectors, in order.
+
+    Positions in the new index match the rows of vectors, so the docstore and
+    bm25.db written for the flat index stay valid. Returns (index, params).
+    """
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    ntotal, dim = vectors.shape
+    start = time.perf_counter()
+    params: Dict = {"type": index_type, "ntotal": ntotal, "dim": dim, "metric": "l2"}
+
+    if index_type == "flat":
+        index = faiss.index_factory(dim, "Flat")
+    elif index_type == "hnsw":
+        index = faiss.index_factory(dim, f"HNSW{HNSW_M}")
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        params.update(m=HNSW_M, ef_construction=HNSW_EF_CONSTRUCTION, ef_search=HNSW_EF_SEARCH)
+    elif index_type in ("ivf_flat", "ivf_pq"):
+        nlist = ivf_lists(ntotal)
+        if index_type == "ivf_flat":
+            index = faiss.index_factory(dim, f"IVF{nlist},Flat")
+        else:
+            m = pq_subquantizers(dim)
+            index = faiss.index_factory(dim, f"IVF{nlist},PQ{m}x{PQ_NBITS},RFlat")
+            params.update(pq_m=m, pq_nbits=PQ_NBITS, k_factor=REFINE_K_FACTOR)
+        index.train(training_sample(vectors, nlist * TRAINING_POINTS_PER_LIST))
+        params.update(nlist=nlist, nprobe=default_nprobe(nlist))
+    else:
+        raise ValueError(f"Unknown index type {index_type!r}")
+
+    index.add(vectors)
+    params["build_seconds"] = round(time.perf_counter() - start, 2)
+    configure_search(index, params)
+    return index, params
+
+
+def index_vectors(index: faiss.Index) -> np.ndarray:
+    """The exact vectors of an index, in position order, for rebuilding it as another type."""
+    if isinstance(index, faiss.IndexRefine):
+        # Read from the exact vectors kept for re-ranking
+        return index.reconstruct_n(0, index.ntotal)
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        if not isinstance(faiss.downcast_index(ivf), faiss.IndexIVFFlat):
+            raise ValueError("A product-quantized index only holds approximate vectors; re-embed the chunks instead")
+        ivf.make_direct_map()
+    return index.reconstruct_n(0, index.ntotal)
+
+
+def configure_search(index: faiss.Index, params: Dict):
+    """Apply the stored search settings, or their RAG_NPROBE/RAG_EF_SEARCH/RAG_REFINE_K_FACTOR overrides."""
+    space = faiss.ParameterSpace()
+    if params.get("type") in ("ivf_flat", "ivf_pq"):
+        nprobe = int(RAG_NPROBE) if RAG_NPROBE else params["nprobe"]
+        space.set_index_parameter(index, "nprobe", min(nprobe, params["nlist"]))
+    if params.get("type") == "ivf_pq":
+        k_factor = int(RAG_REFINE_K_FACTOR) if RAG_REFINE_K_FACTOR else params["k_factor"]
+        space.set_index_parameter(index, "k_factor_rf", k_factor)
+    if params.get("type") == "hnsw":
+        ef_search = int(RAG_EF_SEARCH) if RAG_EF_SEARCH else params["ef_search"]
+        space.set_index_parameter(index, "efSearch", ef_search)
+
+
+def search_parameters(index: faiss.Index, selector, fraction: float):
+    """
+    Search parameters restricting a search to the ids accepted by selector.
+
+    fraction is the share of the index the selector accepts. Approximate indexes
+    only look at part of the index, so with a narrow filter they would find few
+    accepted ids; nprobe and efSearch are scaled up by 1 / fraction to compensate.
+    """
+    index = faiss.downcast_index(index)
+    scale = 1.0 / max(fraction, 1e-6)
+    if isinstance(index, faiss.IndexRefine):
+        return faiss.IndexRefineSearchParameters(
+            k_factor=index.k_factor,
+            base_index_params=search_parameters(index.base_index, selector, fraction),
+        )
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        return faiss.SearchParametersIVF(sel=selector, nprobe=min(ivf.nlist, int(ivf.nprobe * scale)))
+    if isinstance(index, faiss.IndexHNSW):
+        return faiss.SearchParametersHNSW(
+            sel=selector, efSearch=min(index.ntotal, int(index.hnsw.efSearch * scale))
+        )
+    return faiss.SearchParameters(sel=selector)
+
+
+def write_params(params: Dict, path: str):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(params, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def read_params(path: str) -> Optional[Dict]:
+    """The stored parameters, or None for indexes saved before index.json existed (all flat)."""
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
@@ -1,64 +1,127 @@
 import sqlite3
 import os
 import json
+import time
 from typing import List, Dict, Any, Optional
 from datetime import datetime
 
+from utils.migrations import apply_migrations
+
 # Database setup
 DB_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "assessment.db")
 
+# Schema changes to assessment.db, applied in order by utils.migrations.
+# Never edit a migration that has shipped; append a new one instead.
+MIGRATIONS = [
+    # 1: tables as created by earlier versions of this module
+    [
+        '''
+        CREATE TABLE IF NOT EXISTS video_questions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id TEXT NOT NULL,
+            question TEXT NOT NULL,
+            correct_answer TEXT NOT NULL,
+            video_id TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS aptitude_questions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id TEXT NOT NULL,
+            question TEXT NOT NULL,
+            correct_answer TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS user_assessments (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id TEXT NOT NULL,
+            video_score INTEGER NOT NULL,
+            aptitude_score INTEGER NOT NULL,
+            learner_type TEXT NOT NULL,
+            assessment_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        # Transcripts fetched from YouTube, keyed by video ID
+        '''
+        CREATE TABLE IF NOT EXISTS video_transcripts (
+            video_id TEXT PRIMARY KEY,
+            transcript TEXT NOT NULL,
+            fetched_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        # Generated questions shared by everyone who is assessed on the same video
+        '''
+        CREATE TABLE IF NOT EXISTS video_question_bank (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            video_id TEXT NOT NULL,
+            question TEXT NOT NULL,
+            options TEXT NOT NULL,
+            correct_answer TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE (video_id, question)
+        )
+        ''',
+        # Pre-generated aptitude questions served to every user, with their embeddings
+        '''
+        CREATE TABLE IF NOT EXISTS aptitude_question_pool (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            question TEXT NOT NULL UNIQUE,
+            options TEXT NOT NULL,
+            correct_answer TEXT NOT NULL,
+            embedding BLOB,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        # Which pooled aptitude questions each user has already been shown
+        '''
+        CREATE TABLE IF NOT EXISTS aptitude_served (
+            user_id TEXT NOT NULL,
+            question_id INTEGER NOT NULL,
+            served_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (user_id, question_id)
+        )
+        ''',
+    ],
+    # 2: per-user lookups and deletes
+    [
+        'CREATE INDEX IF NOT EXISTS idx_video_questions_user ON video_questions (user_id)',
+        'CREATE INDEX IF NOT EXISTS idx_aptitude_questions_user ON aptitude_questions (user_id)',
+        'CREATE INDEX IF NOT EXISTS idx_user_assessments_user_date ON user_assessments (user_id, assessment_date)',
+    ],
+    # 3: which worker is refilling a shared pool, so the others do not generate too
+    [
+        '''
+        CREATE TABLE IF NOT EXISTS refill_leases (
+            name TEXT PRIMARY KEY,
+            owner TEXT NOT NULL,
+            expires_at REAL NOT NULL
+        )
+        ''',
+    ],
+]
+
 def ensure_db_directory():
     """Ensure the directory for the database exists"""
     os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
 
 def initialize_db():
-    """Initialize the database with necessary tables"""
-    ensure_db_directory()
-    
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
+    """
+    Bring the database schema up to date by applying pending MIGRATIONS
     
-    # Drop existing tables if they exist to recreate with user_id field
-    cursor.execute('DROP TABLE IF EXISTS video_questions')
-    cursor.execute('DROP TABLE IF EXISTS aptitude_questions')
-    
-    # Create table for video questions with user_id
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS video_questions (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        user_id TEXT NOT NULL,
-        question TEXT NOT NULL,
-        correct_answer TEXT NOT NULL,
-        video_id TEXT,
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-    )
-    ''')
-    
-    # Create table for aptitude questions with user_id
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS aptitude_questions (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        user_id TEXT NOT NULL,
-        question TEXT NOT NULL,
-        correct_answer TEXT NOT NULL,
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-    )
-    ''')
-    
-    # Create table for user assessment results
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS user_assessments (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        user_id TEXT NOT NULL,
-        video_score INTEGER NOT NULL,
-        aptitude_score INTEGER NOT NULL,
-        learner_type TEXT NOT NULL,
-        assessment_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-    )
-    ''')
+    Safe to call from every worker at startup: when nothing is pending this is a
+    version check, and otherwise one worker migrates while the others wait on the
+    write lock and then find nothing left to do. Existing data is never dropped.
+    """
+    ensure_db_directory()
     
-    conn.commit()
-    conn.close()
+    conn = sqlite3.connect(DB_PATH, timeout=30, isolation_level=None)
+    try:
+        apply_migrations(conn, MIGRATIONS)
+    finally:
+        conn.close()
 
 def clear_previous_video_questions(user_id: str):
     """Delete all previous video questions for a user"""
@@ -350,5 +413,287 @@ def get_aptitude_questions(user_id: str) -> List[Dict[str, Any]]:
     
     return results
 
-# Initialize the database when the module is imported
-initialize_db()
\ No newline at end of file
+def get_cached_transcript(video_id: str) -> Optional[str]:
+    """Get a previously fetched transcript for a YouTube video"""
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    
+    cursor.execute(
+        '''
+        SELECT transcript FROM video_transcripts WHERE video_id = ?
+        ''',
+        (video_id,)
+    )
+    
+    result = cursor.fetchone()
+    conn.close()
+    
+    if result:
+        return result[0]
+    return None
+
+def save_transcript(video_id: str, transcript: str):
+    """Cache the transcript of a YouTube video"""
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    
+    cursor.execute(
+        '''
+        INSERT OR REPLACE INTO video_transcripts (video_id, transcript)
+        VALUES (?, ?)
+        ''',
+        (video_id, transcript)
+    )
+    
+    conn.commit()
+    conn.close()
+
+def add_to_video_question_bank(video_id: str, questions_data: List[Dict[str, Any]]) -> int:
+    """
+    Add generated questions to a video's question bank, skipping ones it already has
+    
+    Args:
+        video_id: YouTube video ID
+        questions_data: List of question dictionaries with 'question', 'options' and 'correct_answer'
+        
+    Returns:
+        The number of questions added
+    """
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    
+    cursor.executemany(
+        '''
+        INSERT OR IGNORE INTO video_question_bank (video_id, question, options, correct_answer)
+        VALUES (?, ?, ?, ?)
+        ''',
+        [
+            (video_id, q_data['question'], json.dumps(q_data['options']), q_data['correct_answer'])
+            for q_data in questions_data
+        ]
+    )
+    
+    added = cursor.rowcount
+    conn.commit()
+    conn.close()
+    
+    return added
+
+def count_video_question_bank(video_id: str) -> int:
+    """Get the number of banked questions for a video"""
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    
+    cursor.execute(
+        '''
+        SELECT COUNT(*) FROM video_question_bank WHERE video_id = ?
+        ''',
+        (video_id,)
+    )
+    
+    count = cursor.fetchone()[0]
+    conn.close()
+    
+    return count
+
+def sample_video_question_bank(video_id: str, limit: int = 5) -> List[Dict[str, Any]]:
+    """
+    Pick random questions from a video's question bank
+    
+    Args:
+        video_id: YouTube video ID
+        limit: Number of questions to return
+        
+    Returns:
+        List of dictionaries with question text, options and correct answer
+    """
+    conn = sqlite3.connect(DB_PATH)
+    conn.row_factory = sqlite3.Row
+    cursor = conn.cursor()
+    
+    cursor.execute(
+        '''
+        SELECT question, options, correct_answer
+        FROM video_question_bank
+        WHERE video_id = ?
+        ORDER BY RANDOM()
+        LIMIT ?
+        ''',
+        (video_id, limit)
+    )
+    
+    results = [
+        {"question": row["question"], "options": json.loads(row["options"]), "correct_answer": row["correct_answer"]}
+        for row in cursor.fetchall()
+    ]
+    conn.close()
+    
+    return results
+
+def add_to_aptitude_pool(questions_data: List[Dict[str, Any]], embeddings: List[bytes]) -> int:
+    """
+    Add generated aptitude questions to the shared pool, skipping exact duplicates
+    
+    Args:
+        questions_data: List of question dictionaries with 'question', 'options' and 'correct_answer'
+        embeddings: float32 embedding of each question, as raw bytes
+        
+    Returns:
+        The number of questions added
+    """
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    
+    cursor.executemany(
+        '''
+        INSERT OR IGNORE INTO aptitude_question_pool (question, options, correct_answer, embedding)
+        VALUES (?, ?, ?, ?)
+        ''',
+        [
+            (q_data['question'], json.dumps(q_data['options']), q_data['correct_answer'], embedding)
+            for q_data, embedding in zip(questions_data, embeddings)
+        ]
+    )
+    
+    added = cursor.rowcount
+    conn.commit()
+    conn.close()
+    
+    return added
+
+def count_aptitude_pool() -> int:
+    """Get the number of questions in the aptitude pool"""
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    
+    cursor.execute('SELECT COUNT(*) FROM aptitude_question_pool')
+    
+    count = cursor.fetchone()[0]
+    conn.close()
+    
+    return count
+
+def get_aptitude_pool_embeddings(after_id: int = 0) -> List[tuple]:
+    """Get (id, embedding bytes) of pooled aptitude questions added after after_id"""
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    
+    cursor.execute(
+        '''
+        SELECT id, embedding FROM aptitude_question_pool
+        WHERE id > ? AND embedding IS NOT NULL
+        ORDER BY id
+        ''',
+        (after_id,)
+    )
+    
+    results = cursor.fetchall()
+    conn.close()
+    
+    return results
+
+def serve_aptitude_questions(user_id: Optional[str], limit: int = 5) -> List[Dict[str, Any]]:
+    """
+    Pick pooled aptitude questions for a user and record them as served
+    
+    Questions the user has never seen come first, in random order. Only when the
+    user has seen nearly the whole pool are the ones they saw longest ago repeated.
+    
+    Args:
+        user_id: The ID of the user, or None for a random pick that is not recorded
+        limit: Number of questions to return
+        
+    Returns:
+        List of dictionaries with question text, options and correct answer
+    """
+    conn = sqlite3.connect(DB_PATH)
+    conn.row_factory = sqlite3.Row
+    cursor = conn.cursor()
+    
+    cursor.execute(
+        '''
+        SELECT p.id, p.question, p.options, p.correct_answer
+        FROM aptitude_question_pool p
+        LEFT JOIN aptitude_served s ON s.question_id = p.id AND s.user_id = ?
+        ORDER BY s.served_at IS NOT NULL, s.served_at, RANDOM()
+        LIMIT ?
+        ''',
+        (user_id, limit)
+    )
+    
+    rows = cursor.fetchall()
+    if user_id is not None:
+        cursor.executemany(
+            '''
+            INSERT OR REPLACE INTO aptitude_served (user_id, question_id, served_at)
+            VALUES (?, ?, CURRENT_TIMESTAMP)
+            ''',
+            [(user_id, row["id"]) for row in rows]
+        )
+        conn.commit()
+    
+    conn.close()
+    
+    return [
+        {"question": row["question"], "options": json.loads(row["options"]), "correct_answer": row["correct_answer"]}
+        for row in rows
+    ]
+
+def acquire_refill_lease(name: str, owner: str, seconds: float) -> bool:
+    """
+    Take or extend the lease on refilling a shared pool
+    
+    Args:
+        name: The pool being refilled
+        owner: Identifies the worker; the owner may extend its own lease
+        seconds: How long the lease lasts unless extended again
+        
+    Returns:
+        True if owner now holds the lease, False if another worker holds it
+    """
+    conn = sqlite3.connect(DB_PATH, timeout=30)
+    cursor = conn.cursor()
+    now = time.time()
+    
+    cursor.execute(
+        '''
+        INSERT INTO refill_leases (name, owner, expires_at) VALUES (?, ?, ?)
+        ON CONFLICT (name) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at
+        WHERE refill_leases.owner = excluded.owner OR refill_leases.expires_at < ?
+        ''',
+        (name, owner, now + seconds, now)
+    )
+    
+    acquired = cursor.rowcount > 0
+    conn.commit()
+    conn.close()
+    
+    return acquired
+
+def release_refill_lease(name: str, owner: str):
+    """Give up a refill lease, if owner still holds it"""
+    conn = sqlite3.connect(DB_PATH, timeout=30)
+    cursor = conn.cursor()
+    
+    cursor.execute('DELETE FROM refill_leases WHERE name = ? AND owner = ?', (name, owner))
+    
+    conn.commit()
+    conn.close()
+
+def count_unseen_aptitude_questions(user_id: str) -> int:
+    """Get the number of pooled aptitude questions a user has not been shown yet"""
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    
+    cursor.execute(
+        '''
+        SELECT COUNT(*) FROM aptitude_question_pool
+        WHERE id NOT IN (SELECT question_id FROM aptitude_served WHERE user_id = ?)
+        ''',
+        (user_id,)
+    )
+    
+    count = cursor.fetchone()[0]
+    conn.close()
+    
+    return count
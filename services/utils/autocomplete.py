@@ -0,0 +1,264 @@
+import re
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter, OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+AUTOCOMPLETE_MAX_SCAN = 500
+PHRASE_MIN_COUNT = 3
+# Phrases are also reachable from their later words, up to this many words long
+MAX_SUFFIX_WORDS = 8
+# A failed build (e.g. a subject with no index) is retried after this long,
+# doubling with each further failure up to max_age
+BUILD_RETRY_SECONDS = 30.0
+# Subjects come from requests, so only this many failures are remembered
+MAX_FAILED_SUBJECTS = 1024
+# Externally generated suggestions kept per subject, for this many subjects, so
+# they survive until the index is built and across rebuilds
+MAX_EXTRA_SUGGESTIONS = 2000
+MAX_EXTRA_SUBJECTS = 1024
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "has", "have", "in",
+    "is", "it", "its", "of", "on", "or", "that", "the", "this", "to", "was", "were",
+    "which", "with", "we", "can", "will", "if", "then", "than", "so", "such", "these",
+    "those", "there", "their", "also", "not", "but", "all", "any", "each", "may",
+}
+
+HEADING_NUMBER = re.compile(r"^(chapter\s+)?\d+(\.\d+)*[.)]?\s+", re.IGNORECASE)
+WORD = re.compile(r"[A-Za-z][A-Za-z'\-]*")
+CLAUSE_BREAK = re.compile(r"[\n.!?;:,()\[\]]+")
+
+# Source weights: what students actually typed ranks above what the book contains
+QUERY_WEIGHT = 5.0
+HEADING_WEIGHT = 3.0
+PHRASE_WEIGHT = 1.0
+
+
+def normalize(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+def extract_headings(text: str) -> Iterable[str]:
+    """Short, title-like lines such as '4.2 Dijkstra's Algorithm'."""
+    for line in text.splitlines():
+        line = line.strip()
+        if not 4 <= len(line) <= 80 or line.endswith((".", ",", ";", ":")):
+            continue
+        numbered = HEADING_NUMBER.match(line)
+        title = HEADING_NUMBER.sub("", line).strip()
+        words = WORD.findall(title)
+        if not 1 <= len(words) <= 8 or len(words) < len(title.split()) - 1:
+            continue
+        capitalized = sum(w[0].isupper() for w in words if w.lower() not in STOPWORDS)
+        if numbered or capitalized >= max(1, len(words) - 1):
+            yield title
+
+
+def extract_phrases(text: str) -> Iterable[str]:
+    """2-3 word runs within a sentence that neither start nor end with a stopword."""
+    for clause in CLAUSE_BREAK.split(text):
+        words = WORD.findall(clause)
+        for n in (2, 3):
+            for i in range(len(words) - n + 1):
+                gram = words[i:i + n]
+                if gram[0].lower() in STOPWORDS or gram[-1].lower() in STOPWORDS:
+                    continue
+                yield " ".join(gram)
+
+
+class PrefixIndex:
+    """Sorted keys with binary-search prefix lookup, ranked by popularity."""
+
+    def __init__(self, scores: Dict[str, float], display: Dict[str, str]):
+        self.scores = dict(scores)
+        self.display = dict(display)
+        keys = []
+        for phrase in self.scores:
+            words = phrase.split()
+            keys.append((phrase, phrase))
+            if len(words) <= MAX_SUFFIX_WORDS:
+                for i in range(1, len(words)):
+                    if words[i] not in STOPWORDS:
+                        keys.append((" ".join(words[i:]), phrase))
+        keys.sort()
+        self.keys = [key for key, _ in keys]
+        self.targets = [phrase for _, phrase in keys]
+        self.lock = threading.Lock()
+
+    def add(self, text: str, score: float):
+        """Bump a phrase's popularity; new phrases only become searchable on rebuild."""
+        phrase = normalize(text)
+        with self.lock:
+            if phrase in self.scores:
+                self.scores[phrase] += score
+
+    def search(self, prefix: str, limit: int = 5) -> List[str]:
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        start = bisect_left(self.keys, prefix)
+        candidates = set()
+        for i in range(start, min(start + AUTOCOMPLETE_MAX_SCAN, len(self.keys))):
+            if not self.keys[i].startswith(prefix):
+                break
+            candidates.add(self.targets[i])
+        # Full-phrase matches first, then by popularity
+        ranked = sorted(
+            candidates,
+            key=lambda p: (not p.startswith(prefix), -self.scores.get(p, 0.0), len(p)),
+        )
+        return [self.display[p] for p in ranked[:limit]]
+
+    def __len__(self):
+        return len(self.scores)
+
+
+def build_index(chunks: Iterable[str], past_queries: Dict[str, int]) -> PrefixIndex:
+    """
+    Build a subject's index from its textbook chunks and past student queries.
+
+    Past queries are not tagged with a subject, so only those that share a word
+    with the subject's headings or phrases are kept.
+    """
+    headings: Counter = Counter()
+    phrases: Counter = Counter()
+    display: Dict[str, str] = {}
+    for text in chunks:
+        for heading in extract_headings(text):
+            key = normalize(heading)
+            headings[key] += 1
+            display.setdefault(key, heading)
+        for phrase in extract_phrases(text):
+            key = normalize(phrase)
+            phrases[key] += 1
+            display.setdefault(key, phrase)
+
+    scores: Dict[str, float] = {}
+    for key, count in phrases.items():
+        if count >= PHRASE_MIN_COUNT:
+            scores[key] = PHRASE_WEIGHT * count
+    for key, count in headings.items():
+        scores[key] = scores.get(key, 0.0) + HEADING_WEIGHT * count
+
+    vocabulary = {word for key in scores for word in key.split() if word not in STOPWORDS}
+    for query, count in past_queries.items():
+        key = normalize(query)
+        if key and set(key.split()) & vocabulary:
+            scores[key] = scores.get(key, 0.0) + QUERY_WEIGHT * count
+            display.setdefault(key, query.strip())
+
+    return PrefixIndex(scores, {key: display[key] for key in scores})
+
+
+class AutocompleteEngine:
+    """
+    One PrefixIndex per subject, built in the background on first use and rebuilt
+    after the textbook is re-indexed or when it is older than max_age.
+    """
+
+    def __init__(self, load_chunks, load_queries, max_age: float = 600.0):
+        self.load_chunks = load_chunks
+        self.load_queries = load_queries
+        self.max_age = max_age
+        self._indexes: Dict[str, PrefixIndex] = {}
+        self._built_at: Dict[str, float] = {}
+        self._building: set = set()
+        # subject -> (consecutive failures, time of the next attempt)
+        self._failed: Dict[str, Tuple[int, float]] = {}
+        # subject -> {normalized suggestion: display form}
+        self._extra: "OrderedDict[str, Dict[str, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _build(self, subject: str):
+        try:
+            start = time.perf_counter()
+            index = build_index(self.load_chunks(subject), self.load_queries())
+            with self._lock:
+                self._indexes[subject] = index
+                self._built_at[subject] = time.time()
+                self._failed.pop(subject, None)
+            self._merge_extra(subject)
+            print(f"Built autocomplete index for {subject}: {len(index)} phrases in {time.perf_counter() - start:.2f}s")
+        except Exception as e:
+            with self._lock:
+                failures = self._failed.pop(subject, (0, 0.0))[0] + 1
+                delay = min(BUILD_RETRY_SECONDS * 2 ** (failures - 1), self.max_age)
+                if len(self._failed) >= MAX_FAILED_SUBJECTS:
+                    self._failed.pop(next(iter(self._failed)))
+                self._failed[subject] = (failures, time.time() + delay)
+            print(
+                f"Failed to build autocomplete index for {subject}, retrying in {delay:.0f}s: "
+                f"{type(e).__name__} - {str(e)}"
+            )
+        finally:
+            with self._lock:
+                self._building.discard(subject)
+
+    def _ensure(self, subject: str) -> Optional[PrefixIndex]:
+        with self._lock:
+            index = self._indexes.get(subject)
+            now = time.time()
+            stale = index is None or now - self._built_at[subject] > self.max_age
+            backing_off = subject in self._failed and now < self._failed[subject][1]
+            if stale and not backing_off and subject not in self._building:
+                self._building.add(subject)
+                threading.Thread(target=self._build, args=(subject,), daemon=True).start()
+            return index
+
+    def suggest(self, subject: str, prefix: str, limit: int = 5) -> List[str]:
+        index = self._ensure(subject)
+        return index.search(prefix, limit) if index is not None else []
+
+    def record_query(self, subject: str, query: str):
+        with self._lock:
+            index = self._indexes.get(subject)
+        if index is not None:
+            index.add(query, QUERY_WEIGHT)
+
+    def add_suggestions(self, subject: str, suggestions: List[str]):
+        """
+        Merge externally generated suggestions (e.g. from the LLM) into the index.
+
+        They are kept for the subject, so ones that arrive before its index is
+        built are merged in by the build, as they are after every rebuild.
+        """
+        with self._lock:
+            extra = self._extra.pop(subject, {})
+            for suggestion in suggestions:
+                key = normalize(suggestion)
+                if key and key not in extra and len(extra) < MAX_EXTRA_SUGGESTIONS:
+                    extra[key] = suggestion.strip()
+            self._extra[subject] = extra
+            if len(self._extra) > MAX_EXTRA_SUBJECTS:
+                self._extra.popitem(last=False)
+        self._merge_extra(subject)
+
+    def _merge_extra(self, subject: str):
+        while True:
+            with self._lock:
+                index = self._indexes.get(subject)
+                extra = dict(self._extra.get(subject, {}))
+            if index is None:
+                return
+            missing = {key: text for key, text in extra.items() if key not in index.scores}
+            if not missing:
+                return
+            scores = dict(index.scores)
+            display = dict(index.display)
+            for key, text in missing.items():
+                scores[key] = PHRASE_WEIGHT
+                display[key] = text
+            rebuilt = PrefixIndex(scores, display)
+            with self._lock:
+                if self._indexes.get(subject) is index:
+                    self._indexes[subject] = rebuilt
+                    return
+            # Rebuilt or replaced meanwhile; merge into the new index
+
+    def invalidate(self, subject: str):
+        with self._lock:
+            self._indexes.pop(subject, None)
+            self._built_at.pop(subject, None)
+            self._failed.pop(subject, None)
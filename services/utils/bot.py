@@ -2,9 +2,8 @@ from langchain_groq import ChatGroq
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 import os
 from dotenv import load_dotenv
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_community.vectorstores import FAISS
-from langchain.chains import create_history_aware_retriever, create_retrieval_chain
+from utils.index_store import load_index
+from langchain_core.runnables import RunnablePassthrough
 from langchain.chains.combine_documents import create_stuff_documents_chain
 import re
 load_dotenv()
@@ -13,32 +12,12 @@ UPLOAD_DIR = "uploads"
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 os.environ['HF_TOKEN'] = os.getenv('HF_TOKEN')
 
-def get_model():
+def get_chat_model():
     groq_api_key1 = os.getenv("GROQ_API_KEY4")
-    model = ChatGroq(groq_api_key=groq_api_key1, model_name="llama-3.3-70b-versatile")
-    embeddings = HuggingFaceEmbeddings(model_name='all-MiniLM-L6-v2')
-    return model, embeddings
+    return ChatGroq(groq_api_key=groq_api_key1, model_name="llama-3.3-70b-versatile")
 
-def initialize_retriver(model, embeddings, subject):
-    vector_db = FAISS.load_local(f'RAG/{subject}', embeddings, allow_dangerous_deserialization=True)
-    retriever = vector_db.as_retriever()
-
-    contextualize_q_system_prompt = """
-    You are an AI study assistant for engineering students, answering only from the provided textbook.
-    """
-    contextualize_q_prompt = ChatPromptTemplate.from_messages(
-        [
-            ("system", contextualize_q_system_prompt),
-            MessagesPlaceholder("chat_history"),
-            ("human", "{input}"),
-        ]
-    )
-
-    history_aware_retriever = create_history_aware_retriever(
-        model, retriever, contextualize_q_prompt
-    )
-    
-    return history_aware_retriever, retriever
+def load_vector_db(embeddings, subject):
+    return load_index(f'RAG/{subject}', embeddings)
 
 def initialize_rag_chain(model, retriever, subject, learner_type):
     system_template = """
@@ -62,7 +41,10 @@ Context:
     qa_prompt = qa_prompt.partial(subject=subject, learner_type=learner_type)
     
     question_answer_chain = create_stuff_documents_chain(model, qa_prompt)
-    return create_retrieval_chain(retriever, question_answer_chain)
+    # Like create_retrieval_chain, but retrieval uses the standalone search_query
+    # when /chat computed one for a follow-up question
+    retrieve = (lambda x: x.get("search_query") or x["input"]) | retriever
+    return RunnablePassthrough.assign(context=retrieve).assign(answer=question_answer_chain)
 
 def extract_video_id(url: str):
     # Extract video ID from standard YouTube URL
@@ -0,0 +1,76 @@
+import csv
+import os
+import warnings
+from typing import List, Sequence
+
+import joblib
+import numpy as np
+
+SERVICES_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODEL_PATH = os.path.join(SERVICES_DIR, "models", "random_forest_model.pkl")
+DATA_PATH = os.path.join(SERVICES_DIR, "notebook", "data.csv")
+
+# notebook/main.ipynb encodes the labels as slow=0, medium=1, fast=2
+LABELS = np.array(["slow", "medium", "fast"])
+LABEL_IDS = {label: i for i, label in enumerate(LABELS)}
+MAX_SCORE = 5
+
+
+def train_model(data_path: str = DATA_PATH):
+    """Train the same RandomForest as notebook/main.ipynb, on all rows of data.csv."""
+    from sklearn.ensemble import RandomForestClassifier
+
+    with open(data_path, newline="") as f:
+        rows = list(csv.DictReader(f))
+    X = np.array([[int(r["aptitude_correct"]), int(r["video_correct"])] for r in rows])
+    y = np.array([LABEL_IDS[r["label"]] for r in rows])
+    model = RandomForestClassifier(n_estimators=100, random_state=42)
+    model.fit(X, y)
+    return model
+
+
+def load_model(model_path: str = MODEL_PATH):
+    if os.path.exists(model_path):
+        return joblib.load(model_path)
+    print(f"No model at {model_path}, training one from {DATA_PATH}")
+    return train_model()
+
+
+class LearnerClassifier:
+    """
+    Classifies (video_correct, aptitude_correct) scores as slow/medium/fast.
+
+    Both scores are in 0..5, so the model is evaluated once on all 36 inputs at
+    startup and every request is a table lookup.
+    """
+
+    def __init__(self, model=None):
+        model = model if model is not None else load_model()
+        scores = np.arange(MAX_SCORE + 1)
+        video, aptitude = np.meshgrid(scores, scores, indexing="ij")
+        # The model was fit on [aptitude_correct, video_correct]
+        grid = np.column_stack([aptitude.ravel(), video.ravel()])
+        with warnings.catch_warnings():
+            # Fit on a DataFrame in the notebook; the plain array is in the same column order
+            warnings.simplefilter("ignore", UserWarning)
+            predictions = model.predict(grid)
+        self.table = np.asarray(predictions, dtype=np.intp).reshape(MAX_SCORE + 1, MAX_SCORE + 1)
+
+    @staticmethod
+    def _validate(scores: np.ndarray, name: str):
+        if scores.size and (scores.min() < 0 or scores.max() > MAX_SCORE):
+            raise ValueError(f"{name} must be between 0 and {MAX_SCORE}")
+
+    def classify(self, video_correct: int, aptitude_correct: int) -> str:
+        if not (0 <= video_correct <= MAX_SCORE and 0 <= aptitude_correct <= MAX_SCORE):
+            raise ValueError(f"Scores must be between 0 and {MAX_SCORE}")
+        return str(LABELS[self.table[video_correct, aptitude_correct]])
+
+    def classify_batch(self, video_correct: Sequence[int], aptitude_correct: Sequence[int]) -> List[str]:
+        video = np.asarray(video_correct, dtype=np.intp)
+        aptitude = np.asarray(aptitude_correct, dtype=np.intp)
+        if video.shape != aptitude.shape:
+            raise ValueError("video_correct and aptitude_correct must have the same length")
+        self._validate(video, "video_correct")
+        self._validate(aptitude, "aptitude_correct")
+        return LABELS[self.table[video, aptitude]].tolist()
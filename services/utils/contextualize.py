@@ -0,0 +1,155 @@
+"""
+Standalone search queries for follow-up questions in /chat.
+
+Retrieval only sees the latest question, so "why is it faster?" after a question
+about merge sort retrieves nothing useful. Most messages need no rewrite, so a
+cheap local check decides: only questions with unresolved references (pronouns,
+"that one", very short follow-ups) are rewritten, by a small fast model, using
+the last few turns. Everything else goes to retrieval unchanged.
+"""
+import re
+import threading
+import time
+from typing import Dict, List, Optional
+
+CONTEXTUALIZE_MODEL = "llama-3.1-8b-instant"
+# Turns of history shown to the rewrite model
+CONTEXT_TURNS = 3
+MAX_REWRITE_TOKENS = 80
+
+WORD = re.compile(r"[a-z0-9']+")
+# Words that point back at something said earlier
+REFERENCES = {
+    "it", "its", "it's", "this", "that", "these", "those", "they", "them", "their",
+    "he", "she", "him", "her", "his", "former", "latter", "previous", "another",
+}
+# Openings of messages that only make sense as a continuation
+FOLLOW_UP_OPENINGS = (
+    "and ", "but ", "so ", "also ", "what about", "how about", "why not", "then ",
+)
+# Requests that continue the previous answer unless they name a topic of their
+# own: "explain more" is a follow-up, "explain more about heaps" is not
+VAGUE_REQUESTS = (
+    "explain more", "elaborate", "give an example", "example", "continue", "go on",
+    "can you explain", "tell me more", "in simple", "simplify", "more detail",
+)
+REQUEST_WORDS = {
+    "give", "example", "examples", "more", "about", "elaborate", "continue", "go",
+    "detail", "details", "simple", "simpler", "terms", "words", "simplify", "some",
+}
+FILLER = {
+    "what", "why", "how", "when", "where", "which", "who", "is", "are", "was", "do",
+    "does", "did", "can", "could", "would", "should", "the", "a", "an", "of", "to",
+    "in", "on", "for", "with", "and", "or", "me", "you", "please", "explain", "tell",
+}
+
+REWRITE_PROMPT = """Rewrite the student's latest question as a standalone question that can be understood without the conversation, for searching a textbook. Replace pronouns and references with what they refer to. Keep it short and keep technical terms exactly. If it is already standalone, return it unchanged. Output only the question.
+
+Conversation:
+{history}
+
+Latest question: {question}
+
+Standalone question:"""
+
+
+def needs_rewrite(query: str, chat_history: List[Dict[str, str]]) -> bool:
+    """True when the query probably refers to earlier turns of the conversation."""
+    if not chat_history:
+        return False
+    text = " ".join(query.lower().split())
+    words = WORD.findall(text)
+    if not words:
+        return False
+    if text.startswith(FOLLOW_UP_OPENINGS):
+        return True
+    content = [w for w in words if w not in FILLER]
+    if text.startswith(VAGUE_REQUESTS) and all(w in REQUEST_WORDS for w in content):
+        return True
+    if REFERENCES.intersection(words):
+        return True
+    # "why?", "time complexity?": too little of its own to search with
+    return len(content) <= 1
+
+
+def format_history(chat_history: List[Dict[str, str]], turns: int = CONTEXT_TURNS) -> str:
+    lines = []
+    for message in chat_history[-2 * turns:]:
+        if message["role"] == "human":
+            lines.append(f"Student: {message['content']}")
+        elif message["role"] == "ai":
+            # The start of an answer is enough to resolve references to it
+            lines.append(f"Assistant: {message['content'][:300]}")
+    return "\n".join(lines)
+
+
+def last_user_question(chat_history: List[Dict[str, str]]) -> Optional[str]:
+    for message in reversed(chat_history):
+        if message["role"] == "human":
+            return message["content"]
+    return None
+
+
+class QueryContextualizer:
+    """
+    Turns a chat message into the query used for retrieval.
+
+    Rewrites go through llm_client under the "contextualize" endpoint limits; when
+    the call fails or times out, the previous question is prepended instead so
+    retrieval still sees the topic. Latency of each path is recorded.
+    """
+
+    def __init__(self, llm_client, model: str = CONTEXTUALIZE_MODEL):
+        self.llm_client = llm_client
+        self.model = model
+        self._lock = threading.Lock()
+        self._stats = {
+            path: {"count": 0, "total_ms": 0.0, "max_ms": 0.0}
+            for path in ("passthrough", "rewritten", "fallback")
+        }
+
+    def _record(self, path: str, start: float):
+        elapsed = (time.perf_counter() - start) * 1000
+        with self._lock:
+            stats = self._stats[path]
+            stats["count"] += 1
+            stats["total_ms"] += elapsed
+            stats["max_ms"] = max(stats["max_ms"], elapsed)
+
+    async def _rewrite(self, query: str, chat_history: List[Dict[str, str]]) -> str:
+        prompt = REWRITE_PROMPT.format(history=format_history(chat_history), question=query)
+        content = await self.llm_client.complete(
+            "contextualize",
+            model=self.model,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=0,
+            max_tokens=MAX_REWRITE_TOKENS,
+        )
+        rewritten = " ".join((content or "").split()).strip('"')
+        if not rewritten:
+            raise ValueError("empty rewrite")
+        return rewritten
+
+    async def standalone_query(self, query: str, chat_history: List[Dict[str, str]]) -> str:
+        start = time.perf_counter()
+        if not needs_rewrite(query, chat_history):
+            self._record("passthrough", start)
+            return query
+        try:
+            rewritten = await self._rewrite(query, chat_history)
+            self._record("rewritten", start)
+            return rewritten
+        except Exception as e:
+            print(f"Query rewrite failed, using previous question as context: {type(e).__name__} - {str(e)}")
+            previous = last_user_question(chat_history)
+            self._record("fallback", start)
+            return f"{previous} {query}" if previous else query
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = {path: dict(values) for path, values in self._stats.items()}
+        for values in stats.values():
+            values["avg_ms"] = values["total_ms"] / values["count"] if values["count"] else 0.0
+        total = sum(values["count"] for values in stats.values())
+        stats["rewrite_rate"] = (total - stats["passthrough"]["count"]) / total if total else 0.0
+        return stats
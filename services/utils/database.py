@@ -1,64 +1,179 @@
 import sqlite3
+import threading
+import time
+
+from utils.migrations import apply_migrations
 
 DB_NAME = "rag_app.db"
 
+# Each thread keeps one open connection; sqlite3 reuses prepared statements per
+# connection, so the SQL below is kept as constants to hit that cache.
+STATEMENT_CACHE_SIZE = 128
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-20000",  # 20 MB page cache
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA busy_timeout=5000",
+)
+
+INSERT_LOG_SQL = 'INSERT INTO application_logs (session_id, user_id, user_query, model_response) VALUES (?, ?, ?, ?)'
+TOUCH_SESSION_SQL = '''INSERT INTO sessions (session_id, user_id, message_count) VALUES (?, ?, 1)
+    ON CONFLICT(session_id) DO UPDATE SET
+        last_activity_at = CURRENT_TIMESTAMP,
+        message_count = message_count + 1'''
+
+# Rows that older versions of create_session inserted as a session placeholder
+PLACEHOLDER_FILTER = "NOT (user_query = '' AND model_response = 'Session started')"
+
+CHAT_HISTORY_SQL = f'SELECT user_query, model_response FROM application_logs WHERE session_id = ? AND {PLACEHOLDER_FILTER} ORDER BY created_at, id'
+RECENT_TURNS_SQL = f'SELECT user_query, model_response FROM application_logs WHERE session_id = ? AND {PLACEHOLDER_FILTER} ORDER BY created_at DESC, id DESC LIMIT ? OFFSET ?'
+SESSION_MESSAGE_COUNT_SQL = 'SELECT message_count FROM sessions WHERE session_id = ?'
+
+# Schema changes to rag_app.db, applied in order by utils.migrations. Databases
+# migrated before that recorded their version in PRAGMA user_version instead.
+MIGRATIONS = [
+    [
+        'CREATE INDEX IF NOT EXISTS idx_logs_session_created ON application_logs (session_id, created_at)',
+        'CREATE INDEX IF NOT EXISTS idx_logs_user_session ON application_logs (user_id, session_id)',
+        '''CREATE TABLE IF NOT EXISTS sessions
+        (session_id TEXT PRIMARY KEY,
+        user_id TEXT,
+        message_count INTEGER NOT NULL DEFAULT 0,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        last_activity_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''',
+        'CREATE INDEX IF NOT EXISTS idx_sessions_user_activity ON sessions (user_id, last_activity_at)',
+        'CREATE INDEX IF NOT EXISTS idx_sessions_activity ON sessions (last_activity_at)',
+        f'''INSERT OR IGNORE INTO sessions (session_id, user_id, message_count, created_at, last_activity_at)
+        SELECT session_id, MIN(user_id), SUM(CASE WHEN {PLACEHOLDER_FILTER} THEN 1 ELSE 0 END),
+            MIN(created_at), MAX(created_at)
+        FROM application_logs WHERE session_id IS NOT NULL GROUP BY session_id''',
+    ],
+]
+
+_local = threading.local()
+_write_stats_lock = threading.Lock()
+_write_stats = {"writes": 0, "write_seconds": 0.0}
+
+
 def get_db_connection():
-    conn = sqlite3.connect(DB_NAME)
-    conn.row_factory = sqlite3.Row
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = sqlite3.connect(DB_NAME, cached_statements=STATEMENT_CACHE_SIZE)
+        conn.row_factory = sqlite3.Row
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        _local.conn = conn
     return conn
 
+def close_db_connection():
+    """Close the calling thread's connection, if it has one."""
+    conn = getattr(_local, "conn", None)
+    if conn is not None:
+        conn.close()
+        _local.conn = None
+
+def _record_write(start):
+    elapsed = time.perf_counter() - start
+    with _write_stats_lock:
+        _write_stats["writes"] += 1
+        _write_stats["write_seconds"] += elapsed
+
+def get_write_stats():
+    """Number of log writes in this process and the time spent in them."""
+    with _write_stats_lock:
+        stats = dict(_write_stats)
+    stats["avg_write_ms"] = (
+        stats["write_seconds"] / stats["writes"] * 1000 if stats["writes"] else 0.0
+    )
+    return stats
+
 def create_application_logs():
     conn = get_db_connection()
-    conn.execute('''CREATE TABLE IF NOT EXISTS application_logs
-    (id INTEGER PRIMARY KEY AUTOINCREMENT,
-    session_id TEXT,
-    user_id TEXT,
-    user_query TEXT,
-    model_response TEXT,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
-    conn.close()
+    with conn:
+        conn.execute('''CREATE TABLE IF NOT EXISTS application_logs
+        (id INTEGER PRIMARY KEY AUTOINCREMENT,
+        session_id TEXT,
+        user_id TEXT,
+        user_query TEXT,
+        model_response TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
+    migrate_application_logs()
+
+def migrate_application_logs():
+    """Apply any MIGRATIONS this database has not seen yet."""
+    conn = sqlite3.connect(DB_NAME, timeout=30, isolation_level=None)
+    try:
+        baseline = conn.execute('PRAGMA user_version').fetchone()[0]
+        apply_migrations(conn, MIGRATIONS, baseline)
+    finally:
+        conn.close()
 
 def insert_application_logs(session_id, user_id, user_query, model_response):
+    start = time.perf_counter()
     conn = get_db_connection()
-    conn.execute('INSERT INTO application_logs (session_id, user_id, user_query, model_response) VALUES (?, ?, ?, ?)',
-                 (session_id, user_id, user_query, model_response, ))
-    conn.commit()
-    conn.close()
+    with conn:
+        conn.execute(INSERT_LOG_SQL, (session_id, user_id, user_query, model_response, ))
+        conn.execute(TOUCH_SESSION_SQL, (session_id, user_id))
+    _record_write(start)
 
 def get_chat_history(session_id):
     conn = get_db_connection()
     cursor = conn.cursor()
-    cursor.execute('SELECT user_query, model_response FROM application_logs WHERE session_id = ?', (session_id,))
+    cursor.execute(CHAT_HISTORY_SQL, (session_id,))
     messages = []
     for row in cursor.fetchall():
         messages.extend([
             {"role": "human", "content": row['user_query']},
             {"role": "ai", "content": row['model_response']}
         ])
-    conn.close()
     return messages
 
+def get_recent_turns(session_id, limit=-1, offset=0):
+    """
+    Return (user_query, model_response) pairs for a session, oldest first,
+    taking at most `limit` turns after skipping the `offset` most recent ones.
+    """
+    conn = get_db_connection()
+    cursor = conn.execute(RECENT_TURNS_SQL, (session_id, limit, offset))
+    rows = [(row['user_query'], row['model_response']) for row in cursor.fetchall()]
+    rows.reverse()
+    return rows
+
+def get_session_message_count(session_id):
+    conn = get_db_connection()
+    row = conn.execute(SESSION_MESSAGE_COUNT_SQL, (session_id,)).fetchone()
+    return row[0] if row else 0
+
+def get_query_counts(limit=5000):
+    """Most frequently asked chat queries with how often each was asked."""
+    conn = get_db_connection()
+    cursor = conn.execute(
+        "SELECT user_query, COUNT(*) AS asked FROM application_logs WHERE user_query != '' "
+        "GROUP BY user_query ORDER BY asked DESC LIMIT ?",
+        (limit,),
+    )
+    return {row['user_query']: row['asked'] for row in cursor.fetchall()}
+
 def get_all_session_ids():
     conn = get_db_connection()
     cursor = conn.cursor()
-    cursor.execute('SELECT DISTINCT session_id FROM application_logs')
+    cursor.execute('SELECT session_id FROM sessions ORDER BY last_activity_at DESC')
     session_ids = [row['session_id'] for row in cursor.fetchall()]
-    conn.close()
     return session_ids
 
 def get_sessions_by_user_id(user_id):
     conn = get_db_connection()
     cursor = conn.cursor()
-    cursor.execute('SELECT DISTINCT session_id FROM application_logs WHERE user_id = ?', (user_id,))
+    cursor.execute('SELECT session_id FROM sessions WHERE user_id = ? ORDER BY last_activity_at DESC', (user_id,))
     session_ids = [row['session_id'] for row in cursor.fetchall()]
-    conn.close()
     return session_ids
 
 def get_chats_by_session_id(session_id):
     conn = get_db_connection()
     cursor = conn.cursor()
-    cursor.execute('SELECT user_query, model_response, created_at FROM application_logs WHERE session_id = ? ORDER BY created_at', (session_id,))
-    
+    cursor.execute(f'SELECT user_query, model_response, created_at FROM application_logs WHERE session_id = ? AND {PLACEHOLDER_FILTER} ORDER BY created_at, id', (session_id,))
+
     chats = []
     for row in cursor.fetchall():
         chats.append({
@@ -66,8 +181,7 @@ def get_chats_by_session_id(session_id):
             "model_response": row['model_response'],
             "created_at": row['created_at']
         })
-    
-    conn.close()
+
     return chats
 
 def create_session(user_id):
@@ -77,36 +191,34 @@ def create_session(user_id):
     import uuid
     session_id = str(uuid.uuid4())
     conn = get_db_connection()
-    conn.execute('INSERT INTO application_logs (session_id, user_id, user_query, model_response) VALUES (?, ?, ?, ?)',
-                 (session_id, user_id, "", "Session started"))
-    conn.commit()
-    conn.close()
+    with conn:
+        conn.execute('INSERT INTO sessions (session_id, user_id) VALUES (?, ?)', (session_id, user_id))
     return session_id
 
 def delete_session(session_id, user_id=None):
     """
     Delete a session and all its associated records.
-    
+
     Parameters:
     - session_id: ID of the session to delete
     - user_id: Optional user ID for additional verification
-    
+
     Returns the number of deleted records.
     """
     conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    if user_id:
-        # Delete only if both session_id and user_id match
-        cursor.execute('DELETE FROM application_logs WHERE session_id = ? AND user_id = ?', 
-                      (session_id, user_id))
-    else:
-        # Delete based on session_id only
-        cursor.execute('DELETE FROM application_logs WHERE session_id = ?', (session_id,))
-        
-    deleted_count = cursor.rowcount
-    conn.commit()
-    conn.close()
-    return deleted_count
+    with conn:
+        cursor = conn.cursor()
 
-create_application_logs()
\ No newline at end of file
+        if user_id:
+            # Delete only if both session_id and user_id match
+            cursor.execute('DELETE FROM application_logs WHERE session_id = ? AND user_id = ?',
+                          (session_id, user_id))
+            deleted_count = cursor.rowcount
+            cursor.execute('DELETE FROM sessions WHERE session_id = ? AND user_id = ?',
+                          (session_id, user_id))
+        else:
+            # Delete based on session_id only
+            cursor.execute('DELETE FROM application_logs WHERE session_id = ?', (session_id,))
+            deleted_count = cursor.rowcount
+            cursor.execute('DELETE FROM sessions WHERE session_id = ?', (session_id,))
+    return deleted_count
@@ -0,0 +1,160 @@
+import fcntl
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+from typing import Dict, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+CACHE_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "embedding_cache"
+)
+VECTORS_FILE = "vectors.f32"
+INDEX_FILE = "index.db"
+LOCK_FILE = "append.lock"
+# SQLite's default limit on bound parameters is 999
+LOOKUP_BATCH = 900
+
+
+def model_name_of(embeddings) -> str:
+    return getattr(embeddings, "model_name", None) or type(embeddings).__name__
+
+
+def cache_key(model_name: str, text: str) -> str:
+    return hashlib.sha256(f"{model_name}\0{text}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingStore:
+    """
+    Persistent, append-only store of embeddings for one model.
+
+    Vectors live in a raw float32 matrix (vectors.f32) that is memory-mapped for
+    reads; index.db maps each content hash to its row. Appends from several
+    processes are serialized with a file lock.
+    """
+
+    def __init__(self, model_name: str, cache_dir: str = CACHE_DIR):
+        self.model_name = model_name
+        self.path = os.path.join(cache_dir, re.sub(r"[^A-Za-z0-9_.-]", "_", model_name))
+        os.makedirs(self.path, exist_ok=True)
+        self.vectors_path = os.path.join(self.path, VECTORS_FILE)
+        self._conn = sqlite3.connect(
+            os.path.join(self.path, INDEX_FILE), check_same_thread=False
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS rows (key TEXT PRIMARY KEY, row INTEGER NOT NULL)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)")
+        self._conn.commit()
+        self._lock = threading.Lock()
+        self._matrix: Optional[np.memmap] = None
+        self.dim = self._read_dim()
+
+    def _read_dim(self) -> Optional[int]:
+        row = self._conn.execute("SELECT value FROM meta WHERE name = 'dim'").fetchone()
+        return int(row[0]) if row else None
+
+    def _current_dim(self) -> Optional[int]:
+        # A store opened while the cache was empty learns the dimension once
+        # another process has written the first vectors
+        if self.dim is None:
+            self.dim = self._read_dim()
+        return self.dim
+
+    def _rows_on_disk(self) -> int:
+        if not self._current_dim() or not os.path.exists(self.vectors_path):
+            return 0
+        return os.path.getsize(self.vectors_path) // (self.dim * 4)
+
+    def _matrix_with(self, max_row: int) -> np.memmap:
+        # Re-map when other writers have grown the file past our current view
+        if self._matrix is None or self._matrix.shape[0] <= max_row:
+            rows = self._rows_on_disk()
+            self._matrix = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(rows, self.dim))
+        return self._matrix
+
+    def get_many(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        found: Dict[str, int] = {}
+        with self._lock:
+            for i in range(0, len(keys), LOOKUP_BATCH):
+                batch = keys[i:i + LOOKUP_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                found.update(
+                    self._conn.execute(
+                        f"SELECT key, row FROM rows WHERE key IN ({placeholders})", batch
+                    ).fetchall()
+                )
+            if not found:
+                return {}
+            matrix = self._matrix_with(max(found.values()))
+            return {key: np.array(matrix[row]) for key, row in found.items()}
+
+    def put_many(self, keys: List[str], vectors: np.ndarray):
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        with self._lock, open(os.path.join(self.path, LOCK_FILE), "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            if self.dim is None:
+                self.dim = self._read_dim() or vectors.shape[1]
+                self._conn.execute("INSERT OR IGNORE INTO meta (name, value) VALUES ('dim', ?)", (str(self.dim),))
+            first_row = self._rows_on_disk()
+            with open(self.vectors_path, "ab") as f:
+                # Drop any partial row left by a writer that died mid-append
+                f.truncate(first_row * self.dim * 4)
+                f.write(vectors.tobytes())
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO rows (key, row) VALUES (?, ?)",
+                [(key, first_row + i) for i, key in enumerate(keys)],
+            )
+            self._conn.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM rows").fetchone()[0]
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Wraps an Embeddings model so embed_documents only computes vectors for chunk
+    texts it has never seen before under this model name. Queries are not cached.
+    """
+
+    def __init__(self, embeddings, cache_dir: str = CACHE_DIR):
+        self.embeddings = embeddings
+        self.model_name = model_name_of(embeddings)
+        self.store = EmbeddingStore(self.model_name, cache_dir)
+        self.hits = 0
+        self.misses = 0
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [cache_key(self.model_name, text) for text in texts]
+        cached = self.store.get_many(keys)
+
+        missing: Dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key not in cached:
+                missing.setdefault(key, text)
+        if missing:
+            new_vectors = np.asarray(
+                self.embeddings.embed_documents(list(missing.values())), dtype=np.float32
+            )
+            self.store.put_many(list(missing.keys()), new_vectors)
+            cached.update(zip(missing.keys(), new_vectors))
+
+        self.hits += len(texts) - len(missing)
+        self.misses += len(missing)
+        return [cached[key].tolist() for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embeddings.embed_query(text)
+
+    def stats(self) -> Dict:
+        total = self.hits + self.misses
+        return {
+            "model_name": self.model_name,
+            "cached_vectors": len(self.store),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
@@ -0,0 +1,213 @@
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+from utils.database import get_recent_turns, get_session_message_count
+
+CHAT_HISTORY_MAX_TURNS = int(os.getenv("CHAT_HISTORY_MAX_TURNS", "8"))
+CHAT_HISTORY_TOKEN_BUDGET = int(os.getenv("CHAT_HISTORY_TOKEN_BUDGET", "1500"))
+CHAT_HISTORY_CACHED_SESSIONS = int(os.getenv("CHAT_HISTORY_CACHED_SESSIONS", "5000"))
+# A failed summary call is retried this many times, waiting SUMMARY_RETRY_SECONDS
+# and then twice as long each time; after that its turns wait for the next eviction
+SUMMARY_MAX_ATTEMPTS = 3
+SUMMARY_RETRY_SECONDS = 1.0
+
+SUMMARY_PROMPT = """Update the running summary of a study-assistant conversation with the new turns below.
+Keep the topics, definitions and anything the student said about themselves. Use at most 120 words.
+
+Current summary:
+{summary}
+
+New turns:
+{turns}
+
+Updated summary:"""
+
+Turn = Tuple[str, str]
+
+
+def estimate_tokens(text: str) -> int:
+    # Close enough to Llama tokenization for budgeting English prose
+    return len(text) // 4 + 1
+
+
+def turn_tokens(turn: Turn) -> int:
+    return estimate_tokens(turn[0]) + estimate_tokens(turn[1])
+
+
+def make_llm_summarizer(llm) -> Callable[[str, List[Turn]], str]:
+    """Summarizer that folds turns into the previous summary with one LLM call."""
+
+    def summarize(summary: str, turns: List[Turn]) -> str:
+        text = "\n".join(f"Student: {q}\nAssistant: {a}" for q, a in turns)
+        prompt = SUMMARY_PROMPT.format(summary=summary or "(none)", turns=text)
+        return llm.invoke(prompt).content.strip()
+
+    return summarize
+
+
+class _Window:
+    def __init__(self, message_count: int):
+        self.turns: deque = deque()
+        self.tokens = 0
+        self.summary = ""
+        self.message_count = message_count
+        self.lock = threading.Lock()
+        # Evicted turns waiting to be folded into summary, oldest first
+        self.pending: List[Turn] = []
+        self.summarizing = False
+
+
+class ChatHistoryProvider:
+    """
+    Serves the chat_history passed to the RAG chain.
+
+    Only the most recent turns that fit within max_turns and token_budget are kept.
+    Windows are cached per session, so a new message appends to the window instead
+    of re-reading the session from SQLite. When a summarizer is given, turns that
+    fall out of the window are folded into a rolling summary in the background,
+    and the summary is sent ahead of the window.
+    """
+
+    def __init__(
+        self,
+        summarizer: Optional[Callable[[str, List[Turn]], str]] = None,
+        max_turns: int = CHAT_HISTORY_MAX_TURNS,
+        token_budget: int = CHAT_HISTORY_TOKEN_BUDGET,
+        max_sessions: int = CHAT_HISTORY_CACHED_SESSIONS,
+    ):
+        self.summarizer = summarizer
+        self.max_turns = max_turns
+        self.token_budget = token_budget
+        self.max_sessions = max_sessions
+        self._windows: "OrderedDict[str, _Window]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=2) if summarizer else None
+
+    def _trim(self, window: _Window) -> List[Turn]:
+        evicted = []
+        while window.turns and (
+            len(window.turns) > self.max_turns or window.tokens > self.token_budget
+        ):
+            turn = window.turns.popleft()
+            window.tokens -= turn_tokens(turn)
+            evicted.append(turn)
+        return evicted
+
+    def _summarize(self, window: _Window, turns: List[Turn]):
+        if not turns or self._executor is None:
+            return
+        with window.lock:
+            window.pending.extend(turns)
+            if window.summarizing:
+                # The running task picks these up when its current call returns
+                return
+            window.summarizing = True
+
+        def run():
+            # One task per window at a time, so each call starts from the summary
+            # the previous one wrote and no batch of turns is lost
+            failures = 0
+            while True:
+                with window.lock:
+                    turns, window.pending = window.pending, []
+                    if not turns:
+                        window.summarizing = False
+                        return
+                    summary = window.summary
+                try:
+                    summary = self.summarizer(summary, turns)
+                except Exception as e:
+                    failures += 1
+                    print(f"Failed to update chat summary: {type(e).__name__} - {str(e)}")
+                    with window.lock:
+                        # Oldest first, ahead of any turns evicted meanwhile
+                        window.pending = turns + window.pending
+                        if failures >= SUMMARY_MAX_ATTEMPTS:
+                            window.summarizing = False
+                            return
+                    time.sleep(SUMMARY_RETRY_SECONDS * 2 ** (failures - 1))
+                    continue
+                failures = 0
+                with window.lock:
+                    window.summary = summary
+
+        self._executor.submit(run)
+
+    def _load(self, session_id: str, message_count: int, previous: Optional[_Window]) -> _Window:
+        window = _Window(message_count)
+        for turn in get_recent_turns(session_id, self.max_turns):
+            window.turns.append(turn)
+            window.tokens += turn_tokens(turn)
+        evicted = self._trim(window)
+        if previous is not None:
+            # Another worker wrote to the session: keep our summary and fold in
+            # the turns we had that are no longer in the window
+            with previous.lock:
+                window.summary = previous.summary
+                kept = set(window.turns)
+                evicted = [turn for turn in previous.turns if turn not in kept]
+        elif self.summarizer and message_count > len(window.turns):
+            # Older turns were never seen by this process; summarize them once
+            evicted = get_recent_turns(session_id, offset=len(window.turns))
+        self._summarize(window, evicted)
+        return window
+
+    def _window(self, session_id: str) -> _Window:
+        message_count = get_session_message_count(session_id)
+        with self._lock:
+            window = self._windows.get(session_id)
+            if window is not None and window.message_count == message_count:
+                self._windows.move_to_end(session_id)
+                return window
+
+        # Not cached, or another worker has written to the session since
+        window = self._load(session_id, message_count, window)
+        with self._lock:
+            self._windows[session_id] = window
+            self._windows.move_to_end(session_id)
+            while len(self._windows) > self.max_sessions:
+                self._windows.popitem(last=False)
+        return window
+
+    def get_chat_history(self, session_id: str) -> List[Dict[str, str]]:
+        """Drop-in replacement for database.get_chat_history, bounded to the window."""
+        window = self._window(session_id)
+        with window.lock:
+            messages = []
+            if window.summary:
+                messages.append(
+                    {"role": "system", "content": f"Summary of the earlier conversation: {window.summary}"}
+                )
+            for user_query, model_response in window.turns:
+                messages.extend([
+                    {"role": "human", "content": user_query},
+                    {"role": "ai", "content": model_response},
+                ])
+        return messages
+
+    def append(self, session_id: str, user_query: str, model_response: str):
+        """Record a turn that has just been written with insert_application_logs."""
+        with self._lock:
+            window = self._windows.get(session_id)
+        if window is None:
+            return
+        turn = (user_query, model_response)
+        with window.lock:
+            window.turns.append(turn)
+            window.tokens += turn_tokens(turn)
+            window.message_count += 1
+            evicted = self._trim(window)
+        self._summarize(window, evicted)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "cached_sessions": len(self._windows),
+                "max_turns": self.max_turns,
+                "token_budget": self.token_budget,
+                "summaries_enabled": self.summarizer is not None,
+            }
@@ -0,0 +1,238 @@
+"""
+Hybrid sparse + dense retrieval over a subject index.
+
+Dense FAISS search misses exact terms (algorithm names, theorem numbers,
+complexity notation) that students type verbatim, so each subject also has a BM25
+inverted index over the same chunks:
+
+    bm25.db     SQLite postings per term, positions matching index.faiss and docstore.db
+
+save_index writes it alongside the FAISS index. HybridRetriever runs both searches,
+fuses the two rankings with reciprocal-rank fusion, and optionally re-ranks the
+fused candidates with a small CPU cross-encoder (RAG_RERANK=1).
+"""
+import math
+import os
+import re
+import sqlite3
+import threading
+from collections import Counter, defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+BM25_FILE = "bm25.db"
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# "dense" restores plain FAISS top-k retrieval
+RAG_RETRIEVAL_MODE = os.getenv("RAG_RETRIEVAL_MODE", "hybrid")
+RAG_TOP_K = int(os.getenv("RAG_TOP_K", "4"))
+# Candidates taken from each ranking before fusion
+RAG_FETCH_K = int(os.getenv("RAG_FETCH_K", "20"))
+RRF_K = int(os.getenv("RAG_RRF_K", "60"))
+RAG_RERANK = os.getenv("RAG_RERANK") == "1"
+RAG_RERANK_MODEL = os.getenv("RAG_RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+RAG_RERANK_CANDIDATES = int(os.getenv("RAG_RERANK_CANDIDATES", "12"))
+
+# Section and theorem numbers such as 4.2.1 stay one token
+TOKEN = re.compile(r"\d+(?:\.\d+)+|[a-z]+|\d+")
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "has", "have", "in",
+    "is", "it", "its", "of", "on", "or", "that", "the", "this", "to", "was", "were",
+    "which", "with", "what", "how", "why", "does", "do", "can", "explain",
+}
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in TOKEN.findall(text.lower()) if t not in STOPWORDS]
+
+
+def write_bm25(texts: Iterable[str], path: str):
+    """Build the BM25 postings for chunk texts, in index order, into a bm25.db at path."""
+    postings: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+    lengths = []
+    for pos, text in enumerate(texts):
+        counts = Counter(tokenize(text))
+        lengths.append(sum(counts.values()))
+        for term, tf in counts.items():
+            postings[term].append((pos, tf))
+
+    tmp_path = path + ".tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    conn = sqlite3.connect(tmp_path)
+    conn.execute("CREATE TABLE meta (name TEXT PRIMARY KEY, value BLOB)")
+    conn.execute("CREATE TABLE postings (term TEXT PRIMARY KEY, positions BLOB NOT NULL, tfs BLOB NOT NULL)")
+    conn.execute(
+        "INSERT INTO meta (name, value) VALUES ('lengths', ?)",
+        (np.asarray(lengths, dtype=np.int32).tobytes(),),
+    )
+    conn.executemany(
+        "INSERT INTO postings (term, positions, tfs) VALUES (?, ?, ?)",
+        (
+            (
+                term,
+                np.asarray([p for p, _ in entries], dtype=np.int32).tobytes(),
+                np.asarray([tf for _, tf in entries], dtype=np.float32).tobytes(),
+            )
+            for term, entries in postings.items()
+        ),
+    )
+    conn.commit()
+    conn.close()
+    os.replace(tmp_path, path)
+
+
+class BM25Index:
+    """Read-only BM25 scoring over a bm25.db; postings are read per query term."""
+
+    def __init__(self, path: str):
+        self._conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+        self._lock = threading.Lock()
+        row = self._conn.execute("SELECT value FROM meta WHERE name = 'lengths'").fetchone()
+        self.lengths = np.frombuffer(row[0], dtype=np.int32).astype(np.float32)
+        self.avg_length = float(self.lengths.mean()) if len(self.lengths) else 0.0
+
+    def __len__(self):
+        return len(self.lengths)
+
+    def search(self, query: str, k: int, mask: Optional[np.ndarray] = None) -> List[Tuple[int, float]]:
+        """Top-k (position, score) pairs for a query, best first, among the positions set in mask."""
+        terms = set(tokenize(query))
+        if not terms or not len(self.lengths):
+            return []
+        placeholders = ",".join("?" * len(terms))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT positions, tfs FROM postings WHERE term IN ({placeholders})", list(terms)
+            ).fetchall()
+        if not rows:
+            return []
+
+        n = len(self.lengths)
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths / max(self.avg_length, 1e-9))
+        scores = np.zeros(n, dtype=np.float32)
+        for positions_blob, tfs_blob in rows:
+            positions = np.frombuffer(positions_blob, dtype=np.int32)
+            tfs = np.frombuffer(tfs_blob, dtype=np.float32)
+            df = len(positions)
+            idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+            scores[positions] += idf * tfs * (BM25_K1 + 1) / (tfs + norm[positions])
+        if mask is not None:
+            scores[~mask] = 0
+
+        matched = np.flatnonzero(scores)
+        if len(matched) > k:
+            matched = matched[np.argpartition(-scores[matched], k - 1)[:k]]
+        ranked = matched[np.argsort(-scores[matched])]
+        return [(int(pos), float(scores[pos])) for pos in ranked]
+
+
+def load_bm25(subject_path: str) -> Optional[BM25Index]:
+    path = os.path.join(subject_path, BM25_FILE)
+    return BM25Index(path) if os.path.exists(path) else None
+
+
+class CrossEncoderReranker:
+    """A sentence-transformers cross-encoder, loaded on first use and shared by all subjects."""
+
+    def __init__(self, model_name: str = RAG_RERANK_MODEL):
+        self.model_name = model_name
+        self._model = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    from sentence_transformers import CrossEncoder
+
+                    self._model = CrossEncoder(self.model_name, device="cpu")
+        return self._model
+
+    def rerank(self, query: str, documents: List[Document], k: int) -> List[Document]:
+        if len(documents) <= 1:
+            return documents[:k]
+        scores = self._load().predict([(query, doc.page_content) for doc in documents])
+        order = np.argsort(-np.asarray(scores))
+        return [documents[i] for i in order[:k]]
+
+
+_reranker: Optional[CrossEncoderReranker] = None
+
+
+def get_reranker() -> CrossEncoderReranker:
+    global _reranker
+    if _reranker is None:
+        _reranker = CrossEncoderReranker()
+    return _reranker
+
+
+def reciprocal_rank_fusion(rankings: List[List[int]], rrf_k: int = RRF_K) -> List[int]:
+    scores: Dict[int, float] = defaultdict(float)
+    for ranking in rankings:
+        for rank, pos in enumerate(ranking):
+            scores[pos] += 1.0 / (rrf_k + rank + 1)
+    return sorted(scores, key=lambda pos: -scores[pos])
+
+
+class HybridRetriever(BaseRetriever):
+    """Retriever fusing FAISS and BM25 rankings of the same chunks."""
+
+    vector_db: Any
+    bm25: Any
+    k: int = RAG_TOP_K
+    fetch_k: int = RAG_FETCH_K
+    rrf_k: int = RRF_K
+    reranker: Any = None
+    rerank_candidates: int = RAG_RERANK_CANDIDATES
+    # A utils.unified_store.ChunkFilter restricting both searches, e.g. to one subject
+    chunk_filter: Any = None
+
+    def dense_positions(self, query: str) -> List[int]:
+        vector = np.asarray([self.vector_db.embeddings.embed_query(query)], dtype=np.float32)
+        if self.chunk_filter is None:
+            _, positions = self.vector_db.index.search(vector, self.fetch_k)
+        else:
+            _, positions = self.vector_db.index.search(
+                vector, self.fetch_k, params=self.chunk_filter.search_parameters(self.vector_db.index)
+            )
+        return [int(pos) for pos in positions[0] if pos >= 0]
+
+    def sparse_positions(self, query: str) -> List[int]:
+        mask = self.chunk_filter.mask if self.chunk_filter is not None else None
+        return [pos for pos, _ in self.bm25.search(query, self.fetch_k, mask)]
+
+    def _document(self, pos: int) -> Document:
+        return self.vector_db.docstore.search(self.vector_db.index_to_docstore_id[pos])
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        rankings = [self.dense_positions(query)]
+        # No BM25 side in dense mode
+        if self.bm25 is not None:
+            rankings.append(self.sparse_positions(query))
+        fused = reciprocal_rank_fusion(rankings, self.rrf_k)
+        if self.reranker is None:
+            return [self._document(pos) for pos in fused[:self.k]]
+        candidates = [self._document(pos) for pos in fused[:max(self.k, self.rerank_candidates)]]
+        return self.reranker.rerank(query, candidates, self.k)
+
+
+def build_retriever(vector_db, subject_path: str, mode: str = RAG_RETRIEVAL_MODE):
+    """The configured retriever for a loaded subject index."""
+    bm25 = load_bm25(subject_path) if mode == "hybrid" else None
+    if bm25 is None or len(bm25) != vector_db.index.ntotal:
+        if mode == "hybrid":
+            print(f"No up-to-date {BM25_FILE} in {subject_path}, using dense retrieval only")
+        return vector_db.as_retriever(search_kwargs={"k": RAG_TOP_K})
+    return HybridRetriever(
+        vector_db=vector_db,
+        bm25=bm25,
+        reranker=get_reranker() if RAG_RERANK else None,
+    )
@@ -0,0 +1,255 @@
+"""
+Read-only storage format for subject indexes under RAG/{subject}.
+
+    index.faiss     the FAISS index, written with faiss.write_index and memory-mapped on load
+    index.json      its type and search settings (see utils.ann_index)
+    docstore.db     SQLite table of chunks keyed by their position in the index
+    bm25.db         BM25 postings over the same chunks (see utils.hybrid_search)
+
+Loading maps the vector data instead of copying it into the heap, so every worker
+process shares the same page cache, and chunks are only read from SQLite when a
+search returns them. Directories still in the old FAISS.save_local layout
+(index.faiss + index.pkl) are loaded the old way until converted with
+
+    python -m utils.index_store RAG
+
+which also adds a missing bm25.db to directories that are already converted.
+With --rebuild, it also rebuilds every index as the type chosen for its size
+(or --type), keeping the chunks and their positions.
+"""
+import argparse
+import json
+import os
+import sqlite3
+import threading
+from collections.abc import Mapping
+from typing import Tuple
+
+import faiss
+from langchain_community.docstore.base import Docstore
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+
+from utils.ann_index import (
+    INDEX_TYPES,
+    PARAMS_FILE,
+    RAG_INDEX_TYPE,
+    build_index,
+    choose_index_type,
+    configure_search,
+    index_vectors,
+    read_params,
+    write_params,
+)
+from utils.hybrid_search import BM25_FILE, write_bm25
+
+INDEX_FILE = "index.faiss"
+DOCSTORE_FILE = "docstore.db"
+LEGACY_DOCSTORE_FILE = "index.pkl"
+
+# Zero-copy mapping of flat codes where this FAISS build supports it
+MMAP_FLAGS = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+
+
+class SqliteDocstore(Docstore):
+    """Lazy, read-only docstore over docstore.db. Ids are index positions as strings."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn = sqlite3.connect(
+            f"file:{path}?mode=ro", uri=True, check_same_thread=False
+        )
+        self._lock = threading.Lock()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM docs").fetchone()[0]
+
+    def search(self, search: str):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT page_content, metadata FROM docs WHERE pos = ?", (int(search),)
+            ).fetchone()
+        if row is None:
+            return f"ID {search} not found."
+        return Document(page_content=row[0], metadata=json.loads(row[1]))
+
+    def iter_documents(self):
+        """Yield (pos, Document) for every chunk, in index order."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT pos, page_content, metadata FROM docs ORDER BY pos"
+            ).fetchall()
+        for pos, page_content, metadata in rows:
+            yield pos, Document(page_content=page_content, metadata=json.loads(metadata))
+
+
+class PositionIds(Mapping):
+    """index_to_docstore_id for a SqliteDocstore: position i maps to id str(i)."""
+
+    def __init__(self, ntotal: int):
+        self.ntotal = ntotal
+
+    def __getitem__(self, i):
+        if not 0 <= i < self.ntotal:
+            raise KeyError(i)
+        return str(i)
+
+    def __iter__(self):
+        return iter(range(self.ntotal))
+
+    def __len__(self):
+        return self.ntotal
+
+
+def is_mmap_format(path: str) -> bool:
+    return os.path.exists(os.path.join(path, DOCSTORE_FILE))
+
+
+def write_docstore(documents, path: str):
+    """Write an iterable of Documents, in index order, to a docstore.db at path."""
+    tmp_path = path + ".tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    conn = sqlite3.connect(tmp_path)
+    conn.execute(
+        "CREATE TABLE docs (pos INTEGER PRIMARY KEY, page_content TEXT NOT NULL, metadata TEXT NOT NULL)"
+    )
+    conn.executemany(
+        "INSERT INTO docs (pos, page_content, metadata) VALUES (?, ?, ?)",
+        (
+            (pos, doc.page_content, json.dumps(doc.metadata, default=str))
+            for pos, doc in enumerate(documents)
+        ),
+    )
+    conn.commit()
+    conn.close()
+    os.replace(tmp_path, path)
+
+
+def iter_chunks(vector_db):
+    """Yield every chunk Document of a loaded vector store, in index order."""
+    if isinstance(vector_db.docstore, SqliteDocstore):
+        for _, doc in vector_db.docstore.iter_documents():
+            yield doc
+    else:
+        for pos in range(vector_db.index.ntotal):
+            yield vector_db.docstore.search(vector_db.index_to_docstore_id[pos])
+
+
+def write_faiss_index(index, params, path: str):
+    index_file = os.path.join(path, INDEX_FILE)
+    faiss.write_index(index, index_file + ".tmp")
+    os.replace(index_file + ".tmp", index_file)
+    write_params(params, os.path.join(path, PARAMS_FILE))
+
+
+def save_index(vector_db, path: str, index_type: str = RAG_INDEX_TYPE):
+    """
+    Save a FAISS vector store in the memory-mappable format.
+
+    The (flat) index built during ingestion is rebuilt as the type chosen for its
+    size. Files are written next to their final name and renamed into place, so
+    workers that already mapped the previous version keep reading it until they
+    reload.
+    """
+    save_chunks(lambda: iter_chunks(vector_db), index_vectors(vector_db.index), path, index_type)
+    legacy_file = os.path.join(path, LEGACY_DOCSTORE_FILE)
+    if os.path.exists(legacy_file):
+        os.remove(legacy_file)
+
+
+def save_chunks(chunks, vectors, path: str, index_type: str = RAG_INDEX_TYPE):
+    """
+    Write an index directory from chunks() (an iterable of Documents, called once
+    per file) and their vectors, in the same order.
+    """
+    os.makedirs(path, exist_ok=True)
+    write_docstore(chunks(), os.path.join(path, DOCSTORE_FILE))
+    write_bm25((doc.page_content for doc in chunks()), os.path.join(path, BM25_FILE))
+
+    index, params = build_index(vectors, choose_index_type(len(vectors), index_type))
+    write_faiss_index(index, params, path)
+
+
+def directory_signature(path: str) -> Tuple:
+    """
+    Cheap fingerprint of an index directory.
+
+    Changes whenever /upload (in this or any other worker) rewrites a file in it.
+    """
+    try:
+        entries = sorted(os.scandir(path), key=lambda e: e.name)
+    except FileNotFoundError:
+        return ()
+    return tuple(
+        (e.name, e.stat().st_mtime_ns, e.stat().st_size) for e in entries if e.is_file()
+    )
+
+
+def load_index(path: str, embeddings):
+    """Load a subject index, memory-mapped if it is in the new format."""
+    if not is_mmap_format(path):
+        return FAISS.load_local(path, embeddings, allow_dangerous_deserialization=True)
+
+    index = faiss.read_index(os.path.join(path, INDEX_FILE), MMAP_FLAGS)
+    params = read_params(os.path.join(path, PARAMS_FILE))
+    # Skipped if index.json belongs to a version of index.faiss being replaced;
+    # the next reload picks up the matching pair
+    if params and params["ntotal"] == index.ntotal:
+        configure_search(index, params)
+    docstore = SqliteDocstore(os.path.join(path, DOCSTORE_FILE))
+    return FAISS(embeddings, index, docstore, PositionIds(index.ntotal))
+
+
+def convert_legacy_index(path: str, index_type: str = RAG_INDEX_TYPE):
+    """Rewrite a FAISS.save_local directory in the memory-mappable format."""
+    vector_db = FAISS.load_local(path, None, allow_dangerous_deserialization=True)
+    save_index(vector_db, path, index_type)
+
+
+def rebuild_index(path: str, index_type: str = RAG_INDEX_TYPE):
+    """Rebuild a converted subject's index.faiss as the type chosen for its size."""
+    index = faiss.read_index(os.path.join(path, INDEX_FILE))
+    params = read_params(os.path.join(path, PARAMS_FILE)) or {"type": "flat"}
+    kind = choose_index_type(index.ntotal, index_type)
+    if params["type"] == kind:
+        return False
+    index, params = build_index(index_vectors(index), kind)
+    write_faiss_index(index, params, path)
+    return True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("rag_dir", nargs="?", default="RAG")
+    parser.add_argument("--rebuild", action="store_true", help="rebuild indexes whose type no longer fits their size")
+    parser.add_argument("--type", default=RAG_INDEX_TYPE, choices=("auto",) + INDEX_TYPES)
+    args = parser.parse_args()
+    rag_dir = args.rag_dir
+    for name in sorted(os.listdir(rag_dir)):
+        subject_path = os.path.join(rag_dir, name)
+        if not os.path.isdir(subject_path):
+            continue
+        if not is_mmap_format(subject_path):
+            print(f"Converting {subject_path}")
+            convert_legacy_index(subject_path, args.type)
+        elif not os.path.exists(os.path.join(subject_path, BM25_FILE)):
+            print(f"Building {BM25_FILE} for {subject_path}")
+            with SqliteDocstore(os.path.join(subject_path, DOCSTORE_FILE)) as docstore:
+                write_bm25(
+                    (doc.page_content for _, doc in docstore.iter_documents()),
+                    os.path.join(subject_path, BM25_FILE),
+                )
+        if args.rebuild and rebuild_index(subject_path, args.type):
+            print(f"Rebuilt {subject_path} as {read_params(os.path.join(subject_path, PARAMS_FILE))['type']}")
@@ -0,0 +1,316 @@
+import multiprocessing
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain_community.vectorstores import FAISS
+
+from utils.index_store import save_index
+from utils.migrations import apply_migrations
+
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 250
+PAGES_PER_TASK = int(os.getenv("INGEST_PAGES_PER_TASK", "16"))
+EMBED_BATCH_SIZE = int(os.getenv("INGEST_EMBED_BATCH_SIZE", "256"))
+INGEST_PROCESSES = int(os.getenv("INGEST_PROCESSES", str(max(1, (os.cpu_count() or 2) - 1))))
+INGEST_CONCURRENT_JOBS = int(os.getenv("INGEST_CONCURRENT_JOBS", "1"))
+# Finished jobs are kept this long for /upload status polling
+JOB_RETENTION_SECONDS = 3600
+# Job state is shared by every worker, so /upload/{job_id} can be polled on any
+# of them, and survives restarts
+JOBS_DB_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "ingest_jobs.db"
+)
+JOB_FIELDS = (
+    "job_id", "subject", "filename", "state", "error", "pages_total", "pages_done",
+    "chunks_done", "created_at", "started_at", "finished_at", "owner_pid",
+)
+JOB_MIGRATIONS = [
+    [
+        '''CREATE TABLE IF NOT EXISTS ingest_jobs
+        (job_id TEXT PRIMARY KEY,
+        subject TEXT NOT NULL,
+        filename TEXT NOT NULL,
+        state TEXT NOT NULL,
+        error TEXT,
+        pages_total INTEGER NOT NULL DEFAULT 0,
+        pages_done INTEGER NOT NULL DEFAULT 0,
+        chunks_done INTEGER NOT NULL DEFAULT 0,
+        created_at REAL NOT NULL,
+        started_at REAL,
+        finished_at REAL)''',
+        'CREATE INDEX IF NOT EXISTS idx_ingest_jobs_finished ON ingest_jobs (finished_at)',
+    ],
+    # 2: the worker running each job, so jobs of a worker that died can be failed
+    [
+        'ALTER TABLE ingest_jobs ADD COLUMN owner_pid INTEGER',
+    ],
+]
+INTERRUPTED_ERROR = "Interrupted by a server restart; upload the file again"
+
+Chunk = Tuple[str, Dict]
+
+
+def process_alive(pid: Optional[int]) -> bool:
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def count_pages(pdf_path: str) -> int:
+    from pypdf import PdfReader
+
+    return len(PdfReader(pdf_path).pages)
+
+
+def parse_pages(pdf_path: str, source: str, start: int, stop: int) -> List[Chunk]:
+    """Extract and split pages [start, stop) of a PDF. Runs in a worker process."""
+    from pypdf import PdfReader
+
+    reader = PdfReader(pdf_path)
+    splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+    chunks = []
+    for page_number in range(start, stop):
+        text = reader.pages[page_number].extract_text() or ""
+        # Same metadata PyPDFLoader produced, with the uploaded file name as source
+        metadata = {"source": source, "page": page_number}
+        chunks.extend((piece, dict(metadata)) for piece in splitter.split_text(text))
+    return chunks
+
+
+class IngestJob:
+    def __init__(self, subject: str, filename: str):
+        self.job_id = str(uuid.uuid4())
+        self.subject = subject
+        self.filename = filename
+        self.state = "queued"
+        self.error: Optional[str] = None
+        self.pages_total = 0
+        self.pages_done = 0
+        self.chunks_done = 0
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.owner_pid = os.getpid()
+
+    @classmethod
+    def from_row(cls, row) -> "IngestJob":
+        job = cls.__new__(cls)
+        for field, value in zip(JOB_FIELDS, row):
+            setattr(job, field, value)
+        return job
+
+    def row(self) -> Tuple:
+        return tuple(getattr(self, field) for field in JOB_FIELDS)
+
+    def to_dict(self) -> Dict:
+        end = self.finished_at or time.time()
+        elapsed = end - self.started_at if self.started_at else 0.0
+        return {
+            "job_id": self.job_id,
+            "subject": self.subject,
+            "filename": self.filename,
+            "state": self.state,
+            "error": self.error,
+            "pages_total": self.pages_total,
+            "pages_done": self.pages_done,
+            "chunks_done": self.chunks_done,
+            "elapsed_seconds": round(elapsed, 3),
+            "pages_per_sec": round(self.pages_done / elapsed, 2) if elapsed else 0.0,
+            "chunks_per_sec": round(self.chunks_done / elapsed, 2) if elapsed else 0.0,
+        }
+
+
+class IngestionManager:
+    """
+    Runs textbook ingestion in the background.
+
+    Pages are parsed and split across a process pool, chunks are embedded in large
+    batches with the shared embedding model and added to the FAISS index as they
+    arrive, and the finished index is saved under RAG/{subject}. get_embeddings
+    is called when a job runs; have it return a CachedEmbeddings so re-uploaded
+    or shared chunks are not embedded again.
+    """
+
+    def __init__(
+        self,
+        get_embeddings: Callable[[], object],
+        rag_dir: str = "RAG",
+        on_complete: Optional[Callable[[str], None]] = None,
+        db_path: str = JOBS_DB_PATH,
+    ):
+        self.get_embeddings = get_embeddings
+        self.rag_dir = rag_dir
+        self.on_complete = on_complete
+        self.db_path = db_path
+        # Opened on first use, so each worker gets its own connection after fork
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        # Jobs submitted here that have not started, with their uploaded PDFs
+        self._queued: Dict[str, Tuple[IngestJob, str, Future]] = {}
+        self._runner = ThreadPoolExecutor(max_workers=INGEST_CONCURRENT_JOBS)
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    @property
+    def pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # spawn, so workers do not inherit the embedding model and open sockets
+            self._pool = ProcessPoolExecutor(
+                max_workers=INGEST_PROCESSES, mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._pool
+
+    def _db(self) -> sqlite3.Connection:
+        # Callers hold self._lock
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            conn = sqlite3.connect(
+                self.db_path, timeout=30, isolation_level=None, check_same_thread=False
+            )
+            conn.execute("PRAGMA journal_mode=WAL")
+            apply_migrations(conn, JOB_MIGRATIONS)
+            self._conn = conn
+            self._fail_orphans()
+        return self._conn
+
+    def _fail_orphans(self, job_id: Optional[str] = None):
+        """Fail unfinished jobs (or the one job) whose worker is no longer running. Callers hold self._lock."""
+        query = "SELECT job_id, owner_pid FROM ingest_jobs WHERE finished_at IS NULL"
+        args: Tuple = ()
+        if job_id is not None:
+            query += " AND job_id = ?"
+            args = (job_id,)
+        orphans = [
+            (INTERRUPTED_ERROR, time.time(), orphan_id)
+            for orphan_id, owner_pid in self._conn.execute(query, args).fetchall()
+            if not process_alive(owner_pid)
+        ]
+        self._conn.executemany(
+            "UPDATE ingest_jobs SET state = 'failed', error = ?, finished_at = ? "
+            "WHERE job_id = ? AND finished_at IS NULL",
+            orphans,
+        )
+
+    def _save(self, job: IngestJob):
+        with self._lock:
+            self._db().execute(
+                f"INSERT OR REPLACE INTO ingest_jobs ({', '.join(JOB_FIELDS)}) "
+                f"VALUES ({', '.join('?' * len(JOB_FIELDS))})",
+                job.row(),
+            )
+
+    def submit(self, pdf_path: str, filename: str) -> IngestJob:
+        """Queue a PDF for ingestion. The file at pdf_path is deleted when the job ends."""
+        subject = os.path.splitext(filename)[0]
+        job = IngestJob(subject, filename)
+        self._prune()
+        self._save(job)
+        with self._lock:
+            future = self._runner.submit(self._run, job, pdf_path)
+            self._queued[job.job_id] = (job, pdf_path, future)
+        return job
+
+    def get(self, job_id: str) -> Optional[IngestJob]:
+        """A job submitted to any worker, as last saved."""
+        with self._lock:
+            self._db()
+            self._fail_orphans(job_id)
+            row = self._conn.execute(
+                f"SELECT {', '.join(JOB_FIELDS)} FROM ingest_jobs WHERE job_id = ?", (job_id,)
+            ).fetchone()
+        return IngestJob.from_row(row) if row else None
+
+    def _prune(self):
+        cutoff = time.time() - JOB_RETENTION_SECONDS
+        with self._lock:
+            self._db()
+            self._fail_orphans()
+            self._conn.execute("DELETE FROM ingest_jobs WHERE finished_at < ?", (cutoff,))
+
+    def _embed_batch(self, vector_db, batch: List[Chunk]):
+        texts = [text for text, _ in batch]
+        metadatas = [metadata for _, metadata in batch]
+        embeddings = self.get_embeddings()
+        vectors = embeddings.embed_documents(texts)
+        text_embeddings = list(zip(texts, vectors))
+        if vector_db is None:
+            return FAISS.from_embeddings(text_embeddings, embeddings, metadatas=metadatas)
+        vector_db.add_embeddings(text_embeddings, metadatas=metadatas)
+        return vector_db
+
+    def _run(self, job: IngestJob, pdf_path: str):
+        with self._lock:
+            self._queued.pop(job.job_id, None)
+        job.started_at = time.time()
+        try:
+            job.state = "parsing"
+            job.pages_total = count_pages(pdf_path)
+            self._save(job)
+            ranges = [
+                (start, min(start + PAGES_PER_TASK, job.pages_total))
+                for start in range(0, job.pages_total, PAGES_PER_TASK)
+            ]
+            futures = [
+                self.pool.submit(parse_pages, pdf_path, job.filename, start, stop)
+                for start, stop in ranges
+            ]
+
+            vector_db = None
+            batch: List[Chunk] = []
+            # Embed in page order while later pages are still being parsed
+            for (start, stop), future in zip(ranges, futures):
+                batch.extend(future.result())
+                job.pages_done += stop - start
+                job.state = "embedding"
+                while len(batch) >= EMBED_BATCH_SIZE:
+                    vector_db = self._embed_batch(vector_db, batch[:EMBED_BATCH_SIZE])
+                    job.chunks_done += EMBED_BATCH_SIZE
+                    batch = batch[EMBED_BATCH_SIZE:]
+                self._save(job)
+            if batch:
+                vector_db = self._embed_batch(vector_db, batch)
+                job.chunks_done += len(batch)
+            if vector_db is None:
+                raise ValueError("No text could be extracted from the PDF")
+
+            job.state = "saving"
+            save_index(vector_db, os.path.join(self.rag_dir, job.subject))
+            if self.on_complete:
+                self.on_complete(job.subject)
+            job.state = "done"
+        except Exception as e:
+            print(f"Ingestion of {job.filename} failed: {type(e).__name__} - {str(e)}")
+            job.state = "failed"
+            job.error = str(e)
+        finally:
+            job.finished_at = time.time()
+            os.remove(pdf_path)
+            self._save(job)
+
+    def shutdown(self):
+        self._runner.shutdown(wait=False, cancel_futures=True)
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+        # Queued jobs were cancelled before they ran, so nothing else removes their PDFs
+        with self._lock:
+            cancelled = [
+                (job, pdf_path) for job, pdf_path, future in self._queued.values() if future.cancelled()
+            ]
+        for job, pdf_path in cancelled:
+            if os.path.exists(pdf_path):
+                os.remove(pdf_path)
+            job.state = "failed"
+            job.error = "Cancelled by a server shutdown; upload the file again"
+            job.finished_at = time.time()
+            self._save(job)
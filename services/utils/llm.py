@@ -0,0 +1,138 @@
+import asyncio
+import os
+from typing import Dict, Optional
+
+import httpx
+from groq import AsyncGroq
+
+LLM_MODEL = "llama-3.3-70b-versatile"
+
+# One connection pool per worker, shared by every endpoint
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "1000"))
+LLM_MAX_KEEPALIVE = int(os.getenv("LLM_MAX_KEEPALIVE", "100"))
+
+# (max concurrent calls, timeout in seconds) per endpoint. Override with
+# LLM_CONCURRENCY_<ENDPOINT> and LLM_TIMEOUT_<ENDPOINT>, e.g. LLM_TIMEOUT_REVISION=45
+DEFAULT_LIMITS = (int(os.getenv("LLM_CONCURRENCY", "256")), float(os.getenv("LLM_TIMEOUT", "60")))
+ENDPOINT_LIMITS = {
+    "recommendations": (256, 20.0),
+    "autocomplete": (512, 5.0),
+    "revision": (256, 60.0),
+    "carreer": (256, 60.0),
+    "video_questions": (128, 90.0),
+    "aptitude": (128, 60.0),
+    # Query rewrites sit in front of /chat retrieval; give up quickly
+    "contextualize": (256, 3.0),
+}
+
+
+class LLMTimeout(Exception):
+    pass
+
+
+def endpoint_limits(endpoint: str):
+    concurrency, timeout = ENDPOINT_LIMITS.get(endpoint, DEFAULT_LIMITS)
+    name = endpoint.upper()
+    concurrency = int(os.getenv(f"LLM_CONCURRENCY_{name}", concurrency))
+    timeout = float(os.getenv(f"LLM_TIMEOUT_{name}", timeout))
+    return concurrency, timeout
+
+
+class LLMClient:
+    """
+    Non-blocking Groq chat completions for the API endpoints.
+
+    Each endpoint gets its own concurrency limit so a burst on one (say /video_questions)
+    cannot starve the others, and its own timeout that covers both queueing for a slot
+    and the call itself.
+    """
+
+    def __init__(self, api_key: Optional[str]):
+        self.api_key = api_key
+        self._client: Optional[AsyncGroq] = None
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._timeouts: Dict[str, float] = {}
+
+    @property
+    def client(self) -> AsyncGroq:
+        if self._client is None:
+            http_client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=LLM_MAX_CONNECTIONS,
+                    max_keepalive_connections=LLM_MAX_KEEPALIVE,
+                ),
+                # Reads are bounded by each call's endpoint timeout (wait_for), which
+                # LLM_TIMEOUT_<ENDPOINT> may set above any fixed transport limit
+                timeout=httpx.Timeout(None, connect=5.0),
+            )
+            self._client = AsyncGroq(api_key=self.api_key, http_client=http_client)
+        return self._client
+
+    def _limits(self, endpoint: str):
+        if endpoint not in self._semaphores:
+            concurrency, timeout = endpoint_limits(endpoint)
+            self._semaphores[endpoint] = asyncio.Semaphore(concurrency)
+            self._timeouts[endpoint] = timeout
+        return self._semaphores[endpoint], self._timeouts[endpoint]
+
+    async def _create(self, semaphore: asyncio.Semaphore, kwargs):
+        async with semaphore:
+            return await self.client.chat.completions.create(**kwargs)
+
+    async def create(self, endpoint: str, **kwargs):
+        """Run client.chat.completions.create under the endpoint's limit and timeout."""
+        semaphore, timeout = self._limits(endpoint)
+        kwargs.setdefault("model", LLM_MODEL)
+        try:
+            return await asyncio.wait_for(self._create(semaphore, kwargs), timeout)
+        except asyncio.TimeoutError:
+            raise LLMTimeout(f"LLM call for '{endpoint}' timed out after {timeout}s")
+
+    async def complete(self, endpoint: str, **kwargs) -> str:
+        """Like create, but returns the message content of the first choice."""
+        response = await self.create(endpoint, **kwargs)
+        return response.choices[0].message.content
+
+    async def stream(self, endpoint: str, **kwargs):
+        """
+        Stream a completion, yielding content deltas as they arrive. The endpoint's
+        slot is held until the stream ends, and its timeout bounds the whole stream.
+        """
+        semaphore, timeout = self._limits(endpoint)
+        kwargs.setdefault("model", LLM_MODEL)
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        try:
+            await asyncio.wait_for(semaphore.acquire(), timeout)
+        except asyncio.TimeoutError:
+            raise LLMTimeout(f"LLM call for '{endpoint}' timed out after {timeout}s")
+        stream = None
+        try:
+            stream = await asyncio.wait_for(
+                self.client.chat.completions.create(stream=True, **kwargs),
+                deadline - loop.time(),
+            )
+            chunks = stream.__aiter__()
+            while True:
+                try:
+                    chunk = await asyncio.wait_for(chunks.__anext__(), deadline - loop.time())
+                except StopAsyncIteration:
+                    break
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if delta:
+                    yield delta
+        except asyncio.TimeoutError:
+            raise LLMTimeout(f"LLM call for '{endpoint}' timed out after {timeout}s")
+        finally:
+            try:
+                # Also on early exit (client gone, cancellation, timeout), so the
+                # HTTP response is not left open on the shared connection pool
+                if stream is not None:
+                    await stream.close()
+            finally:
+                semaphore.release()
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.close()
+            self._client = None
@@ -0,0 +1,56 @@
+import sqlite3
+from typing import List
+
+# Lists of SQL statements, applied in order. The schema_version table records
+# which have run, so startup is a single SELECT once a database is up to date.
+Migrations = List[List[str]]
+
+
+def get_schema_version(conn: sqlite3.Connection) -> int:
+    """Get the number of migrations applied to a database"""
+    try:
+        return conn.execute('SELECT COALESCE(MAX(version), 0) FROM schema_version').fetchone()[0]
+    except sqlite3.OperationalError:
+        # No schema_version table yet
+        return 0
+
+
+def apply_migrations(conn: sqlite3.Connection, migrations: Migrations, baseline: int = 0):
+    """
+    Apply the migrations a database has not seen yet.
+
+    conn must be in autocommit mode (isolation_level=None). Pending migrations and
+    their version rows are written in one BEGIN IMMEDIATE transaction, so when
+    several workers start together one migrates while the others wait on the
+    write lock and then find nothing left to do. baseline is the number of
+    migrations a database that has no schema_version table yet is known to have
+    applied by other means.
+    """
+    if get_schema_version(conn) >= len(migrations):
+        return
+
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        conn.execute(
+            '''
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INTEGER PRIMARY KEY,
+                applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            '''
+        )
+        version = get_schema_version(conn)
+        if version == 0 and baseline:
+            conn.executemany(
+                'INSERT INTO schema_version (version) VALUES (?)',
+                ((number,) for number in range(1, baseline + 1)),
+            )
+            version = baseline
+        for number, statements in enumerate(migrations[version:], start=version + 1):
+            for statement in statements:
+                conn.execute(statement)
+            conn.execute('INSERT INTO schema_version (version) VALUES (?)', (number,))
+        conn.execute('COMMIT')
+    except BaseException:
+        conn.execute('ROLLBACK')
+        raise
@@ -0,0 +1,242 @@
+import asyncio
+import os
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import numpy as np
+
+from utils.assessdb import (
+    add_to_video_question_bank,
+    count_video_question_bank,
+    sample_video_question_bank,
+    add_to_aptitude_pool,
+    acquire_refill_lease,
+    count_aptitude_pool,
+    count_unseen_aptitude_questions,
+    get_aptitude_pool_embeddings,
+    release_refill_lease,
+    serve_aptitude_questions,
+)
+
+QUESTIONS_PER_ASSESSMENT = 5
+# Serve from the bank once it holds this many questions for a video, and keep
+# generating in the background until it reaches VIDEO_BANK_TARGET
+VIDEO_BANK_MIN_SIZE = int(os.getenv("VIDEO_BANK_MIN_SIZE", "15"))
+VIDEO_BANK_TARGET = int(os.getenv("VIDEO_BANK_TARGET", "40"))
+# The aptitude pool is refilled up to APTITUDE_POOL_TARGET whenever it drops below
+# APTITUDE_POOL_LOW_WATER, or when a user has nearly run out of unseen questions
+APTITUDE_POOL_LOW_WATER = int(os.getenv("APTITUDE_POOL_LOW_WATER", "100"))
+APTITUDE_POOL_TARGET = int(os.getenv("APTITUDE_POOL_TARGET", "200"))
+APTITUDE_POOL_MAX = int(os.getenv("APTITUDE_POOL_MAX", "2000"))
+# Questions whose embeddings are at least this similar to a pooled one are dropped
+APTITUDE_DEDUPE_THRESHOLD = float(os.getenv("APTITUDE_DEDUPE_THRESHOLD", "0.9"))
+# Give up on a refill after this many generations in a row add nothing new
+MAX_FRUITLESS_ROUNDS = 3
+# One worker refills the shared aptitude pool at a time. Its lease is extended
+# every batch and lapses this long after a worker dies mid-refill
+APTITUDE_REFILL_LEASE = "aptitude_pool"
+APTITUDE_REFILL_LEASE_SECONDS = 120.0
+# How often a worker waiting on another's refill checks the pool
+APTITUDE_REFILL_POLL_SECONDS = 1.0
+
+
+def is_valid_question(q_data) -> bool:
+    return (
+        isinstance(q_data, dict)
+        and isinstance(q_data.get("question"), str)
+        and bool(q_data["question"].strip())
+        and isinstance(q_data.get("options"), list)
+        and len(q_data["options"]) >= 2
+        and q_data.get("correct_answer") in q_data["options"]
+    )
+
+
+class VideoQuestionBank:
+    """
+    Multiple-choice questions per YouTube video, shared by everyone assessed on it.
+
+    Until a video's bank holds min_size questions each request generates a fresh
+    set and banks it. After that requests sample from the bank, and generation
+    only runs in the background (one task per video) until the bank reaches target.
+    """
+
+    def __init__(
+        self,
+        generate: Callable[[str], Awaitable[List[Dict]]],
+        min_size: int = VIDEO_BANK_MIN_SIZE,
+        target: int = VIDEO_BANK_TARGET,
+    ):
+        self.generate = generate
+        self.min_size = min_size
+        self.target = target
+        self._top_ups: Dict[str, asyncio.Task] = {}
+        self._stats = {"served_from_bank": 0, "generated": 0, "top_ups": 0, "top_up_errors": 0, "invalid": 0}
+
+    async def _generate_and_bank(self, video_id: str, transcript: str) -> List[Dict]:
+        questions = await self.generate(transcript)
+        valid = [q for q in questions if is_valid_question(q)]
+        self._stats["invalid"] += len(questions) - len(valid)
+        if valid:
+            await asyncio.to_thread(add_to_video_question_bank, video_id, valid)
+        return questions
+
+    def top_up(self, video_id: str, transcript: str):
+        if video_id in self._top_ups:
+            return
+        self._stats["top_ups"] += 1
+
+        async def run():
+            try:
+                await self._generate_and_bank(video_id, transcript)
+            except Exception as e:
+                self._stats["top_up_errors"] += 1
+                print(f"Question bank top-up for {video_id} failed: {type(e).__name__} - {str(e)}")
+            finally:
+                self._top_ups.pop(video_id, None)
+
+        self._top_ups[video_id] = asyncio.create_task(run())
+
+    async def get_questions(self, video_id: str, transcript: str) -> List[Dict]:
+        banked = await asyncio.to_thread(count_video_question_bank, video_id)
+        if banked >= self.min_size:
+            if banked < self.target:
+                self.top_up(video_id, transcript)
+            self._stats["served_from_bank"] += 1
+            return await asyncio.to_thread(sample_video_question_bank, video_id, QUESTIONS_PER_ASSESSMENT)
+        self._stats["generated"] += 1
+        questions = await self._generate_and_bank(video_id, transcript)
+        return questions[:QUESTIONS_PER_ASSESSMENT]
+
+    def stats(self) -> Dict:
+        stats = dict(self._stats)
+        stats["top_ups_running"] = len(self._top_ups)
+        return stats
+
+
+class AptitudeQuestionPool:
+    """
+    Shared pool of aptitude questions in assessment.db, so /aptitude is a read.
+
+    A single background refill at a time, across all workers, generates batches
+    until the pool reaches target. Each candidate is embedded and dropped when it
+    is a near-duplicate of a pooled question (including ones added by other
+    workers) or of another candidate. Only a request against an empty pool waits,
+    and only until the first batch is stored.
+    """
+
+    def __init__(
+        self,
+        generate: Callable[[], Awaitable[List[Dict]]],
+        embeddings,
+        low_water: int = APTITUDE_POOL_LOW_WATER,
+        target: int = APTITUDE_POOL_TARGET,
+        threshold: float = APTITUDE_DEDUPE_THRESHOLD,
+    ):
+        self.generate = generate
+        self.embeddings = embeddings
+        self.low_water = low_water
+        self.target = target
+        self.threshold = threshold
+        self._vectors: Optional[np.ndarray] = None
+        self._last_id = 0
+        self._refill: Optional[asyncio.Task] = None
+        # Set once the running refill has stored questions
+        self._first_batch = asyncio.Event()
+        self._stats = {"served": 0, "waited": 0, "refills": 0, "refill_errors": 0, "added": 0, "duplicates": 0, "invalid": 0}
+
+    def _embed(self, texts: List[str]) -> np.ndarray:
+        vectors = np.asarray(self.embeddings.embed_documents(texts), dtype=np.float32)
+        return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+    def _sync_vectors(self):
+        rows = get_aptitude_pool_embeddings(self._last_id)
+        if rows:
+            new = np.stack([np.frombuffer(blob, dtype=np.float32) for _, blob in rows])
+            self._vectors = new if self._vectors is None else np.vstack([self._vectors, new])
+            self._last_id = rows[-1][0]
+
+    def _dedupe_and_store(self, questions: List[Dict]) -> int:
+        self._sync_vectors()
+        vectors = self._embed([q["question"] for q in questions])
+        pooled = self._vectors if self._vectors is not None else np.empty((0, vectors.shape[1]), dtype=np.float32)
+        kept, kept_vectors = [], []
+        for q_data, vector in zip(questions, vectors):
+            known = np.vstack([pooled] + kept_vectors)
+            if len(known) and float(np.max(known @ vector)) >= self.threshold:
+                self._stats["duplicates"] += 1
+                continue
+            kept.append(q_data)
+            kept_vectors.append(vector[None, :])
+        if not kept:
+            return 0
+        added = add_to_aptitude_pool(kept, [v.tobytes() for v in kept_vectors])
+        self._sync_vectors()
+        return added
+
+    async def _fill(self, target: int):
+        # Read at run time, since workers forked from a preloaded app share the object
+        owner = str(os.getpid())
+        lease = (APTITUDE_REFILL_LEASE, owner, APTITUDE_REFILL_LEASE_SECONDS)
+        while not await asyncio.to_thread(acquire_refill_lease, *lease):
+            # Another worker is refilling; its questions land in the same pool
+            if await asyncio.to_thread(count_aptitude_pool) >= QUESTIONS_PER_ASSESSMENT:
+                self._first_batch.set()
+                return
+            await asyncio.sleep(APTITUDE_REFILL_POLL_SECONDS)
+        try:
+            fruitless = 0
+            while fruitless < MAX_FRUITLESS_ROUNDS:
+                if await asyncio.to_thread(count_aptitude_pool) >= target:
+                    break
+                questions = await self.generate()
+                valid = [q for q in questions if is_valid_question(q)]
+                self._stats["invalid"] += len(questions) - len(valid)
+                added = await asyncio.to_thread(self._dedupe_and_store, valid) if valid else 0
+                self._stats["added"] += added
+                fruitless = 0 if added else fruitless + 1
+                if added:
+                    self._first_batch.set()
+                await asyncio.to_thread(acquire_refill_lease, *lease)
+        finally:
+            await asyncio.to_thread(release_refill_lease, APTITUDE_REFILL_LEASE, owner)
+
+    def refill(self, target: Optional[int] = None) -> asyncio.Task:
+        """Start (or join) the background refill."""
+        if self._refill is None:
+            self._stats["refills"] += 1
+            self._first_batch = asyncio.Event()
+            self._refill = asyncio.create_task(self._fill(min(target or self.target, APTITUDE_POOL_MAX)))
+
+            def done(t: asyncio.Task):
+                self._refill = None
+                if not t.cancelled() and t.exception() is not None:
+                    self._stats["refill_errors"] += 1
+                    print(f"Aptitude pool refill failed: {type(t.exception()).__name__} - {str(t.exception())}")
+
+            self._refill.add_done_callback(done)
+        return self._refill
+
+    async def get_questions(self, user_id: Optional[str] = None) -> List[Dict]:
+        pooled = await asyncio.to_thread(count_aptitude_pool)
+        if pooled < self.low_water:
+            task = self.refill()
+            if pooled < QUESTIONS_PER_ASSESSMENT:
+                self._stats["waited"] += 1
+                first_batch = asyncio.ensure_future(self._first_batch.wait())
+                try:
+                    # The refill itself is left running when this request goes away
+                    await asyncio.wait({task, first_batch}, return_when=asyncio.FIRST_COMPLETED)
+                finally:
+                    first_batch.cancel()
+        elif user_id is not None:
+            unseen = await asyncio.to_thread(count_unseen_aptitude_questions, user_id)
+            if unseen < 2 * QUESTIONS_PER_ASSESSMENT:
+                # This user has seen most of the pool; grow it before they see repeats
+                self.refill(pooled + self.target - self.low_water)
+        self._stats["served"] += 1
+        return await asyncio.to_thread(serve_aptitude_questions, user_id, QUESTIONS_PER_ASSESSMENT)
+
+    def stats(self) -> Dict:
+        stats = dict(self._stats)
+        stats["pooled"] = count_aptitude_pool()
+        stats["refilling"] = self._refill is not None
+        return stats
@@ -0,0 +1,224 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from utils.bot import load_vector_db, initialize_rag_chain
+from utils.hybrid_search import build_retriever
+from utils.index_store import directory_signature, iter_chunks
+from utils.unified_store import UNIFIED_DIR, load_unified_store
+
+RAG_DIR = "RAG"
+
+# Budget for the loaded vector stores, estimated from their on-disk size
+RAG_CACHE_MAX_BYTES = int(os.getenv("RAG_CACHE_MAX_BYTES", str(1024 * 1024 * 1024)))
+
+
+def index_path(subject: str) -> str:
+    return os.path.join(RAG_DIR, subject)
+
+
+def index_signature(subject: str) -> Tuple:
+    return directory_signature(index_path(subject))
+
+
+def index_size(signature: Tuple) -> int:
+    return sum(size for _, _, size in signature)
+
+
+class _Entry:
+    def __init__(self, vector_db, retriever, signature: Tuple, size: int, unified=None):
+        self.vector_db = vector_db
+        self.retriever = retriever
+        self.signature = signature
+        self.size = size
+        # The UnifiedStore serving this subject, if any
+        self.unified = unified
+        self.chains: Dict[str, object] = {}
+
+
+class RagCache:
+    """
+    Process-wide registry of loaded FAISS vector stores and the RAG chains built on them.
+
+    Vector stores are keyed by subject and evicted least-recently-used once their
+    combined size exceeds max_bytes. Chains are keyed by (subject, learner_type) and
+    live as long as the vector store they were built on.
+
+    Subjects merged into the unified store at unified_dir (see utils.unified_store)
+    are searched there, filtered to the subject, instead of loading their own index.
+    """
+
+    def __init__(
+        self,
+        get_model,
+        embeddings,
+        max_bytes: int = RAG_CACHE_MAX_BYTES,
+        unified_dir: Optional[str] = UNIFIED_DIR,
+    ):
+        # Called when the first chain is built, so the chat model is created lazily
+        self.get_model = get_model
+        self.embeddings = embeddings
+        self.max_bytes = max_bytes
+        self.unified_dir = unified_dir
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._load_locks: Dict[str, threading.Lock] = {}
+        self._unified = None
+        self._unified_signature: Tuple = ()
+        self._unified_lock = threading.Lock()
+        self._stats = {
+            "index_hits": 0,
+            "index_misses": 0,
+            "index_loads": 0,
+            "index_load_seconds": 0.0,
+            "chain_hits": 0,
+            "chain_misses": 0,
+            "evictions": 0,
+            "invalidations": 0,
+            "unified_subject_loads": 0,
+            "unified_loads": 0,
+        }
+
+    def _load_lock(self, subject: str) -> threading.Lock:
+        with self._lock:
+            return self._load_locks.setdefault(subject, threading.Lock())
+
+    def _lookup(self, subject: str, signature: Tuple) -> Optional[_Entry]:
+        with self._lock:
+            entry = self._entries.get(subject)
+            if entry is None:
+                return None
+            if entry.signature != signature:
+                # Index directory was rewritten since we loaded it
+                del self._entries[subject]
+                self._stats["invalidations"] += 1
+                return None
+            self._entries.move_to_end(subject)
+            return entry
+
+    def _evict(self):
+        # Always keep the most recently used entry, even if it alone exceeds the budget
+        total = sum(e.size for e in self._entries.values())
+        while total > self.max_bytes and len(self._entries) > 1:
+            _, evicted = self._entries.popitem(last=False)
+            total -= evicted.size
+            self._stats["evictions"] += 1
+
+    def unified_store(self):
+        """The unified store, reloaded when the merge tool rewrites it; None if there is none."""
+        if not self.unified_dir:
+            return None
+        signature = directory_signature(self.unified_dir)
+        if signature == self._unified_signature:
+            return self._unified
+        with self._unified_lock:
+            if signature != self._unified_signature:
+                store = load_unified_store(self.unified_dir, self.embeddings) if signature else None
+                with self._lock:
+                    self._unified, self._unified_signature = store, signature
+                    if store is not None:
+                        self._stats["unified_loads"] += 1
+            return self._unified
+
+    def _source(self, subject: str) -> Tuple[Tuple, Optional[object]]:
+        """(signature, unified store) when the unified store serves subject, else (signature, None)."""
+        signature = index_signature(subject)
+        store = self.unified_store()
+        if store is not None and store.covers(subject, signature):
+            return ("unified", id(store)), store
+        return signature, None
+
+    def _get_entry(self, subject: str) -> _Entry:
+        signature, _ = self._source(subject)
+        entry = self._lookup(subject, signature)
+        if entry is not None:
+            with self._lock:
+                self._stats["index_hits"] += 1
+            return entry
+
+        # Only one thread loads a given subject; the others wait and reuse its result
+        with self._load_lock(subject):
+            signature, store = self._source(subject)
+            entry = self._lookup(subject, signature)
+            if entry is not None:
+                with self._lock:
+                    self._stats["index_hits"] += 1
+                return entry
+
+            retriever = store.retriever([subject]) if store is not None else None
+            if retriever is not None:
+                # Shares the unified store's memory, so it costs nothing against max_bytes
+                entry = _Entry(store.vector_db, retriever, signature, 0, unified=store)
+                with self._lock:
+                    self._stats["index_misses"] += 1
+                    self._stats["unified_subject_loads"] += 1
+                    self._entries[subject] = entry
+                    self._entries.move_to_end(subject)
+                return entry
+
+            signature = index_signature(subject)
+            start = time.perf_counter()
+            vector_db = load_vector_db(self.embeddings, subject)
+            retriever = build_retriever(vector_db, index_path(subject))
+            elapsed = time.perf_counter() - start
+
+            entry = _Entry(vector_db, retriever, signature, index_size(signature))
+            with self._lock:
+                self._stats["index_misses"] += 1
+                self._stats["index_loads"] += 1
+                self._stats["index_load_seconds"] += elapsed
+                self._entries[subject] = entry
+                self._entries.move_to_end(subject)
+                self._evict()
+            return entry
+
+    def get_vector_db(self, subject: str):
+        return self._get_entry(subject).vector_db
+
+    def iter_chunks(self, subject: str):
+        """Yield a subject's chunk Documents, from the unified store if it serves the subject."""
+        entry = self._get_entry(subject)
+        if entry.unified is not None:
+            return entry.unified.iter_chunks(subject)
+        return iter_chunks(entry.vector_db)
+
+    def get_retriever(self, subject: str):
+        return self._get_entry(subject).retriever
+
+    def get_rag_chain(self, subject: str, learner_type: str):
+        entry = self._get_entry(subject)
+        with self._lock:
+            chain = entry.chains.get(learner_type)
+            if chain is not None:
+                self._stats["chain_hits"] += 1
+                return chain
+        chain = initialize_rag_chain(self.get_model(), entry.retriever, subject, learner_type)
+        with self._lock:
+            self._stats["chain_misses"] += 1
+            return entry.chains.setdefault(learner_type, chain)
+
+    def invalidate(self, subject: Optional[str] = None):
+        """Drop a subject's vector store and chains, or everything if subject is None."""
+        with self._lock:
+            if subject is None:
+                self._stats["invalidations"] += len(self._entries)
+                self._entries.clear()
+            elif self._entries.pop(subject, None) is not None:
+                self._stats["invalidations"] += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["subjects"] = list(self._entries.keys())
+            stats["cached_chains"] = sum(len(e.chains) for e in self._entries.values())
+            stats["cached_bytes"] = sum(e.size for e in self._entries.values())
+            stats["max_bytes"] = self.max_bytes
+            stats["unified_subjects"] = sorted(self._unified.subjects) if self._unified else []
+        lookups = stats["index_hits"] + stats["index_misses"]
+        stats["index_hit_rate"] = stats["index_hits"] / lookups if lookups else 0.0
+        stats["avg_index_load_seconds"] = (
+            stats["index_load_seconds"] / stats["index_loads"] if stats["index_loads"] else 0.0
+        )
+        return stats
@@ -0,0 +1,299 @@
+"""
+Pool of pre-generated /recommendations per (subject, learner_type).
+
+    python -m utils.recommendation_pool RAG
+
+warms the pool for every subject under RAG/ and each learner type, so the first
+page loads after a deploy are served from memory.
+"""
+import asyncio
+import fcntl
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from utils.assessdb import acquire_refill_lease, release_refill_lease
+from utils.prompts import RECOMMENDATIONS_SYSTEM, RECOMMENDATIONS_PROMPT
+from utils.response_cache import template_hash
+from utils.structured_output import generate_list, text_item
+
+POOL_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "recommendation_pool.json"
+)
+LEARNER_TYPES = ("slow", "medium", "fast")
+# Recommendations returned per request, like the 3-5 the prompt used to ask for
+SERVE_COUNT = 5
+# Refill when a pool holds fewer than POOL_LOW_WATER items, up to POOL_TARGET
+POOL_LOW_WATER = int(os.getenv("RECOMMENDATION_POOL_LOW_WATER", "10"))
+POOL_TARGET = int(os.getenv("RECOMMENDATION_POOL_TARGET", "30"))
+POOL_MAX_AGE = float(os.getenv("RECOMMENDATION_POOL_MAX_AGE", str(24 * 3600)))
+PER_CALL = 10
+MAX_CALLS_PER_REFILL = 5
+# How often the background loop looks for low or stale pools
+SWEEP_INTERVAL = 300.0
+# Only the worker holding this lease sweeps; the others load what it saved. The
+# holder renews it every sweep, so it passes on within two sweeps of a crash
+SWEEP_LEASE = "recommendation_pool"
+SWEEP_LEASE_SECONDS = 2 * SWEEP_INTERVAL
+# Subjects come from requests, so only the most recently served pools are kept
+MAX_POOLS = int(os.getenv("RECOMMENDATION_MAX_POOLS", "300"))
+
+GENERATION_SETTINGS = {"temperature": 0.9, "max_tokens": 600}
+POOL_TEMPLATE = template_hash(RECOMMENDATIONS_SYSTEM, RECOMMENDATIONS_PROMPT, GENERATION_SETTINGS)
+
+Key = Tuple[str, str]
+
+
+def known_subjects(rag_dir: str = "RAG") -> List[str]:
+    try:
+        return sorted(
+            name for name in os.listdir(rag_dir) if os.path.isdir(os.path.join(rag_dir, name))
+        )
+    except FileNotFoundError:
+        return []
+
+
+async def generate_recommendations(llm_client, subject: str, learner_type: str, count: int = PER_CALL) -> List[str]:
+    async def ask(n: int) -> str:
+        return await llm_client.complete(
+            "recommendations",
+            model="llama-3.3-70b-versatile",
+            messages=[
+                {"role": "system", "content": RECOMMENDATIONS_SYSTEM},
+                {"role": "user", "content": RECOMMENDATIONS_PROMPT.format(subject=subject, learner_type=learner_type, count=n)},
+            ],
+            **GENERATION_SETTINGS,
+        )
+
+    return await generate_list("recommendations", ask, text_item, count)
+
+
+class _Pool:
+    def __init__(self, items: List[str], refreshed_at: float):
+        self.items = items
+        self.refreshed_at = refreshed_at
+
+
+class RecommendationPool:
+    """
+    Validated recommendations per (subject, learner_type), sampled in memory.
+
+    A pool that runs below POOL_LOW_WATER or is older than POOL_MAX_AGE is refilled
+    by a single background task; requests keep being served from the old items
+    meanwhile. Only a pool that is empty makes a request wait, and only for the
+    first generated batch. At most MAX_POOLS pools are kept, least recently served
+    first out. Pools are saved to POOL_PATH, merged with what other workers saved,
+    so restarts and other workers start warm.
+    """
+
+    def __init__(self, llm_client, path: Optional[str] = POOL_PATH):
+        self.llm_client = llm_client
+        self.path = path
+        self._pools: "OrderedDict[Key, _Pool]" = OrderedDict()
+        self._refills: Dict[Key, asyncio.Task] = {}
+        # Set once a refill has stored its first batch
+        self._first_batches: Dict[Key, asyncio.Event] = {}
+        self._file_lock = threading.Lock()
+        self._stats = {"served": 0, "waited": 0, "refills": 0, "refill_errors": 0, "rejected": 0}
+        self._load()
+
+    def _load(self):
+        if self.path:
+            self._merge(self._read_pools())
+
+    def _merge(self, pools: Dict[Key, _Pool]):
+        """Adopt the pools that are newer than ours, e.g. ones other workers saved."""
+        for key, pool in pools.items():
+            current = self._pools.get(key)
+            if current is None or current.refreshed_at < pool.refreshed_at:
+                self._store(key, pool)
+
+    def _read_pools(self) -> Dict[Key, _Pool]:
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable recommendation pool {self.path}: {str(e)}")
+            return {}
+        if data.get("template") != POOL_TEMPLATE:
+            return {}
+        return {
+            (entry["subject"], entry["learner_type"]): _Pool(entry["items"], entry["refreshed_at"])
+            for entry in data.get("pools", [])
+            if entry["learner_type"] in LEARNER_TYPES
+        }
+
+    def _store(self, key: Key, pool: _Pool):
+        self._pools[key] = pool
+        self._pools.move_to_end(key)
+        while len(self._pools) > MAX_POOLS:
+            self._pools.popitem(last=False)
+
+    def _save(self, pools: Dict[Key, _Pool]):
+        """Write pools to the file, keeping the newer copy of pools other workers saved."""
+        if not self.path:
+            return
+        with self._file_lock:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            with open(f"{self.path}.lock", "w") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                merged = self._read_pools()
+                for key, pool in pools.items():
+                    if key not in merged or merged[key].refreshed_at <= pool.refreshed_at:
+                        merged[key] = pool
+                newest = sorted(merged.items(), key=lambda entry: entry[1].refreshed_at)[-MAX_POOLS:]
+                data = {
+                    "template": POOL_TEMPLATE,
+                    "pools": [
+                        {"subject": s, "learner_type": lt, "items": p.items, "refreshed_at": p.refreshed_at}
+                        for (s, lt), p in newest
+                    ],
+                }
+                tmp = f"{self.path}.{os.getpid()}.tmp"
+                with open(tmp, "w") as f:
+                    json.dump(data, f)
+                os.replace(tmp, self.path)
+
+    def _needs_refill(self, key: Key) -> bool:
+        pool = self._pools.get(key)
+        return (
+            pool is None
+            or len(pool.items) < POOL_LOW_WATER
+            or time.time() - pool.refreshed_at > POOL_MAX_AGE
+        )
+
+    async def _fill(self, key: Key):
+        subject, learner_type = key
+        pool = self._pools.get(key)
+        stale = pool is None or time.time() - pool.refreshed_at > POOL_MAX_AGE
+        # A stale pool is replaced; a low one is topped up
+        items = [] if stale else list(pool.items)
+        seen = {item.casefold() for item in items}
+        refreshed_at = time.time()
+        for _ in range(MAX_CALLS_PER_REFILL):
+            if len(items) >= POOL_TARGET:
+                break
+            generated = await generate_recommendations(self.llm_client, subject, learner_type)
+            fresh = [item for item in generated if item.casefold() not in seen]
+            self._stats["rejected"] += len(generated) - len(fresh)
+            if not fresh:
+                break
+            seen.update(item.casefold() for item in fresh)
+            items.extend(fresh)
+            if key not in self._pools:
+                # Serve the first batch to whoever is waiting while the rest is generated
+                self._store(key, _Pool(list(items), refreshed_at))
+                self._first_batches[key].set()
+        if not items:
+            raise ValueError(f"No valid recommendations generated for {subject} ({learner_type})")
+        pool = _Pool(items, refreshed_at)
+        self._store(key, pool)
+        await asyncio.to_thread(self._save, {key: pool})
+
+    def refill(self, key: Key) -> asyncio.Task:
+        """Start (or join) the background refill of one pool."""
+        task = self._refills.get(key)
+        if task is None:
+            self._stats["refills"] += 1
+            self._first_batches[key] = asyncio.Event()
+            task = asyncio.create_task(self._fill(key))
+            self._refills[key] = task
+
+            def done(t: asyncio.Task):
+                self._refills.pop(key, None)
+                self._first_batches.pop(key, None)
+                if not t.cancelled() and t.exception() is not None:
+                    self._stats["refill_errors"] += 1
+                    print(f"Recommendation refill for {key} failed: {type(t.exception()).__name__} - {str(t.exception())}")
+
+            task.add_done_callback(done)
+        return task
+
+    async def sample(self, subject: str, learner_type: str, count: int = SERVE_COUNT) -> List[str]:
+        if learner_type not in LEARNER_TYPES:
+            raise ValueError(f"Unknown learner type {learner_type!r}, expected one of {LEARNER_TYPES}")
+        key = (subject, learner_type)
+        if self._needs_refill(key):
+            task = self.refill(key)
+            if key not in self._pools:
+                self._stats["waited"] += 1
+                first_batch = asyncio.ensure_future(self._first_batches[key].wait())
+                try:
+                    # The refill itself is left running when this request goes away
+                    await asyncio.wait({task, first_batch}, return_when=asyncio.FIRST_COMPLETED)
+                finally:
+                    first_batch.cancel()
+                if key not in self._pools:
+                    # Failed before storing anything; raises its error
+                    await asyncio.shield(task)
+        self._pools.move_to_end(key)
+        items = self._pools[key].items
+        self._stats["served"] += 1
+        return random.sample(items, min(count, len(items)))
+
+    async def warm(self, subjects: List[str], learner_types=LEARNER_TYPES):
+        """Fill every low or stale pool for the given subjects and wait for them."""
+        tasks = [
+            self.refill((subject, learner_type))
+            for subject in subjects
+            for learner_type in learner_types
+            if self._needs_refill((subject, learner_type))
+        ]
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        return sum(1 for r in results if not isinstance(r, BaseException)), len(tasks)
+
+    async def run(self, rag_dir: str = "RAG"):
+        """
+        Keep the pools of every known subject warm. Runs until cancelled.
+
+        Every worker runs this, but only the one holding the sweep lease generates;
+        the others pick up the pools it saves.
+        """
+        # Read at run time, since workers forked from a preloaded app share the object
+        owner = str(os.getpid())
+        try:
+            while True:
+                if await asyncio.to_thread(acquire_refill_lease, SWEEP_LEASE, owner, SWEEP_LEASE_SECONDS):
+                    await self.warm(known_subjects(rag_dir))
+                elif self.path:
+                    self._merge(await asyncio.to_thread(self._read_pools))
+                await asyncio.sleep(SWEEP_INTERVAL)
+        finally:
+            await asyncio.to_thread(release_refill_lease, SWEEP_LEASE, owner)
+
+    def stats(self) -> Dict:
+        stats = dict(self._stats)
+        stats["pools"] = len(self._pools)
+        stats["items"] = sum(len(p.items) for p in self._pools.values())
+        stats["refilling"] = len(self._refills)
+        return stats
+
+
+async def _warm_all(rag_dir: str):
+    from dotenv import load_dotenv
+    from utils.llm import LLMClient
+
+    load_dotenv()
+    llm_client = LLMClient(os.getenv("GROQ_API_KEY3"))
+    try:
+        pool = RecommendationPool(llm_client)
+        subjects = known_subjects(rag_dir)
+        start = time.perf_counter()
+        filled, attempted = await pool.warm(subjects)
+        print(
+            f"Warmed {filled}/{attempted} recommendation pools for {len(subjects)} subjects "
+            f"in {time.perf_counter() - start:.1f}s"
+        )
+    finally:
+        await llm_client.aclose()
+
+
+if __name__ == "__main__":
+    asyncio.run(_warm_all(sys.argv[1] if len(sys.argv) > 1 else "RAG"))
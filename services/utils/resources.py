@@ -0,0 +1,131 @@
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from langchain_core.embeddings import Embeddings
+
+from utils.embedding_cache import CachedEmbeddings
+
+EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+
+
+class LazyEmbeddings(Embeddings):
+    """
+    The sentence-transformers model behind the service, loaded on first use.
+
+    Importing and loading it takes seconds, so it is not done at import time;
+    anything holding this object can be built before the model exists.
+    """
+
+    def __init__(self, model_name: str = EMBEDDING_MODEL):
+        self.model_name = model_name
+        self._model = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._model is not None
+
+    def load(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    from langchain_huggingface import HuggingFaceEmbeddings
+
+                    self._model = HuggingFaceEmbeddings(model_name=self.model_name)
+        return self._model
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.load().embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.load().embed_query(text)
+
+
+class _Lazy:
+    def __init__(self, factory: Callable):
+        self.factory = factory
+        self.value = None
+        self.lock = threading.Lock()
+
+    def get(self):
+        if self.value is None:
+            with self.lock:
+                if self.value is None:
+                    self.value = self.factory()
+        return self.value
+
+
+class Resources:
+    """
+    Heavy dependencies of the API, created on first use.
+
+    warm_up() creates all of them ahead of the first request; the service should
+    call it in the background at startup and report ready() once it finishes.
+    """
+
+    def __init__(
+        self,
+        chat_model_factory: Callable,
+        classifier_factory: Callable,
+        init_databases: Callable[[], None],
+        embeddings: Optional[LazyEmbeddings] = None,
+    ):
+        self.embeddings = embeddings or LazyEmbeddings()
+        self._chat_model = _Lazy(chat_model_factory)
+        self._classifier = _Lazy(classifier_factory)
+        # Opens the embedding cache's SQLite index, so it is created in each
+        # worker rather than at import, where a preloaded app would share it
+        self._document_embeddings = _Lazy(lambda: CachedEmbeddings(self.embeddings))
+        self._init_databases = init_databases
+        self.databases_ready = False
+        self.warm = False
+        self.warm_up_error: Optional[str] = None
+        self.timings: Dict[str, float] = {}
+
+    def chat_model(self):
+        return self._chat_model.get()
+
+    def classifier(self):
+        return self._classifier.get()
+
+    def document_embeddings(self) -> CachedEmbeddings:
+        """The embedding model behind the persistent cache, for embedding textbook chunks."""
+        return self._document_embeddings.get()
+
+    def _timed(self, name: str, fn: Callable):
+        start = time.perf_counter()
+        result = fn()
+        self.timings[name] = round(time.perf_counter() - start, 3)
+        return result
+
+    def init_databases(self):
+        """Create or migrate the SQLite schemas. Cheap when they are up to date."""
+        self._timed("databases", self._init_databases)
+        self.databases_ready = True
+
+    def warm_up(self):
+        try:
+            self._timed("embeddings", lambda: self.embeddings.embed_query("warm up"))
+            self._timed("document_embeddings", self.document_embeddings)
+            self._timed("chat_model", self.chat_model)
+            self._timed("classifier", self.classifier)
+            self.warm = True
+        except Exception as e:
+            self.warm_up_error = f"{type(e).__name__} - {str(e)}"
+            print(f"Warm-up failed: {self.warm_up_error}")
+
+    def ready(self) -> bool:
+        return self.databases_ready and self.warm
+
+    def status(self) -> Dict:
+        return {
+            "ready": self.ready(),
+            "databases": self.databases_ready,
+            "embeddings_loaded": self.embeddings.loaded,
+            "warm": self.warm,
+            "warm_up_error": self.warm_up_error,
+            "timings": dict(self.timings),
+            "pid": os.getpid(),
+        }
@@ -0,0 +1,211 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "10000"))
+# Set to a file path to keep entries across restarts and share them between workers
+RESPONSE_CACHE_DB = os.getenv("RESPONSE_CACHE_DB")
+
+# (ttl, stale window) in seconds per endpoint. Within the stale window after the ttl
+# the old response is served while a fresh one is generated in the background.
+# Override with RESPONSE_CACHE_TTL_<ENDPOINT> / RESPONSE_CACHE_STALE_<ENDPOINT>.
+DEFAULT_POLICY = (3600.0, 3600.0)
+ENDPOINT_POLICIES = {
+    "revision": (24 * 3600.0, 7 * 24 * 3600.0),
+    "carreer": (24 * 3600.0, 7 * 24 * 3600.0),
+}
+
+
+def endpoint_policy(endpoint: str) -> Tuple[float, float]:
+    ttl, stale = ENDPOINT_POLICIES.get(endpoint, DEFAULT_POLICY)
+    name = endpoint.upper()
+    ttl = float(os.getenv(f"RESPONSE_CACHE_TTL_{name}", ttl))
+    stale = float(os.getenv(f"RESPONSE_CACHE_STALE_{name}", stale))
+    return ttl, stale
+
+
+def template_hash(*parts: Any) -> str:
+    """Hash of everything besides the request parameters that shapes a response."""
+    return hashlib.sha256(json.dumps(parts, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+def normalize(value: Any) -> Any:
+    if isinstance(value, str):
+        return " ".join(value.split()).casefold()
+    return value
+
+
+def cache_key(endpoint: str, params: Dict[str, Any], template: str) -> str:
+    normalized = {name: normalize(value) for name, value in params.items()}
+    payload = json.dumps([endpoint, template, normalized], sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class _DiskTier:
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Tuple[Any, float]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+        return (json.loads(row[0]), row[1]) if row else None
+
+    def put(self, key: str, value: Any, created_at: float):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, created_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value), created_at),
+            )
+            self._conn.commit()
+
+
+class ResponseCache:
+    """
+    Cache for endpoints whose response is fully determined by a few request
+    parameters and a prompt template.
+
+    Entries live in an in-process LRU and, when disk_path is set, in a SQLite
+    table shared by all workers. Fresh entries are returned directly; stale ones
+    are returned while a single background task regenerates them. Concurrent
+    misses for the same key share one generation.
+    """
+
+    def __init__(self, max_entries: int = RESPONSE_CACHE_MAX_ENTRIES, disk_path: Optional[str] = RESPONSE_CACHE_DB):
+        self.max_entries = max_entries
+        self._memory: "OrderedDict[str, Tuple[Any, float]]" = OrderedDict()
+        self._disk = _DiskTier(disk_path) if disk_path else None
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._background: set = set()
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    def _count(self, endpoint: str, event: str):
+        counters = self._stats.setdefault(
+            endpoint, {"hits": 0, "stale_hits": 0, "misses": 0, "disk_hits": 0, "refreshes": 0, "errors": 0}
+        )
+        counters[event] += 1
+
+    def _remember(self, key: str, value: Any, created_at: float):
+        self._memory[key] = (value, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    async def _lookup(self, endpoint: str, key: str) -> Optional[Tuple[Any, float]]:
+        entry = self._memory.get(key)
+        if entry is not None:
+            self._memory.move_to_end(key)
+            return entry
+        if self._disk is not None:
+            entry = await asyncio.to_thread(self._disk.get, key)
+            if entry is not None:
+                self._count(endpoint, "disk_hits")
+                self._remember(key, *entry)
+        return entry
+
+    async def _generate(self, endpoint: str, key: str, compute: Callable[[], Awaitable[Any]]) -> Any:
+        future = self._inflight.get(key)
+        if future is not None:
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await compute()
+            created_at = time.time()
+            self._remember(key, value, created_at)
+            if self._disk is not None:
+                await asyncio.to_thread(self._disk.put, key, value, created_at)
+            future.set_result(value)
+            return value
+        except BaseException as e:
+            future.set_exception(e)
+            # Retrieve it so an unawaited failure is not reported as never retrieved
+            future.exception()
+            raise
+        finally:
+            del self._inflight[key]
+
+    def _refresh(self, endpoint: str, key: str, compute: Callable[[], Awaitable[Any]]):
+        if key in self._inflight:
+            return
+        self._count(endpoint, "refreshes")
+
+        async def refresh():
+            try:
+                await self._generate(endpoint, key, compute)
+            except Exception as e:
+                self._count(endpoint, "errors")
+                print(f"Background refresh for {endpoint} failed: {type(e).__name__} - {str(e)}")
+
+        task = asyncio.create_task(refresh())
+        # Keep a reference so the task is not garbage collected mid-flight
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    async def get_or_compute(
+        self,
+        endpoint: str,
+        params: Dict[str, Any],
+        template: str,
+        compute: Callable[[], Awaitable[Any]],
+    ) -> Any:
+        """
+        Return the cached response for (endpoint, params, template), calling
+        compute() to produce it when missing or expired.
+        """
+        ttl, stale = endpoint_policy(endpoint)
+        key = cache_key(endpoint, params, template)
+        entry = await self._lookup(endpoint, key)
+        if entry is not None:
+            value, created_at = entry
+            age = time.time() - created_at
+            if age < ttl:
+                self._count(endpoint, "hits")
+                return value
+            if age < ttl + stale:
+                self._count(endpoint, "stale_hits")
+                self._refresh(endpoint, key, compute)
+                return value
+        self._count(endpoint, "misses")
+        return await self._generate(endpoint, key, compute)
+
+    async def peek(self, endpoint: str, params: Dict[str, Any], template: str) -> Optional[Any]:
+        """Return a fresh or stale cached response without generating one."""
+        ttl, stale = endpoint_policy(endpoint)
+        entry = await self._lookup(endpoint, cache_key(endpoint, params, template))
+        if entry is None or time.time() - entry[1] >= ttl + stale:
+            self._count(endpoint, "misses")
+            return None
+        self._count(endpoint, "hits")
+        return entry[0]
+
+    async def put(self, endpoint: str, params: Dict[str, Any], template: str, value: Any):
+        """Store a response produced outside get_or_compute, e.g. by a stream."""
+        key = cache_key(endpoint, params, template)
+        created_at = time.time()
+        self._remember(key, value, created_at)
+        if self._disk is not None:
+            await asyncio.to_thread(self._disk.put, key, value, created_at)
+
+    def stats(self) -> Dict:
+        return {
+            "entries": len(self._memory),
+            "disk_tier": self._disk is not None,
+            "endpoints": {endpoint: dict(counters) for endpoint, counters in self._stats.items()},
+        }
@@ -0,0 +1,134 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+import faiss
+import numpy as np
+
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92"))
+SEMANTIC_CACHE_TTL = float(os.getenv("SEMANTIC_CACHE_TTL", str(24 * 3600)))
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "500"))
+
+
+class _CachedAnswer:
+    def __init__(self, query: str, answer: str, generation_seconds: float):
+        self.query = query
+        self.answer = answer
+        self.generation_seconds = generation_seconds
+        self.created_at = time.time()
+
+
+class _Partition:
+    """Cache entries for one (subject, learner_type), searchable by query embedding."""
+
+    def __init__(self, dim: int):
+        self.index = faiss.IndexIDMap2(faiss.IndexFlatIP(dim))
+        self.entries: "OrderedDict[int, _CachedAnswer]" = OrderedDict()
+        self.next_id = 0
+
+    def remove(self, ids):
+        if ids:
+            self.index.remove_ids(np.asarray(ids, dtype=np.int64))
+            for i in ids:
+                self.entries.pop(i, None)
+
+
+class SemanticCache:
+    """
+    Answers for questions that were already asked, matched by embedding similarity.
+
+    Queries are normalized so inner product is cosine similarity. Each
+    (subject, learner_type) has its own small FAISS index holding at most
+    max_entries answers, evicted least-recently-used, and answers expire after ttl.
+    """
+
+    def __init__(
+        self,
+        threshold: float = SEMANTIC_CACHE_THRESHOLD,
+        ttl: float = SEMANTIC_CACHE_TTL,
+        max_entries: int = SEMANTIC_CACHE_MAX_ENTRIES,
+    ):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._partitions: Dict[Tuple[str, str], _Partition] = {}
+        self._lock = threading.Lock()
+        self._stats = {"lookups": 0, "hits": 0, "stores": 0, "evictions": 0, "saved_seconds": 0.0}
+
+    @staticmethod
+    def _normalize(vector) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32).reshape(1, -1)
+        faiss.normalize_L2(vector)
+        return vector
+
+    def _expire(self, partition: _Partition):
+        cutoff = time.time() - self.ttl
+        # Entries are in LRU order, not insertion order, so check them all
+        expired = [i for i, entry in partition.entries.items() if entry.created_at < cutoff]
+        partition.remove(expired)
+        self._stats["evictions"] += len(expired)
+
+    def lookup(self, subject: str, learner_type: str, query_vector) -> Optional[str]:
+        vector = self._normalize(query_vector)
+        with self._lock:
+            self._stats["lookups"] += 1
+            partition = self._partitions.get((subject, learner_type))
+            if partition is None or not partition.entries:
+                return None
+            scores, ids = partition.index.search(vector, 1)
+            entry_id, score = int(ids[0][0]), float(scores[0][0])
+            entry = partition.entries.get(entry_id)
+            if entry is None or score < self.threshold:
+                return None
+            if time.time() - entry.created_at > self.ttl:
+                partition.remove([entry_id])
+                self._stats["evictions"] += 1
+                return None
+            partition.entries.move_to_end(entry_id)
+            self._stats["hits"] += 1
+            self._stats["saved_seconds"] += entry.generation_seconds
+            return entry.answer
+
+    def store(
+        self,
+        subject: str,
+        learner_type: str,
+        query: str,
+        query_vector,
+        answer: str,
+        generation_seconds: float,
+    ):
+        vector = self._normalize(query_vector)
+        with self._lock:
+            partition = self._partitions.get((subject, learner_type))
+            if partition is None:
+                partition = _Partition(vector.shape[1])
+                self._partitions[(subject, learner_type)] = partition
+            self._expire(partition)
+
+            entry_id = partition.next_id
+            partition.next_id += 1
+            partition.index.add_with_ids(vector, np.array([entry_id], dtype=np.int64))
+            partition.entries[entry_id] = _CachedAnswer(query, answer, generation_seconds)
+            self._stats["stores"] += 1
+
+            overflow = len(partition.entries) - self.max_entries
+            if overflow > 0:
+                partition.remove(list(partition.entries.keys())[:overflow])
+                self._stats["evictions"] += overflow
+
+    def invalidate(self, subject: str):
+        """Forget every answer for a subject, e.g. after its textbook is re-indexed."""
+        with self._lock:
+            for key in [key for key in self._partitions if key[0] == subject]:
+                del self._partitions[key]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = sum(len(p.entries) for p in self._partitions.values())
+        stats["hit_rate"] = stats["hits"] / stats["lookups"] if stats["lookups"] else 0.0
+        stats["threshold"] = self.threshold
+        return stats
@@ -0,0 +1,15 @@
+import json
+from typing import Optional
+
+
+def sse_event(data, event: Optional[str] = None) -> str:
+    """Format one Server-Sent Events message with a JSON payload."""
+    message = f"event: {event}\n" if event else ""
+    return message + f"data: {json.dumps(data)}\n\n"
+
+
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    # Stop nginx from buffering the stream in front of us
+    "X-Accel-Buffering": "no",
+}
@@ -0,0 +1,271 @@
+"""
+Parsing and validation of JSON lists produced by the LLM.
+
+Every endpoint that asks for a JSON list goes through generate_list. It repairs
+the usual malformations locally (code fences, prose around the JSON, trailing
+commas, smart quotes, output cut off at max_tokens, the list wrapped in an
+object), validates each item, and re-asks only for the number of items that
+were missing or invalid, within a retry and time budget.
+"""
+import json
+import os
+import re
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Tuple
+
+from pydantic import BaseModel, field_validator, model_validator
+
+# Extra LLM calls allowed per generate_list call, and the time after which no
+# more are started
+STRUCTURED_MAX_RETRIES = int(os.getenv("STRUCTURED_MAX_RETRIES", "1"))
+STRUCTURED_RETRY_BUDGET = float(os.getenv("STRUCTURED_RETRY_BUDGET", "20"))
+MAX_TEXT_ITEM_LENGTH = 150
+
+FENCE = re.compile(r"```(?:json)?\s*(.*?)(?:```|$)", re.DOTALL | re.IGNORECASE)
+TRAILING_COMMA = re.compile(r",\s*([\]}])")
+SMART_QUOTES = str.maketrans({"“": '"', "”": '"', "‘": "'", "’": "'"})
+OPTION_LABEL = re.compile(r"^\s*(?:\(?[A-Da-d1-4][).:]|[A-Da-d1-4]\s*-)\s+")
+
+
+class StructuredOutputError(ValueError):
+    pass
+
+
+class MultipleChoiceQuestion(BaseModel):
+    question: str
+    options: List[str]
+    correct_answer: str
+
+    @model_validator(mode="before")
+    @classmethod
+    def normalize_keys(cls, data: Any) -> Any:
+        if not isinstance(data, dict):
+            return data
+        data = dict(data)
+        for alias in ("answer", "correct", "correct_option"):
+            if "correct_answer" not in data and alias in data:
+                data["correct_answer"] = data.pop(alias)
+        if "options" not in data and "choices" in data:
+            data["options"] = data.pop("choices")
+        if isinstance(data.get("options"), dict):
+            data["options"] = list(data["options"].values())
+        return data
+
+    @field_validator("question")
+    @classmethod
+    def question_not_empty(cls, value: str) -> str:
+        value = value.strip()
+        if not value:
+            raise ValueError("question is empty")
+        return value
+
+    @field_validator("options")
+    @classmethod
+    def four_distinct_options(cls, value: List[str]) -> List[str]:
+        value = [str(option).strip() for option in value]
+        if len(value) != 4 or len({option.casefold() for option in value}) != 4:
+            raise ValueError("expected 4 distinct options")
+        return value
+
+    @model_validator(mode="after")
+    def answer_is_an_option(self) -> "MultipleChoiceQuestion":
+        answer = str(self.correct_answer).strip()
+        if answer in self.options:
+            self.correct_answer = answer
+            return self
+        # "B", "b)", "2" or "B) Paris" instead of the option text
+        label = answer.rstrip(").:").strip().upper()
+        if len(label) == 1 and label in "ABCD1234":
+            self.correct_answer = self.options["ABCD1234".index(label) % 4]
+            return self
+        unlabeled = OPTION_LABEL.sub("", answer).casefold()
+        for option in self.options:
+            if OPTION_LABEL.sub("", option).casefold() == unlabeled:
+                self.correct_answer = option
+                return self
+        raise ValueError("correct_answer is not one of the options")
+
+
+def question_item(value: Any) -> Dict:
+    return MultipleChoiceQuestion.model_validate(value).model_dump()
+
+
+def text_item(value: Any) -> str:
+    if not isinstance(value, str):
+        raise ValueError(f"expected a string, got {type(value).__name__}")
+    value = " ".join(value.split())
+    if not 3 <= len(value) <= MAX_TEXT_ITEM_LENGTH:
+        raise ValueError("string is empty or too long")
+    return value
+
+
+def close_truncated(text: str) -> str:
+    """Cut a JSON document truncated mid-output back to its last complete list item."""
+    stack, in_string, escaped, last_item_end = [], False, False, None
+    for i, char in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in "[{":
+            stack.append(char)
+        elif char in "]}":
+            if stack:
+                stack.pop()
+            if stack and stack[-1] == "[":
+                last_item_end = (i + 1, list(stack))
+    if not stack:
+        return text
+    if last_item_end is None:
+        raise StructuredOutputError("Output was cut off before the first item")
+    end, open_brackets = last_item_end
+    closers = "".join("]" if b == "[" else "}" for b in reversed(open_brackets))
+    return text[:end] + closers
+
+
+def parse_json(text: str) -> Tuple[Any, bool]:
+    """Parse LLM output as JSON, returning (value, whether it needed repair)."""
+    text = (text or "").strip()
+    try:
+        return json.loads(text), False
+    except json.JSONDecodeError:
+        pass
+
+    fenced = FENCE.search(text)
+    if fenced:
+        text = fenced.group(1).strip()
+    starts = [i for i in (text.find("["), text.find("{")) if i >= 0]
+    if not starts:
+        raise StructuredOutputError("No JSON found in the output")
+    text = text[min(starts):]
+    text = TRAILING_COMMA.sub(r"\1", text.translate(SMART_QUOTES))
+    try:
+        return json.loads(text), True
+    except json.JSONDecodeError:
+        pass
+    # Prose after the JSON, or output cut off at max_tokens
+    for candidate in (text[:max(text.rfind("]"), text.rfind("}")) + 1], close_truncated(text)):
+        try:
+            return json.loads(TRAILING_COMMA.sub(r"\1", candidate)), True
+        except json.JSONDecodeError:
+            continue
+    raise StructuredOutputError("Output is not valid JSON")
+
+
+def extract_list(value: Any) -> List:
+    """The list of items in a parsed response, which JSON mode wraps in an object."""
+    if isinstance(value, list):
+        return value
+    if isinstance(value, dict):
+        lists = [v for v in value.values() if isinstance(v, list)]
+        if lists:
+            return max(lists, key=len)
+        if "question" in value:
+            return [value]
+        nested = [v for v in value.values() if isinstance(v, dict)]
+        for inner in nested:
+            try:
+                return extract_list(inner)
+            except StructuredOutputError:
+                continue
+    raise StructuredOutputError("Output does not contain a list")
+
+
+def item_key(item: Any) -> str:
+    text = item.get("question", "") if isinstance(item, dict) else str(item)
+    return " ".join(text.split()).casefold()
+
+
+_stats_lock = threading.Lock()
+_stats: Dict[str, Dict[str, int]] = {}
+
+
+def _count(endpoint: str, event: str, amount: int = 1):
+    with _stats_lock:
+        counters = _stats.setdefault(
+            endpoint,
+            {"responses": 0, "clean": 0, "repaired": 0, "unparseable": 0,
+             "items": 0, "invalid_items": 0, "retries": 0, "failures": 0},
+        )
+        counters[event] += amount
+
+
+def get_parse_stats() -> Dict:
+    """Per-endpoint counts of LLM responses that parsed cleanly, needed repair or failed."""
+    with _stats_lock:
+        stats = {endpoint: dict(counters) for endpoint, counters in _stats.items()}
+    for counters in stats.values():
+        responses = counters["responses"]
+        counters["repair_rate"] = counters["repaired"] / responses if responses else 0.0
+        counters["unparseable_rate"] = counters["unparseable"] / responses if responses else 0.0
+    return stats
+
+
+def parse_items(endpoint: str, text: str, item: Callable[[Any], Any]) -> List:
+    """Repair, parse and validate one response, keeping only the valid items."""
+    _count(endpoint, "responses")
+    try:
+        value, repaired = parse_json(text)
+        items = extract_list(value)
+    except StructuredOutputError as e:
+        _count(endpoint, "unparseable")
+        print(f"Unparseable {endpoint} output ({str(e)}): {(text or '')[:200]!r}")
+        return []
+    _count(endpoint, "repaired" if repaired else "clean")
+
+    valid = []
+    for raw in items:
+        try:
+            valid.append(item(raw))
+        except ValueError:
+            _count(endpoint, "invalid_items")
+    _count(endpoint, "items", len(valid))
+    return valid
+
+
+async def generate_list(
+    endpoint: str,
+    ask: Callable[[int], Awaitable[str]],
+    item: Callable[[Any], Any],
+    count: int,
+    min_items: int = 1,
+    max_retries: int = STRUCTURED_MAX_RETRIES,
+    budget: float = STRUCTURED_RETRY_BUDGET,
+) -> List:
+    """
+    Get up to `count` valid items from the LLM.
+
+    ask(n) makes one LLM call asking for n items and returns its raw text; item
+    validates one parsed item, raising ValueError when it is unusable. When fewer
+    than `count` valid items come back, ask is called again for just the missing
+    number, at most max_retries times and only while under `budget` seconds.
+    Raises StructuredOutputError when fewer than min_items are valid in the end.
+    """
+    start = time.perf_counter()
+    collected, seen = [], set()
+    for attempt in range(max_retries + 1):
+        missing = count - len(collected)
+        if attempt:
+            if time.perf_counter() - start > budget:
+                break
+            _count(endpoint, "retries")
+        for value in parse_items(endpoint, await ask(missing), item):
+            key = item_key(value)
+            if key not in seen:
+                seen.add(key)
+                collected.append(value)
+        if len(collected) >= count:
+            break
+
+    if len(collected) < min_items:
+        _count(endpoint, "failures")
+        raise StructuredOutputError(
+            f"LLM returned {len(collected)} valid items for {endpoint}, expected at least {min_items}"
+        )
+    return collected[:count]
@@ -0,0 +1,116 @@
+import asyncio
+import math
+import os
+import re
+from typing import Awaitable, Callable, Dict, List
+
+from utils.history import estimate_tokens
+
+# Transcript tokens per generation call. The old single call saw the first
+# 4000 characters, about 1000 tokens.
+WINDOW_TOKENS = int(os.getenv("TRANSCRIPT_WINDOW_TOKENS", "1500"))
+# Windows grow up to WINDOW_MAX_TOKENS to keep a transcript within MAX_WINDOWS;
+# longer videos get more windows, generated in further rounds
+WINDOW_MAX_TOKENS = int(os.getenv("TRANSCRIPT_WINDOW_MAX_TOKENS", "3000"))
+MAX_WINDOWS = int(os.getenv("TRANSCRIPT_MAX_WINDOWS", "8"))
+# Generation calls in flight per request. One round for MAX_WINDOWS windows, each
+# producing a couple of questions, takes about as long as the old 5-question call.
+MAP_CONCURRENCY = int(os.getenv("TRANSCRIPT_MAP_CONCURRENCY", "8"))
+# Candidates are generated with this much headroom over the questions needed
+OVERSAMPLE = 2
+# Questions whose content words have at least this Jaccard similarity are duplicates
+DUPLICATE_OVERLAP = 0.6
+
+WORD = re.compile(r"[a-z0-9]+")
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "does", "for", "from", "how", "in", "is",
+    "it", "of", "on", "or", "that", "the", "this", "to", "what", "which", "who", "why", "with",
+    "according", "video", "transcript", "speaker", "following",
+}
+
+GenerateFn = Callable[[str, int], Awaitable[List[Dict]]]
+
+
+def split_windows(text: str) -> List[str]:
+    """
+    Split a transcript into consecutive windows of about WINDOW_TOKENS tokens.
+
+    Long transcripts get larger windows (up to WINDOW_MAX_TOKENS) so they still fit
+    in MAX_WINDOWS; beyond about MAX_WINDOWS * WINDOW_MAX_TOKENS tokens there are
+    more windows. Every word of the transcript is in exactly one window.
+    """
+    words = text.split()
+    total = estimate_tokens(text)
+    budget = min(max(WINDOW_TOKENS, math.ceil(total / MAX_WINDOWS)), WINDOW_MAX_TOKENS)
+    words_per_window = max(1, int(len(words) * budget / max(total, 1)))
+    return [
+        " ".join(words[start:start + words_per_window])
+        for start in range(0, len(words), words_per_window)
+    ]
+
+
+def content_words(question: str) -> set:
+    return {w for w in WORD.findall(question.lower()) if w not in STOPWORDS}
+
+
+def is_duplicate(words: set, seen: List[set]) -> bool:
+    for other in seen:
+        union = len(words | other)
+        if union and len(words & other) / union >= DUPLICATE_OVERLAP:
+            return True
+    return False
+
+
+def select_balanced(per_window: List[List[Dict]]) -> List[Dict]:
+    """
+    Drop near-duplicate questions and interleave the rest round-robin across
+    windows, so any prefix of the result covers the video from start to end.
+    """
+    seen: List[set] = []
+    unique: List[List[Dict]] = []
+    for questions in per_window:
+        kept = []
+        for q_data in questions:
+            if not isinstance(q_data, dict) or not isinstance(q_data.get("question"), str):
+                continue
+            words = content_words(q_data["question"])
+            if is_duplicate(words, seen):
+                continue
+            seen.append(words)
+            kept.append(q_data)
+        unique.append(kept)
+
+    selected = []
+    for rank in range(max((len(q) for q in unique), default=0)):
+        selected.extend(questions[rank] for questions in unique if rank < len(questions))
+    return selected
+
+
+async def generate_from_transcript(text: str, generate: GenerateFn, count: int = 5) -> List[Dict]:
+    """
+    Generate questions covering a whole transcript.
+
+    Short transcripts take a single generate(text, count) call. Longer ones are
+    split into windows, each asked for a share of OVERSAMPLE * count candidates
+    (at least one, so very long videos cost more) with at most MAP_CONCURRENCY
+    calls in flight, and the candidates are merged with select_balanced. Windows that fail are skipped as long as one succeeds.
+    Returns every selected question, best-covering first; callers take what they need.
+    """
+    windows = split_windows(text)
+    if len(windows) == 1:
+        return await generate(windows[0], count)
+
+    per_window_count = max(1, math.ceil(OVERSAMPLE * count / len(windows)))
+    semaphore = asyncio.Semaphore(MAP_CONCURRENCY)
+
+    async def generate_window(window: str) -> List[Dict]:
+        async with semaphore:
+            return await generate(window, per_window_count)
+
+    results = await asyncio.gather(*(generate_window(w) for w in windows), return_exceptions=True)
+    failures = [r for r in results if isinstance(r, BaseException)]
+    if len(failures) == len(results):
+        raise failures[0]
+    for failure in failures:
+        print(f"Question generation for a transcript window failed: {type(failure).__name__} - {str(failure)}")
+    return select_balanced([r if isinstance(r, list) else [] for r in results])
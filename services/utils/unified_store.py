@@ -0,0 +1,262 @@
+"""
+One index over the chunks of every subject, with per-chunk subject, book and page.
+
+    python -m utils.unified_store RAG
+
+merges every RAG/{subject} index into RAG_unified/, in the usual index_store
+layout plus
+
+    chunks.db       SQLite table of (pos, subject, book, page) per chunk, and the
+                    signature of each subject directory at merge time
+
+The book of a chunk is the file name of the PDF it came from, also stored in the
+chunk's "book" metadata; chunks of PDFs uploaded before ingestion kept their
+file names were recorded with a temp file path, so those get the subject's name.
+
+Vectors are copied from the subject indexes, so nothing is re-embedded; the
+merged index is rebuilt as the type chosen for the combined size. A search is
+restricted to subjects or books by a ChunkFilter, which both the FAISS and the
+BM25 side apply, so one loaded index serves every subject and queries across
+several of them.
+
+RagCache serves a subject from the unified store while the subject's directory
+is unchanged since the merge; a subject uploaded or re-uploaded afterwards is
+served from its own directory until the merge is run again.
+"""
+import argparse
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from typing import Dict, Iterable, Optional, Sequence, Tuple
+
+import faiss
+import numpy as np
+
+from utils.ann_index import INDEX_TYPES, RAG_INDEX_TYPE, index_vectors, search_parameters
+from utils.hybrid_search import (
+    RAG_RERANK,
+    RAG_RETRIEVAL_MODE,
+    RAG_TOP_K,
+    HybridRetriever,
+    get_reranker,
+    load_bm25,
+)
+from utils.index_store import (
+    DOCSTORE_FILE,
+    INDEX_FILE,
+    SqliteDocstore,
+    convert_legacy_index,
+    directory_signature,
+    is_mmap_format,
+    load_index,
+    save_chunks,
+)
+
+UNIFIED_DIR = os.getenv("RAG_UNIFIED_DIR", "RAG_unified")
+CHUNKS_FILE = "chunks.db"
+# Filters kept per loaded store; one per subject plus a few cross-subject ones
+MAX_CACHED_FILTERS = 256
+
+
+class ChunkFilter:
+    """The positions a search may return, as a boolean mask for BM25 and a FAISS selector."""
+
+    def __init__(self, positions: np.ndarray, ntotal: int):
+        self.positions = positions
+        self.mask = np.zeros(ntotal, dtype=bool)
+        self.mask[positions] = True
+        self.fraction = len(positions) / ntotal if ntotal else 0.0
+        # Subjects are merged one after another, so a subject is usually one range
+        if len(positions) and positions[-1] - positions[0] + 1 == len(positions):
+            self.selector = faiss.IDSelectorRange(int(positions[0]), int(positions[-1]) + 1)
+        else:
+            self.selector = faiss.IDSelectorBatch(positions.astype(np.int64))
+
+    def __len__(self):
+        return len(self.positions)
+
+    def search_parameters(self, index):
+        return search_parameters(index, self.selector, self.fraction)
+
+
+class UnifiedStore:
+    """A loaded unified index: the vector store, its BM25 index and the chunk table."""
+
+    def __init__(self, path: str, embeddings):
+        self.path = path
+        self.vector_db = load_index(path, embeddings)
+        self.bm25 = load_bm25(path)
+        self._conn = sqlite3.connect(
+            f"file:{os.path.join(path, CHUNKS_FILE)}?mode=ro", uri=True, check_same_thread=False
+        )
+        self._lock = threading.Lock()
+        self._filters: Dict[Tuple, Optional[ChunkFilter]] = {}
+        with self._lock:
+            rows = self._conn.execute("SELECT subject, signature, chunks FROM subjects").fetchall()
+            total = self._conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+        self.subjects = {subject: tuple(tuple(entry) for entry in json.loads(signature)) for subject, signature, _ in rows}
+        # Files of two different merges, read while one replaced the other
+        if total != self.vector_db.index.ntotal or (self.bm25 is not None and len(self.bm25) != total):
+            raise ValueError(f"{path} is being rewritten")
+
+    @property
+    def ntotal(self) -> int:
+        return self.vector_db.index.ntotal
+
+    def covers(self, subject: str, signature: Tuple) -> bool:
+        """Whether the store holds the current version of a subject's index."""
+        return bool(signature) and self.subjects.get(subject) == signature
+
+    def chunk_filter(
+        self, subjects: Optional[Sequence[str]] = None, books: Optional[Sequence[str]] = None
+    ) -> Optional[ChunkFilter]:
+        """Filter for chunks of any of the subjects and any of the books; None means everything."""
+        if not subjects and not books:
+            return None
+        key = (tuple(sorted(subjects or ())), tuple(sorted(books or ())))
+        with self._lock:
+            if key in self._filters:
+                return self._filters[key]
+        clauses, args = [], []
+        for column, values in (("subject", key[0]), ("book", key[1])):
+            if values:
+                clauses.append(f"{column} IN ({','.join('?' * len(values))})")
+                args.extend(values)
+        with self._lock:
+            positions = np.fromiter(
+                (pos for (pos,) in self._conn.execute(
+                    f"SELECT pos FROM chunks WHERE {' AND '.join(clauses)} ORDER BY pos", args
+                )),
+                dtype=np.int64,
+            )
+            chunk_filter = ChunkFilter(positions, self.ntotal) if len(positions) else None
+            if len(self._filters) >= MAX_CACHED_FILTERS:
+                self._filters.pop(next(iter(self._filters)))
+            self._filters[key] = chunk_filter
+        return chunk_filter
+
+    def retriever(
+        self,
+        subjects: Optional[Sequence[str]] = None,
+        books: Optional[Sequence[str]] = None,
+        k: int = RAG_TOP_K,
+    ):
+        """A retriever over the chunks matching the filter, or None when no chunk matches."""
+        chunk_filter = self.chunk_filter(subjects, books)
+        if chunk_filter is None and (subjects or books):
+            return None
+        return HybridRetriever(
+            vector_db=self.vector_db,
+            bm25=self.bm25 if RAG_RETRIEVAL_MODE == "hybrid" else None,
+            k=k,
+            reranker=get_reranker() if RAG_RERANK else None,
+            chunk_filter=chunk_filter,
+        )
+
+    def iter_chunks(self, subject: str):
+        """Yield a subject's chunk Documents, in index order."""
+        chunk_filter = self.chunk_filter([subject])
+        if chunk_filter is None:
+            return
+        for pos in chunk_filter.positions:
+            yield self.vector_db.docstore.search(str(int(pos)))
+
+
+def load_unified_store(path: str, embeddings) -> Optional[UnifiedStore]:
+    """The unified store at path, or None if there is none (or it is mid-rewrite)."""
+    if not os.path.exists(os.path.join(path, CHUNKS_FILE)) or not is_mmap_format(path):
+        return None
+    try:
+        return UnifiedStore(path, embeddings)
+    except (ValueError, sqlite3.Error, RuntimeError) as e:
+        print(f"Not using unified store {path}: {type(e).__name__} - {str(e)}")
+        return None
+
+
+def book_name(source: Optional[str], subject: str) -> str:
+    """The book a chunk came from, given its "source" metadata and its subject."""
+    if not source or os.path.dirname(os.path.abspath(source)) == tempfile.gettempdir():
+        return subject
+    return os.path.basename(source)
+
+
+def write_chunk_table(rows: Iterable[Tuple[int, str, str, Optional[int]]], subjects, path: str):
+    """Write chunks.db from (pos, subject, book, page) rows and (subject, signature, chunks) entries."""
+    tmp_path = path + ".tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    conn = sqlite3.connect(tmp_path)
+    conn.execute(
+        "CREATE TABLE chunks (pos INTEGER PRIMARY KEY, subject TEXT NOT NULL, book TEXT, page INTEGER)"
+    )
+    conn.execute("CREATE TABLE subjects (subject TEXT PRIMARY KEY, signature TEXT NOT NULL, chunks INTEGER NOT NULL)")
+    conn.executemany("INSERT INTO chunks (pos, subject, book, page) VALUES (?, ?, ?, ?)", rows)
+    conn.executemany(
+        "INSERT INTO subjects (subject, signature, chunks) VALUES (?, ?, ?)",
+        ((subject, json.dumps(signature), chunks) for subject, signature, chunks in subjects),
+    )
+    conn.execute("CREATE INDEX idx_chunks_subject ON chunks(subject, book)")
+    conn.execute("CREATE INDEX idx_chunks_book ON chunks(book)")
+    conn.commit()
+    conn.close()
+    os.replace(tmp_path, path)
+
+
+def merge_subjects(rag_dir: str, path: str = UNIFIED_DIR, index_type: str = RAG_INDEX_TYPE):
+    """Merge every subject index under rag_dir into one unified store at path."""
+    subjects = []
+    for name in sorted(os.listdir(rag_dir)):
+        subject_path = os.path.join(rag_dir, name)
+        if not os.path.isdir(subject_path):
+            continue
+        if not is_mmap_format(subject_path):
+            print(f"Converting {subject_path}")
+            convert_legacy_index(subject_path)
+        # Taken before reading, so a subject rewritten during the merge counts as stale
+        signature = directory_signature(subject_path)
+        vectors = index_vectors(faiss.read_index(os.path.join(subject_path, INDEX_FILE)))
+        subjects.append((name, subject_path, signature, vectors))
+    if not subjects:
+        raise SystemExit(f"No subject indexes in {rag_dir}")
+
+    def chunks():
+        for name, subject_path, _, _ in subjects:
+            with SqliteDocstore(os.path.join(subject_path, DOCSTORE_FILE)) as docstore:
+                for _, doc in docstore.iter_documents():
+                    doc.metadata["subject"] = name
+                    doc.metadata["book"] = book_name(doc.metadata.get("source"), name)
+                    yield doc
+
+    def rows():
+        for pos, doc in enumerate(chunks()):
+            page = doc.metadata.get("page")
+            yield pos, doc.metadata["subject"], doc.metadata["book"], page if isinstance(page, int) else None
+
+    vectors = np.concatenate([v for _, _, _, v in subjects])
+    os.makedirs(path, exist_ok=True)
+    write_chunk_table(
+        rows(),
+        [(name, signature, len(v)) for name, _, signature, v in subjects],
+        os.path.join(path, CHUNKS_FILE),
+    )
+    save_chunks(chunks, vectors, path, index_type)
+    return [(name, len(v)) for name, _, _, v in subjects]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("rag_dir", nargs="?", default="RAG")
+    parser.add_argument("--out", default=UNIFIED_DIR)
+    parser.add_argument("--type", default=RAG_INDEX_TYPE, choices=("auto",) + INDEX_TYPES)
+    args = parser.parse_args()
+    start = time.perf_counter()
+    merged = merge_subjects(args.rag_dir, args.out, args.type)
+    for name, count in merged:
+        print(f"{name}: {count} chunks")
+    print(
+        f"Merged {sum(count for _, count in merged)} chunks of {len(merged)} subjects into "
+        f"{args.out} in {time.perf_counter() - start:.1f}s"
+    )